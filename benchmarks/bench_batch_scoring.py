@@ -0,0 +1,151 @@
+"""
+Subjective scoring benchmark: per-item requests vs. one batch request per session.
+
+Scores the same N subjective answers three ways and reports requests, prompt
+/ completion tokens (from the response ``usage``) and wall-clock time:
+
+- ``per_item_serial``: one request per answer, in submission order
+  (the synchronous submit path)
+- ``per_item_parallel``: one request per answer, all at once
+  (deferred workers, bounded by the client semaphores)
+- ``batch``: ``score_subjective_batch`` (``BASIS_SCORING_BATCH_SIZE`` per request)
+
+Without ``--base-url`` the model is simulated in process: latency is
+``--rtt-ms`` plus ``--ms-per-token`` per generated token, and token counts
+are estimated from UTF-8 length, so the numbers show relative cost only.
+With ``--base-url`` the requests go to a real OpenAI-compatible endpoint.
+
+Usage:
+    python benchmarks/bench_batch_scoring.py --items 6
+    python benchmarks/bench_batch_scoring.py --items 6 --base-url http://127.0.0.1:8900/v1
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import time
+
+import httpx
+
+from basis_expert_council import metrics
+from basis_expert_council.assessment import agent_scoring
+from basis_expert_council.assessment.llm_client import ScoringClient
+
+ESSAY_STEMS = [
+    "解释光合作用中光反应和暗反应的关系。",
+    "Describe the causes of the French Revolution.",
+    "设计一个实验验证温度对酶活性的影响。",
+    "Why does the moon show phases?",
+    "比较分数除法与乘法的关系，并举例说明。",
+    "Explain how supply and demand set a market price.",
+]
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text.encode("utf-8")) // 3)
+
+
+def _items(n: int) -> list[tuple[dict, str]]:
+    items = []
+    for i in range(n):
+        stem = ESSAY_STEMS[i % len(ESSAY_STEMS)]
+        question = {
+            "id": i + 1,
+            "question_type": "essay" if i % 2 else "short_answer",
+            "content_zh": {"stem": stem, "rubric": "要点完整、逻辑清晰、举例恰当"},
+            "explanation_zh": "参考教材相关章节。",
+        }
+        answer = f"学生答案 {i + 1}：" + "这是一个包含若干要点的较长回答，涵盖定义、过程与例子。" * 4
+        items.append((question, answer))
+    return items
+
+
+def _simulated_transport(rtt_ms: float, ms_per_token: float) -> httpx.AsyncBaseTransport:
+    verdict = {"score": 0.8, "is_correct": True, "feedback_zh": "要点基本完整，论证清楚，可补充更多例子。" * 2,
+               "feedback_en": "Mostly complete; add more examples."}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        prompt = json.loads(request.content)["messages"][0]["content"]
+        n = len(re.findall(r"^## 第 \d+ 题", prompt, re.MULTILINE))
+        if n:
+            content = json.dumps([{"id": i + 1, **verdict} for i in range(n)], ensure_ascii=False)
+        else:
+            content = json.dumps(verdict, ensure_ascii=False)
+        completion = _tokens(content)
+        await asyncio.sleep((rtt_ms + ms_per_token * completion) / 1000)
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": content}}],
+            "usage": {"prompt_tokens": _tokens(prompt), "completion_tokens": completion},
+        })
+
+    return httpx.MockTransport(handler)
+
+
+class _NoCache:
+    """Every call must reach the model for a fair comparison."""
+
+    def key(self, *args):
+        return args
+
+    async def get(self, key):
+        return None
+
+    async def put(self, key, *result):
+        return None
+
+
+async def _run(mode: str, items: list[tuple[dict, str]]) -> dict:
+    metrics.reset()
+    t0 = time.perf_counter()
+    if mode == "per_item_serial":
+        for q, a in items:
+            await agent_scoring.score_subjective_question(q, a)
+    elif mode == "per_item_parallel":
+        await asyncio.gather(*(agent_scoring.score_subjective_question(q, a) for q, a in items))
+    else:
+        await agent_scoring.score_subjective_batch(items)
+    wall_ms = (time.perf_counter() - t0) * 1000
+    return {
+        "mode": mode,
+        "requests": int(metrics.counter_value("scoring.requests", status="ok")),
+        "prompt_tokens": int(metrics.counter_value("scoring.tokens", kind="prompt")),
+        "completion_tokens": int(metrics.counter_value("scoring.tokens", kind="completion")),
+        "wall_ms": round(wall_ms, 1),
+        "fallbacks": int(sum(v for k, v in metrics.snapshot()["counters"].items() if k.startswith("scoring.fallback"))),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=6, help="subjective answers per session")
+    parser.add_argument("--base-url", default=None, help="OpenAI-compatible endpoint (default: simulated)")
+    parser.add_argument("--rtt-ms", type=float, default=400.0)
+    parser.add_argument("--ms-per-token", type=float, default=15.0)
+    args = parser.parse_args()
+
+    if args.base_url:
+        client = ScoringClient(base_url=args.base_url)
+    else:
+        client = ScoringClient(base_url="http://simulated/v1", transport=_simulated_transport(args.rtt_ms, args.ms_per_token))
+    agent_scoring.scoring_client = client
+    agent_scoring.scoring_cache = _NoCache()
+
+    items = _items(args.items)
+    rows = [await _run(mode, items) for mode in ("per_item_serial", "per_item_parallel", "batch")]
+    await client.aclose()
+
+    print(f"{'mode':18s} {'requests':>8s} {'prompt_tok':>10s} {'compl_tok':>9s} {'wall_ms':>9s} {'fallback':>8s}")
+    for r in rows:
+        print(f"{r['mode']:18s} {r['requests']:8d} {r['prompt_tokens']:10d} {r['completion_tokens']:9d} "
+              f"{r['wall_ms']:9.1f} {r['fallbacks']:8d}")
+    base, batch = rows[0], rows[-1]
+    if base["prompt_tokens"]:
+        saved = 1 - (batch["prompt_tokens"] + batch["completion_tokens"]) / (base["prompt_tokens"] + base["completion_tokens"])
+        print(f"\nbatch vs per-item: {saved:.0%} fewer tokens, "
+              f"{base['wall_ms'] / max(batch['wall_ms'], 1e-9):.1f}x faster than serial, "
+              f"{rows[1]['wall_ms'] / max(batch['wall_ms'], 1e-9):.1f}x vs parallel")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
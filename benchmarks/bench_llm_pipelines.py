@@ -0,0 +1,233 @@
+"""
+LLM pipeline load test against the local stub (``basis_expert_council.llm_stub``).
+
+Drives the real client code paths with a configurable simulated model and
+reports throughput, client-side latency percentiles, fallbacks and what the
+stub saw (peak in-flight requests, status codes). Use it to put concurrency
+and backpressure changes under regression:
+
+- ``scoring``: ``score_subjective_question`` × N, all at once
+  (shared ``ScoringClient``: semaphores, retries, circuit breaker)
+- ``batch``: ``score_subjective_batch`` per session of ``--session-items``
+- ``tagging``: ``QuestionTagger.tag_all`` over N questions (``AsyncOpenAI``)
+- ``vision``: image_url chat requests × N via ``AsyncOpenAI``
+
+By default the stub runs in process (``httpx.ASGITransport``); with
+``--base-url`` the requests go to a stub started separately, e.g.
+``python -m src.basis_expert_council.llm_stub --port 8900``, whose config is
+set through ``/_stub/config``.
+
+Usage:
+    python benchmarks/bench_llm_pipelines.py --requests 200 --latency-ms 300
+    python benchmarks/bench_llm_pipelines.py --scenarios scoring --error-rate 0.1 --stub-max-concurrency 8
+    python benchmarks/bench_llm_pipelines.py --base-url http://127.0.0.1:8900
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from dataclasses import asdict
+
+import httpx
+from openai import AsyncOpenAI
+
+from basis_expert_council import metrics
+from basis_expert_council.assessment import agent_scoring
+from basis_expert_council.assessment.llm_client import ScoringClient
+from basis_expert_council.llm_stub import LATENCY_DISTRIBUTIONS, StubConfig, create_app
+
+SCENARIOS = ("scoring", "batch", "tagging", "vision")
+
+STEMS = [
+    "解释光合作用中光反应和暗反应的关系。",
+    "Describe the causes of the French Revolution.",
+    "设计一个实验验证温度对酶活性的影响。",
+    "Why does the moon show phases?",
+]
+
+
+class _NoCache:
+    """Every call must reach the model."""
+
+    def key(self, *args):
+        return args
+
+    async def get(self, key):
+        return None
+
+    async def put(self, key, *result):
+        return None
+
+
+def _essay(i: int) -> tuple[dict, str]:
+    question = {"id": i + 1, "question_type": "essay", "content_zh": {"stem": STEMS[i % len(STEMS)]}}
+    return question, f"学生答案 {i + 1}：" + "涵盖定义、过程与例子的较长回答。" * 4
+
+
+def _question_row(i: int) -> dict:
+    return {
+        "id": i + 1, "subject": "math", "grade_level": "G7", "topic": "algebra", "question_type": "mcq",
+        "content_en": {"stem": f"Solve x + {i} = {i + 7}.", "options": ["A. 5", "B. 6", "C. 7", "D. 8"]},
+        "difficulty": 0.5, "metadata": {},
+    }
+
+
+def _pct(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _timed(samples: list[float], coro):
+    t0 = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        samples.append((time.perf_counter() - t0) * 1000)
+
+
+# ---------------------------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------------------------
+
+
+async def _scoring(n: int, args, samples: list[float]) -> int:
+    results = await asyncio.gather(*(
+        _timed(samples, agent_scoring.score_subjective_question(*_essay(i))) for i in range(n)
+    ))
+    return len(results)
+
+
+async def _batch(n: int, args, samples: list[float]) -> int:
+    k = args.session_items
+    sessions = [[_essay(i) for i in range(s, min(n, s + k))] for s in range(0, n, k)]
+    results = await asyncio.gather(*(
+        _timed(samples, agent_scoring.score_subjective_batch(items)) for items in sessions
+    ))
+    return sum(len(r) for r in results)
+
+
+async def _tagging(n: int, args, samples: list[float], openai_client: AsyncOpenAI) -> int:
+    from basis_expert_council.taxonomy.tagger import QuestionTagger
+
+    os.environ.setdefault("TAXONOMY_API_KEY", "stub")  # client is replaced below
+    tagger = QuestionTagger(model="stub", batch_size=args.tag_batch_size, dry_run=True)
+    tagger.client = openai_client
+    original = tagger.tag_batch
+
+    async def timed_batch(questions):
+        return await _timed(samples, original(questions))
+
+    tagger.tag_batch = timed_batch
+    results = await tagger.tag_all([_question_row(i) for i in range(n)])
+    return sum(1 for _, tags in results if tags.tagged_at is not None)
+
+
+async def _vision(n: int, args, samples: list[float], openai_client: AsyncOpenAI) -> int:
+    message = [{"role": "user", "content": [
+        {"type": "text", "text": "请识别图片中的题目"},
+        {"type": "image_url", "image_url": {"url": "data:image/png;base64,iVBORw0KGgo="}},
+    ]}]
+
+    async def one():
+        resp = await openai_client.chat.completions.create(model="stub", messages=message)
+        return resp.choices[0].message.content
+
+    results = await asyncio.gather(*(_timed(samples, one()) for _ in range(n)), return_exceptions=True)
+    return sum(1 for r in results if isinstance(r, str))
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+
+async def _stub_stats(http: httpx.AsyncClient) -> dict:
+    return (await http.get("/_stub/stats")).json()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=100, help="items per scenario")
+    parser.add_argument("--base-url", default=None, help="stub root URL (default: in process)")
+    parser.add_argument("--session-items", type=int, default=6)
+    parser.add_argument("--tag-batch-size", type=int, default=5)
+    parser.add_argument("--client-concurrency", type=int, default=16, help="ScoringClient max_concurrency")
+    parser.add_argument("--model-concurrency", type=int, default=8, help="ScoringClient model_concurrency")
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--latency-spread", type=float, default=0.5)
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--stub-max-concurrency", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency=args.latency, latency_ms=args.latency_ms, latency_spread=args.latency_spread,
+        tokens_per_sec=args.tokens_per_sec, error_rate=args.error_rate,
+        max_concurrency=args.stub_max_concurrency, retry_after=None, seed=args.seed,
+    )
+    if args.base_url:
+        root, transport = args.base_url.rstrip("/"), None
+    else:
+        root, transport = "http://stub", httpx.ASGITransport(app=create_app(config))
+    http = httpx.AsyncClient(base_url=root, transport=transport, timeout=600)
+    openai_client = AsyncOpenAI(
+        base_url=f"{root}/v1", api_key="stub", max_retries=args.retries,
+        http_client=httpx.AsyncClient(transport=transport, timeout=600),
+    )
+    scoring = ScoringClient(
+        base_url=f"{root}/v1", api_key="stub", max_concurrency=args.client_concurrency,
+        model_concurrency=args.model_concurrency, retries=args.retries, transport=transport,
+    )
+    agent_scoring.scoring_client = scoring
+    agent_scoring.scoring_cache = _NoCache()
+
+    rows = []
+    for name in args.scenarios.split(","):
+        if args.base_url:
+            await http.post("/_stub/config", json={k: v for k, v in asdict(config).items()})
+        await http.post("/_stub/reset")
+        metrics.reset()
+        samples: list[float] = []
+        t0 = time.perf_counter()
+        if name == "scoring":
+            done = await _scoring(args.requests, args, samples)
+        elif name == "batch":
+            done = await _batch(args.requests, args, samples)
+        elif name == "tagging":
+            done = await _tagging(args.requests, args, samples, openai_client)
+        elif name == "vision":
+            done = await _vision(args.requests, args, samples, openai_client)
+        else:
+            raise SystemExit(f"unknown scenario {name!r}; choose from {SCENARIOS}")
+        wall = time.perf_counter() - t0
+        stats = await _stub_stats(http)
+        fallbacks = sum(v for k, v in metrics.snapshot()["counters"].items() if k.startswith("scoring.fallback"))
+        rows.append({
+            "scenario": name, "items": args.requests, "done": done, "wall_s": wall,
+            "items_per_s": args.requests / wall if wall else 0.0,
+            "p50_ms": _pct(samples, 0.5), "p95_ms": _pct(samples, 0.95), "fallbacks": int(fallbacks),
+            "stub_requests": stats["requests"], "stub_peak": stats["peak_in_flight"],
+            "stub_errors": sum(v for k, v in stats["by_status"].items() if k != "200"),
+        })
+
+    await scoring.aclose()
+    await openai_client.close()
+    await http.aclose()
+
+    print(f"{'scenario':9s} {'items':>6s} {'done':>6s} {'wall_s':>7s} {'items/s':>8s} {'p50_ms':>8s} "
+          f"{'p95_ms':>8s} {'fallbk':>6s} {'stub_req':>8s} {'peak':>5s} {'errors':>6s}")
+    for r in rows:
+        print(f"{r['scenario']:9s} {r['items']:6d} {r['done']:6d} {r['wall_s']:7.2f} {r['items_per_s']:8.1f} "
+              f"{r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['fallbacks']:6d} {r['stub_requests']:8d} "
+              f"{r['stub_peak']:5d} {r['stub_errors']:6d}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
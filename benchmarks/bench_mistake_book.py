@@ -0,0 +1,143 @@
+"""
+Mistake-book maintenance benchmark: per-row upserts vs. set-based fold.
+
+Replays the same synthetic answer history for two fresh users:
+
+- ``legacy``: the previous loop (one ``db.upsert_mistake_book_entry`` /
+  ``db.record_correct_after_wrong`` round trip per answer, content JSON
+  decoded per wrong answer); kept here for comparison only
+- ``bulk``: ``academic_profile.scan_and_update_mistake_book`` (lock existing
+  entries, fold in memory, one ``unnest`` upsert)
+
+Answers are folded in chunks of ``--chunk`` (a full rebuild with the default
+0, or e.g. 15 for session-sized incremental refreshes). Afterwards the two
+mistake books are compared column by column.
+
+Usage:
+    BASIS_DATABASE_URL=postgresql://... python benchmarks/bench_mistake_book.py --answers 5000
+    BASIS_DATABASE_URL=postgresql://... python benchmarks/bench_mistake_book.py --answers 5000 --chunk 15
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from basis_expert_council import academic_profile as ap
+from basis_expert_council import db
+
+_COMPARE = """
+    SELECT question_id, subject, topic, difficulty, first_wrong_at, last_wrong_at,
+           wrong_count, correct_after_wrong, mastery_status, mastered_at IS NOT NULL AS mastered,
+           bloom_level, misconception_ids, skill_tags, last_wrong_answer, correct_answer,
+           explanation_zh, question_stem_zh, question_stem_en
+    FROM mistake_book_entries WHERE user_id = $1 ORDER BY question_id
+"""
+
+
+async def _legacy_fold(user_id: int, rows) -> None:
+    existing_ids = await db.get_mistake_book_question_ids(user_id)
+    for row in rows:
+        qid = row["question_id"]
+        is_correct = row["is_correct"]
+        if not is_correct and is_correct is not None:
+            bloom, mcs, skills = ap._parse_question_tags(row["tags"] or [])
+            content_zh = row["content_zh"] or {}
+            content_en = row["content_en"] or {}
+            if isinstance(content_zh, str):
+                content_zh = json.loads(content_zh)
+            if isinstance(content_en, str):
+                content_en = json.loads(content_en)
+            user_answer = row["user_answer"]
+            if isinstance(user_answer, str):
+                try:
+                    user_answer = json.loads(user_answer)
+                except (json.JSONDecodeError, TypeError):
+                    user_answer = {"text": user_answer}
+            await db.upsert_mistake_book_entry(
+                user_id, qid,
+                subject=row["subject"], topic=row["topic"], subtopic=row["subtopic"],
+                difficulty=float(row["difficulty"]), wrong_at=row["created_at"],
+                bloom_level=bloom,
+                misconception_ids=mcs if mcs else None,
+                skill_tags=skills if skills else None,
+                last_wrong_answer=user_answer if isinstance(user_answer, dict) else None,
+                correct_answer=content_zh.get("answer") or content_en.get("answer"),
+                explanation_zh=row["explanation_zh"], explanation_en=row["explanation_en"],
+                question_stem_zh=content_zh.get("stem"), question_stem_en=content_en.get("stem"),
+            )
+            existing_ids.add(qid)
+        elif is_correct and qid in existing_ids:
+            await db.record_correct_after_wrong(user_id, qid)
+
+
+async def _history(conn, n: int, questions: int, rng: random.Random) -> list[dict]:
+    qrows = await conn.fetch(
+        """SELECT id, subject, topic, subtopic, difficulty, tags, content_zh, content_en,
+                  explanation_zh, explanation_en
+           FROM assessment_questions ORDER BY id LIMIT $1""",
+        questions,
+    )
+    if not qrows:
+        raise SystemExit("empty question bank; run init_schema + seeding first")
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    rows = []
+    for i in range(n):
+        q = rng.choice(qrows)
+        rows.append({
+            "id": i + 1, "question_id": q["id"], "is_correct": rng.random() < 0.55,
+            "user_answer": json.dumps({"selected": rng.choice("ABCD")}),
+            "created_at": start + timedelta(minutes=10 * i), "completed_at": start + timedelta(minutes=10 * i),
+            **{k: q[k] for k in ("subject", "topic", "subtopic", "difficulty", "tags", "content_zh",
+                                 "content_en", "explanation_zh", "explanation_en")},
+        })
+    return rows
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--answers", type=int, default=3000)
+    parser.add_argument("--questions", type=int, default=400, help="distinct questions the answers draw from")
+    parser.add_argument("--chunk", type=int, default=0, help="answers per refresh (0 = all at once)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    await db.init_schema()
+    pool = await db.get_pool()
+    async with pool.acquire() as conn:
+        rows = await _history(conn, args.answers, args.questions, random.Random(args.seed))
+        users = {}
+        for mode in ("legacy", "bulk"):
+            users[mode] = await conn.fetchval(
+                "INSERT INTO biz_users (nickname) VALUES ($1) RETURNING id", f"bench-mistakes-{mode}",
+            )
+
+    chunk = args.chunk or len(rows)
+    chunks = [rows[i:i + chunk] for i in range(0, len(rows), chunk)]
+    timings = {}
+    for mode, uid in users.items():
+        t0 = time.perf_counter()
+        for part in chunks:
+            if mode == "legacy":
+                await _legacy_fold(uid, part)
+            else:
+                async with pool.acquire() as conn:
+                    await ap.scan_and_update_mistake_book(uid, conn, part)
+        timings[mode] = time.perf_counter() - t0
+
+    async with pool.acquire() as conn:
+        legacy = [dict(r) for r in await conn.fetch(_COMPARE, users["legacy"])]
+        bulk = [dict(r) for r in await conn.fetch(_COMPARE, users["bulk"])]
+        await conn.execute("DELETE FROM biz_users WHERE id = ANY($1::int[])", list(users.values()))
+    await db.close_pool()
+
+    print(f"answers={len(rows)} refreshes={len(chunks)} entries={len(bulk)}")
+    for mode, seconds in timings.items():
+        print(f"{mode:7s} {seconds * 1000:9.1f} ms  {len(rows) / seconds:9.0f} answers/s")
+    print(f"speedup {timings['legacy'] / timings['bulk']:.1f}x, identical states: {legacy == bulk}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
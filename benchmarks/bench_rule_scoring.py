@@ -0,0 +1,128 @@
+"""
+Rule-scoring micro-benchmark: per-answer cost of ``score_question``.
+
+Compares the legacy scorers (re-parse content and re-normalize on every
+call; kept here verbatim for comparison) with the precompiled matchers of
+``assessment.matchers`` for every question type. Question content is a JSON
+string, as it comes back from Postgres.
+
+Usage:
+    python benchmarks/bench_rule_scoring.py --iterations 200000
+"""
+
+import argparse
+import json
+import re
+import time
+from datetime import datetime, timezone
+
+from basis_expert_council import assessment_engine as eng
+from basis_expert_council.assessment.matchers import matcher_cache
+
+
+def _legacy_score_mcq(question: dict, user_answer) -> tuple[bool, float]:
+    content = question.get("content_en") or question.get("content_zh") or {}
+    if isinstance(content, str):
+        content = json.loads(content)
+    correct_answer = content.get("answer", "")
+    if isinstance(user_answer, dict):
+        given = user_answer.get("selected", "")
+    elif isinstance(user_answer, str):
+        try:
+            parsed = json.loads(user_answer)
+            given = parsed.get("selected", user_answer) if isinstance(parsed, dict) else user_answer
+        except (json.JSONDecodeError, TypeError):
+            given = user_answer
+    else:
+        given = str(user_answer)
+    is_correct = str(given).strip().upper() == str(correct_answer).strip().upper()
+    return is_correct, 1.0 if is_correct else 0.0
+
+
+def _legacy_score_fill_in(question: dict, user_answer) -> tuple[bool, float]:
+    content = question.get("content_en") or question.get("content_zh") or {}
+    if isinstance(content, str):
+        content = json.loads(content)
+    correct_answer = str(content.get("answer", "")).strip()
+    if isinstance(user_answer, dict):
+        given = str(user_answer.get("text", "")).strip()
+    elif isinstance(user_answer, str):
+        try:
+            parsed = json.loads(user_answer)
+            given = str(parsed.get("text", user_answer)).strip() if isinstance(parsed, dict) else user_answer.strip()
+        except (json.JSONDecodeError, TypeError):
+            given = user_answer.strip()
+    else:
+        given = str(user_answer).strip()
+    norm_correct = re.sub(r'\s+', ' ', correct_answer.lower())
+    norm_given = re.sub(r'\s+', ' ', given.lower())
+    acceptable = [a.strip().lower() for a in correct_answer.split("|")]
+    is_correct = norm_given in acceptable or norm_given == norm_correct
+    return is_correct, 1.0 if is_correct else 0.0
+
+
+def _legacy_score_question(question: dict, user_answer):
+    if user_answer is None:
+        return False, 0.0
+    q_type = question.get("question_type", "")
+    if q_type == "mcq":
+        return _legacy_score_mcq(question, user_answer)
+    if q_type == "fill_in":
+        return _legacy_score_fill_in(question, user_answer)
+    return None, None
+
+
+def _question(qid: int, q_type: str, content: dict) -> dict:
+    return {
+        "id": qid, "question_type": q_type, "content_en": json.dumps(content, ensure_ascii=False),
+        "updated_at": datetime(2026, 1, 1, tzinfo=timezone.utc), "version": 1,
+    }
+
+
+MCQ = _question(1, "mcq", {
+    "stem": "Jane has 6 flowers. She planted 3 more. How many now?",
+    "options": ["A. 3", "B. 6", "C. 7", "D. 8", "E. 9"], "answer": "E",
+})
+FILL_TEXT = _question(2, "fill_in", {"stem": "Capital of France?", "answer": "Paris|paris city"})
+FILL_NUMERIC = _question(3, "fill_in", {"stem": "3 ÷ 4 = ?", "answer": "0.75|3/4"})
+FILL_UNIT = _question(4, "fill_in", {"stem": "Perimeter?", "answer": "12 cm"})
+ESSAY = _question(5, "essay", {"stem": "Discuss."})
+
+CASES = [
+    ("mcq key", MCQ, "E"),
+    ("mcq json", MCQ, '{"selected": "E"}'),
+    ("mcq dict", MCQ, {"selected": "e"}),
+    ("fill_in text", FILL_TEXT, {"text": "  PARIS "}),
+    ("fill_in numeric", FILL_NUMERIC, {"text": "3/4"}),
+    ("fill_in unit", FILL_UNIT, {"text": "12cm"}),
+    ("essay", ESSAY, {"text": "..."}),
+]
+
+
+def _ns_per_call(fn, question, answer, iterations: int) -> float:
+    t0 = time.perf_counter_ns()
+    for _ in range(iterations):
+        fn(question, answer)
+    return (time.perf_counter_ns() - t0) / iterations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    for q in (MCQ, FILL_TEXT, FILL_NUMERIC, FILL_UNIT):
+        matcher_cache.compile(q)
+
+    print(f"{'case':18s} {'legacy ns':>10s} {'compiled ns':>12s} {'speedup':>8s}  legacy/compiled result")
+    for name, question, answer in CASES:
+        legacy = _ns_per_call(_legacy_score_question, question, answer, args.iterations)
+        compiled = _ns_per_call(eng.score_question, question, answer, args.iterations)
+        print(
+            f"{name:18s} {legacy:10.0f} {compiled:12.0f} {legacy / compiled:7.1f}x  "
+            f"{_legacy_score_question(question, answer)[0]}/{eng.score_question(question, answer)[0]}"
+        )
+
+
+if __name__ == "__main__":
+    main()
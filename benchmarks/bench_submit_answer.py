@@ -0,0 +1,122 @@
+"""
+Answer-submission latency benchmark: legacy multi-query path vs. single CAS statement.
+
+The legacy path reproduces the pre-index pipeline (get session, get question,
+get answers, save answer, increment usage, SQL find-next cascade — one pool
+acquisition each). The current path is ``assessment_engine.submit_answer``.
+
+Usage:
+    BASIS_DATABASE_URL=postgresql://... python benchmarks/bench_submit_answer.py \\
+        --sessions 50 --concurrency 8
+
+Requires a database with the seed question bank (``init_schema`` + seeding is
+done automatically). Scoring is rules-only (MCQ), so no LLM calls are made.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from basis_expert_council import assessment_engine as eng
+from basis_expert_council import db
+from basis_expert_council.assessment.item_pool import item_pool
+from basis_expert_council.assessment.usage_buffer import usage_buffer
+
+
+async def _legacy_submit(session_id: str, question_id: int, answer: str) -> dict | None:
+    """Baseline pipeline, kept here for comparison only."""
+    session = await db.get_assessment_session(session_id)
+    question = await db.get_question(question_id)
+    answers = await db.get_session_answers(session_id)
+    max_q = eng.QUESTION_COUNT.get(session["assessment_type"], 15)
+    is_correct, score = eng.score_question(question, answer)
+    await db.save_answer(
+        session_id=session_id,
+        question_id=question_id,
+        question_order=len(answers) + 1,
+        user_answer={"text": answer},
+        is_correct=is_correct,
+        score=score,
+        difficulty_at=question["difficulty"],
+    )
+    if is_correct is not None:
+        await db.increment_question_usage(question_id, is_correct)
+    state = eng._rebuild_cat_state(session, answers, max_q)
+    state.answered_question_ids.append(question_id)
+    state.question_count += 1
+    if state.question_count >= max_q:
+        return None
+    state.current_difficulty = eng.compute_next_difficulty(state, bool(is_correct))
+    return await db.find_next_question(
+        subject=session["subject"],
+        grade_level=session["grade_level"],
+        target_difficulty=state.current_difficulty,
+        exclude_ids=state.answered_question_ids,
+    )
+
+
+async def _run_session(mode: str, latencies: list[float], rng: random.Random) -> None:
+    started = await eng.start_session(
+        assessment_type="pre_admission", subject="math", grade_level="G7",
+    )
+    session_id = str(started["session"]["id"])
+    question = started["first_question"]
+    while question:
+        answer = rng.choice("ABCD")
+        t0 = time.perf_counter()
+        if mode == "legacy":
+            question = await _legacy_submit(session_id, question["id"], answer)
+        else:
+            result = await eng.submit_answer(session_id, question["id"], answer)
+            question = None if result["is_last"] else result["next_question"]
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+
+async def _bench(mode: str, sessions: int, concurrency: int) -> list[float]:
+    latencies: list[float] = []
+    sem = asyncio.Semaphore(concurrency)
+    rng = random.Random(42)
+
+    async def one() -> None:
+        async with sem:
+            await _run_session(mode, latencies, rng)
+
+    await asyncio.gather(*(one() for _ in range(sessions)))
+    return latencies
+
+
+def _report(mode: str, latencies: list[float], elapsed: float) -> None:
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))]  # noqa: E731
+    print(
+        f"{mode:8s} answers={len(latencies):5d}  "
+        f"mean={statistics.mean(latencies):7.2f}ms  p50={p(0.50):7.2f}ms  "
+        f"p95={p(0.95):7.2f}ms  p99={p(0.99):7.2f}ms  "
+        f"throughput={len(latencies) / elapsed:7.1f}/s"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    await db.init_schema()
+    from basis_expert_council.assessment.seed_questions import seed_question_bank
+    await seed_question_bank()
+    await item_pool.ensure_loaded()
+
+    for mode in ("legacy", "current"):
+        t0 = time.perf_counter()
+        latencies = await _bench(mode, args.sessions, args.concurrency)
+        _report(mode, latencies, time.perf_counter() - t0)
+
+    await usage_buffer.stop()
+    await db.close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
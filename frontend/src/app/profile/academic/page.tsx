@@ -32,6 +32,7 @@ interface AcademicData {
   meta?: {
     computed_at?: string;
     version?: number;
+    stale?: boolean; // cached payload served while a background refresh runs
     data_range?: { first_session?: string; last_session?: string };
   };
   student: {
@@ -104,6 +105,10 @@ interface AcademicData {
   activity_heatmap?: Record<string, { questions: number; correct: number; messages: number }>;
 }
 
+// While the API serves a stale profile, re-fetch until the refresh lands
+const STALE_POLL_MS = 2000;
+const STALE_POLL_MAX = 15;
+
 // ---------------------------------------------------------------------------
 // Page
 // ---------------------------------------------------------------------------
@@ -114,6 +119,7 @@ export default function AcademicProfilePage() {
   const [data, setData] = useState<AcademicData | null>(null);
   const [loading, setLoading] = useState(true);
   const [refreshing, setRefreshing] = useState(false);
+  const [stalePolls, setStalePolls] = useState(0);
   const [error, setError] = useState<string | null>(null);
 
   // Parent: select child
@@ -126,9 +132,12 @@ export default function AcademicProfilePage() {
   const [mistakeStatus, setMistakeStatus] = useState<string | null>(null);
   const [mistakeSort, setMistakeSort] = useState<"time" | "count">("time");
 
-  const fetchData = useCallback(async () => {
-    setLoading(true);
-    setError(null);
+  const fetchData = useCallback(async (silent = false) => {
+    if (!silent) {
+      setLoading(true);
+      setStalePolls(0);
+      setError(null);
+    }
     try {
       const params = selectedStudentId ? `?student_id=${selectedStudentId}` : "";
       const res = await fetchWithAuth(`/api/academic/profile${params}`);
@@ -139,13 +148,13 @@ export default function AcademicProfilePage() {
         } else {
           setData(json);
         }
-      } else {
+      } else if (!silent) {
         setError("Failed to load academic profile");
       }
     } catch {
-      setError("Network error");
+      if (!silent) setError("Network error");
     } finally {
-      setLoading(false);
+      if (!silent) setLoading(false);
     }
   }, [selectedStudentId]);
 
@@ -158,6 +167,15 @@ export default function AcademicProfilePage() {
     fetchData();
   }, [profile, userLoading, fetchData]);
 
+  useEffect(() => {
+    if (!data?.meta?.stale || stalePolls >= STALE_POLL_MAX) return;
+    const timer = setTimeout(() => {
+      setStalePolls((n) => n + 1);
+      fetchData(true);
+    }, STALE_POLL_MS);
+    return () => clearTimeout(timer);
+  }, [data, stalePolls, fetchData]);
+
   const handleRefresh = async () => {
     setRefreshing(true);
     try {
@@ -166,10 +184,9 @@ export default function AcademicProfilePage() {
         method: "POST",
       });
       if (res.ok) {
-        const json = await res.json();
-        if (json.profile) {
-          setData(json.profile);
-        }
+        // 202: recomputing in the background; the stale payload keeps polling
+        setStalePolls(0);
+        await fetchData(true);
       }
     } catch {
       // silent
@@ -271,7 +288,7 @@ export default function AcademicProfilePage() {
               kpi={data.kpi}
               computedAt={data.meta?.computed_at}
               onRefresh={handleRefresh}
-              refreshing={refreshing}
+              refreshing={refreshing || !!data?.meta?.stale}
               t={t}
             />
 
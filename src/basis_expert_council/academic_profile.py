@@ -4,25 +4,63 @@ BasisPilot (贝领) — 学力档案 v2 计算引擎
 
 核心函数: compute_academic_profile(user_id) → dict
 执行流程:
-  1. scan_and_update_mistake_book  — 扫描所有答题记录，维护错题本
-  2. compute_topic_mastery         — 按 (subject, topic) 统计能力分数
+  1. scan_and_update_mistake_book  — 折叠尚未计入的已评分答案，维护错题本
+  2. compute_topic_mastery         — 按 (subject, topic) 累计计数更新能力分数
   3. extract_goals_from_mem0       — 从 Mem0 记忆提取学习目标
   4. compute_goal_gaps             — 计算当前能力与目标的差距
   5. build_activity_heatmap        — 构建 90 天活跃度热力图
   6. build_and_cache_payload       — 组装完整 JSON 并缓存
+步骤 3 是 Mem0 网络调用，最先在事务外执行；其余步骤与答案的 profile_folded 标记
+在同一事务内提交，失败时整体回滚。
 """
 
+import asyncio
 import json
 import logging
+import os
 import re
 import time
+from collections.abc import AsyncIterator
 from datetime import datetime, timezone
 
-from . import db
+from . import db, metrics
 from .memory import get_memory, user_id_to_mem0
 
 logger = logging.getLogger("basis.academic_profile")
 
+# 延迟评分中的答案（is_correct 为 NULL）在会话完成后这段时间内阻塞其后答案的折叠（保持错题本时序）；
+# 超过后跳过，评分落库时再折叠
+SCORE_PENDING_GRACE_SEC = int(os.getenv("BASIS_PROFILE_PENDING_GRACE", "3600"))
+
+# 单飞: user_id → 进行中的计算任务，并发请求共享同一结果
+_inflight: dict[int, asyncio.Task] = {}
+
+# pg_advisory_lock(namespace, user_id) 的命名空间（跨副本互斥同一用户的计算）
+_LOCK_NAMESPACE = 0x5043  # "PC"
+
+# 缓存超过这个时间（秒）即视为过期：读请求照常返回，同时后台刷新（热力图窗口按天滑动）
+PROFILE_MAX_AGE_SEC = int(os.getenv("BASIS_PROFILE_MAX_AGE", "86400"))
+
+# 进程内同时进行的档案计算上限（交卷 / 读路径后台刷新 / 家长批量 / 夜间调度共享）。
+# 每个计算只占一条连接（咨询锁与全部查询同连接），须小于连接池大小
+PROFILE_COMPUTE_CONCURRENCY = int(os.getenv("BASIS_PROFILE_COMPUTE_CONCURRENCY", "4"))
+_compute_slots: tuple[asyncio.AbstractEventLoop, asyncio.Semaphore] | None = None
+
+# 后台刷新任务的强引用，防止被 GC 回收
+_background: set[asyncio.Task] = set()
+
+# 计算进行中又收到刷新请求的用户：当前计算结束后再补算一次
+_rerun: set[int] = set()
+
+
+def compute_slots() -> asyncio.Semaphore:
+    """进程级计算并发闸门（按事件循环惰性创建）。"""
+    global _compute_slots
+    loop = asyncio.get_running_loop()
+    if _compute_slots is None or _compute_slots[0] is not loop:
+        _compute_slots = (loop, asyncio.Semaphore(PROFILE_COMPUTE_CONCURRENCY))
+    return _compute_slots[1]
+
 
 # ---------------------------------------------------------------------------
 # 主入口
@@ -30,75 +68,366 @@ logger = logging.getLogger("basis.academic_profile")
 
 
 async def compute_academic_profile(user_id: int) -> dict:
-    """计算并缓存用户的完整学力档案，返回 profile JSON。"""
+    """计算并缓存用户的完整学力档案，返回 profile JSON。
+
+    Step 1/2 是增量的：只折叠尚未标记 profile_folded 的已评分答案，累计计数存于 academic_profile_cache。
+    同一用户的并发调用（交卷后台重算、GET 缓存过期、手动刷新）等待同一次计算；
+    调用方取消不会中断共享的计算。
+    """
+    task = _inflight.get(user_id)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.ensure_future(_compute_single_flight(user_id))
+        _inflight[user_id] = task
+        task.add_done_callback(lambda t: _inflight.pop(user_id, None) if _inflight.get(user_id) is t else None)
+    else:
+        metrics.incr("academic_profile.joined")
+    return await asyncio.shield(task)
+
+
+async def read_profile(user_id: int) -> dict:
+    """读路径：不等待计算。
+
+    有缓存时原样返回（过期或被标脏则 meta.stale=True 并后台刷新）；
+    没有缓存时只读组装一份当前数据（不折叠新答案）并后台计算。
+    返回 {"body": JSON 文本, "etag": str | None, "stale": bool}。
+    """
+    state = await db.get_profile_cache_state(user_id, PROFILE_MAX_AGE_SEC)
+    if state is None:
+        metrics.incr("academic_profile.read", outcome="cold")
+        refresh_in_background(user_id)
+        payload = await _build_payload(user_id, await db.get_activity_heatmap(user_id))
+        if "meta" in payload:
+            payload["meta"]["stale"] = True
+        return {"body": json.dumps(payload, ensure_ascii=False, default=str), "etag": None, "stale": True}
+
+    etag = f'{user_id}-{state["version"]}'
+    body = state["profile_data"]
+    if not state["stale"]:
+        # 新鲜缓存直接返回 JSONB 文本，不解析不重新序列化
+        metrics.incr("academic_profile.read", outcome="fresh")
+        return {"body": body, "etag": f'W/"{etag}"', "stale": False}
+
+    metrics.incr("academic_profile.read", outcome="stale")
+    refresh_in_background(user_id)
+    payload = json.loads(body)
+    payload.setdefault("meta", {})["stale"] = True
+    return {"body": json.dumps(payload, ensure_ascii=False), "etag": f'W/"{etag}-stale"', "stale": True}
+
+
+async def stream_profiles(user_ids: list[int]) -> AsyncIterator[str]:
+    """家长批量视图：一次查询读取全部缓存，按 NDJSON 逐行输出。
+
+    新鲜的缓存原样立即输出；过期 / 缺失的并发计算（受进程级 compute_slots 限制，与其他来源共享），
+    完成一个输出一个（计算失败时退回旧缓存并标 meta.stale）。
+    每行: {"student_id", "status": fresh | computed | stale | error, "profile"}
+    """
+    states = await db.get_profile_cache_states(user_ids, PROFILE_MAX_AGE_SEC)
+    pending = []
+    for uid in user_ids:
+        state = states.get(uid)
+        if state and not state["stale"]:
+            yield _ndjson_line(uid, "fresh", state["profile_data"])
+        else:
+            pending.append(uid)
+    metrics.incr("academic_profile.batch_fresh", len(user_ids) - len(pending))
+    if not pending:
+        return
+
+    async def one(uid: int) -> str:
+        try:
+            payload = await compute_academic_profile(uid)
+            return _ndjson_line(uid, "computed", json.dumps(payload, ensure_ascii=False, default=str))
+        except Exception as e:
+            logger.warning(f"Batch profile compute failed for user {uid}: {e}")
+        state = states.get(uid)
+        if state is None:
+            return _ndjson_line(uid, "error", "null")
+        payload = json.loads(state["profile_data"])
+        payload.setdefault("meta", {})["stale"] = True
+        return _ndjson_line(uid, "stale", json.dumps(payload, ensure_ascii=False))
+
+    for line in asyncio.as_completed([one(uid) for uid in pending]):
+        yield await line
+
+
+def _ndjson_line(user_id: int, status: str, profile_json: str) -> str:
+    # profile_json 已是 JSON 文本，直接拼接，避免解析后重新序列化
+    return f'{{"student_id": {int(user_id)}, "status": "{status}", "profile": {profile_json}}}\n'
+
+
+def refresh_in_background(user_id: int) -> None:
+    """触发一次计算，不等待结果。
+
+    已有进行中的计算时，它可能在新数据写入前就读完了，因此在其结束后补算一次
+    （同一轮内多次请求只补算一次）。
+    """
+    running = _inflight.get(user_id)
+    if running is not None and not running.done():
+        if user_id not in _rerun:
+            _rerun.add(user_id)
+
+            def rerun(_task: asyncio.Task) -> None:
+                _rerun.discard(user_id)
+                refresh_in_background(user_id)
+
+            running.add_done_callback(rerun)
+        return
+    task = asyncio.ensure_future(_safe_refresh(user_id))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def _safe_refresh(user_id: int) -> None:
+    try:
+        await compute_academic_profile(user_id)
+    except Exception as e:
+        metrics.incr("academic_profile.refresh_failed")
+        logger.warning(f"Background profile refresh failed for user {user_id}: {e}")
+
+
+async def _compute_single_flight(user_id: int) -> dict:
+    """跨副本: 持有用户级咨询锁计算。需要等锁时，等到的若是其他副本刚写入的缓存，直接复用。
+
+    先占进程级计算名额再借连接；咨询锁与整个计算共用这一条连接。
+    """
+    async with compute_slots(), db.acquire() as lock_conn:
+        if await lock_conn.fetchval("SELECT pg_try_advisory_lock($1, $2)", _LOCK_NAMESPACE, user_id):
+            metrics.incr("academic_profile.computed")
+        else:
+            seen_version = await lock_conn.fetchval(
+                "SELECT COALESCE(MAX(version), 0) FROM academic_profile_cache WHERE user_id = $1", user_id,
+            )
+            await lock_conn.execute("SELECT pg_advisory_lock($1, $2)", _LOCK_NAMESPACE, user_id)
+            # 等锁期间缓存被重写，且没有晚于其开始时刻的标脏，才复用
+            fresh = await lock_conn.fetchval(
+                """
+                SELECT p.profile_data FROM academic_profile_cache p
+                LEFT JOIN profile_refresh_marks m ON m.user_id = p.user_id
+                WHERE p.user_id = $1 AND p.version > $2
+                  AND (m.dirty_at IS NULL OR m.dirty_at <= p.computed_at)
+                """,
+                user_id, seen_version,
+            )
+            if fresh is not None:
+                await lock_conn.execute("SELECT pg_advisory_unlock($1, $2)", _LOCK_NAMESPACE, user_id)
+                metrics.incr("academic_profile.reused")
+                return json.loads(fresh) if isinstance(fresh, str) else fresh
+            metrics.incr("academic_profile.computed")
+        try:
+            return await _compute_academic_profile(user_id, lock_conn)
+        finally:
+            await lock_conn.execute("SELECT pg_advisory_unlock($1, $2)", _LOCK_NAMESPACE, user_id)
+
+
+async def _compute_academic_profile(user_id: int, conn) -> dict:
+    """在调用方持有（并已加咨询锁）的连接上完成全部步骤，不再另借连接。
+
+    错题本、知识点掌握度、tallies 与答案的 profile_folded 标记在同一事务内写入：
+    任何一步失败或任务被取消都整体回滚，下次刷新重新折叠，不会重复计数。
+    """
     t0 = time.monotonic()
-    pool = await db.get_pool()
+    # 缓存以开始读取的时刻为 computed_at：计算期间的新标脏仍晚于它
+    started_at = await conn.fetchval("SELECT clock_timestamp()")
+
+    # Step 3: 目标提取（Mem0 网络调用，放在折叠事务之外先做，不持锁等待）
+    await extract_goals_from_mem0(user_id, conn)
+
+    async with conn.transaction():
+        tallies = await db.get_profile_tallies(user_id, conn=conn)
+        rows = await _fetch_new_answers(user_id, conn)
 
-    async with pool.acquire() as conn:
         # Step 1: 错题本
-        await scan_and_update_mistake_book(user_id, conn)
+        await scan_and_update_mistake_book(user_id, conn, rows)
 
         # Step 2: 知识点掌握度
-        await compute_topic_mastery(user_id, conn)
-
-        # Step 3: 目标提取
-        await extract_goals_from_mem0(user_id, conn)
+        touched = fold_answer_tallies(tallies, rows)
+        await compute_topic_mastery(user_id, conn, tallies, touched)
 
         # Step 4: 目标差距
         await compute_goal_gaps(user_id, conn)
 
-    # Step 5 & 6: 组装 payload (uses db helpers that acquire their own conn)
-    activity = await db.get_activity_heatmap(user_id)
-    payload = await _build_payload(user_id, activity)
-
-    elapsed_ms = int((time.monotonic() - t0) * 1000)
-    await db.upsert_profile_cache(user_id, payload, elapsed_ms)
+        # Step 5 & 6: 组装 payload
+        activity = await db.get_activity_heatmap(user_id, conn=conn)
+        payload = await _build_payload(user_id, activity, conn=conn)
+
+        elapsed_ms = int((time.monotonic() - t0) * 1000)
+        await db.upsert_profile_cache(
+            user_id, payload, elapsed_ms,
+            answer_tallies=tallies if rows else None,
+            folded_answer_ids=[r["id"] for r in rows],
+            computed_at=started_at,
+            conn=conn,
+        )
     payload["meta"]["compute_time_ms"] = elapsed_ms
+    payload["meta"]["new_answers"] = len(rows)
 
-    logger.info(f"Academic profile computed for user {user_id} in {elapsed_ms}ms")
+    logger.info(f"Academic profile computed for user {user_id} in {elapsed_ms}ms ({len(rows)} new answers)")
     return payload
 
 
 # ---------------------------------------------------------------------------
-# Step 1: 扫描并更新错题本
+# 增量折叠
 # ---------------------------------------------------------------------------
 
 
-async def scan_and_update_mistake_book(user_id: int, conn) -> None:
-    """扫描所有已完成测评的答题记录，维护错题本状态。"""
-    # 获取该用户所有已在错题本中的 question_ids
-    existing_ids = await db.get_mistake_book_question_ids(user_id)
+async def _fetch_new_answers(user_id: int, conn) -> list:
+    """已完成会话中尚未折叠（profile_folded）的已评分答案，按 (会话完成时间, 答案 id) 正序。
 
-    # 查询所有答题记录（按时间正序）
+    逐条标记而非时间水位：晚提交的会话、晚落库的延迟评分都会在下次刷新时被折叠。
+    评分仍未落库（is_correct 为 NULL）且会话完成不足 SCORE_PENDING_GRACE_SEC 的答案
+    会截断结果，保持错题本按作答顺序折叠；超过宽限期的未评分答案先跳过，
+    评分落库（update_answer_score 同时标脏档案）后再折叠。
+    """
     rows = await conn.fetch(
         """
-        SELECT a.question_id, a.user_answer, a.is_correct, a.created_at,
+        SELECT a.id, a.question_id, a.user_answer, a.is_correct, a.created_at,
+               COALESCE(s.completed_at, s.created_at) AS completed_at,
                q.subject, q.topic, q.subtopic, q.difficulty, q.tags,
                q.content_zh, q.content_en,
                q.explanation_zh, q.explanation_en
         FROM assessment_answers a
         JOIN assessment_questions q ON q.id = a.question_id
         JOIN assessment_sessions s ON s.id = a.session_id
-        WHERE s.user_id = $1 AND s.status = 'completed'
-        ORDER BY a.created_at ASC
+        WHERE s.user_id = $1 AND s.status = 'completed' AND NOT a.profile_folded
+              AND (a.is_correct IS NOT NULL
+                   OR COALESCE(s.completed_at, s.created_at) > NOW() - make_interval(secs => $2))
+        ORDER BY COALESCE(s.completed_at, s.created_at) ASC, a.id ASC
         """,
-        user_id,
+        user_id, SCORE_PENDING_GRACE_SEC,
     )
+    now = datetime.now(timezone.utc)
+    for i, row in enumerate(rows):
+        if row["is_correct"] is None and (now - row["completed_at"]).total_seconds() < SCORE_PENDING_GRACE_SEC:
+            rows = rows[:i]
+            break
+    return [r for r in rows if r["is_correct"] is not None]
+
 
+def fold_answer_tallies(tallies: dict, rows) -> set[tuple[str, str]]:
+    """把新答案累加进 tallies，返回受影响的 (subject, topic)。
+
+    tallies: {subject: {topic: {"total", "correct", "wrong", "bloom": {level: [correct, total]}}}}
+    """
+    touched: set[tuple[str, str]] = set()
     for row in rows:
-        qid = row["question_id"]
         is_correct = row["is_correct"]
+        if is_correct is None:
+            continue
+        subj, topic = row["subject"], row["topic"]
+        t = tallies.setdefault(subj, {}).setdefault(
+            topic, {"total": 0, "correct": 0, "wrong": 0, "bloom": {}},
+        )
+        t["total"] += 1
+        t["correct" if is_correct else "wrong"] += 1
+        for tag in row["tags"] or []:
+            if tag.startswith("bloom:"):
+                counts = t["bloom"].setdefault(tag.split(":", 1)[1], [0, 0])
+                counts[0] += 1 if is_correct else 0
+                counts[1] += 1
+        touched.add((subj, topic))
+    return touched
+
+
+# ---------------------------------------------------------------------------
+# Step 1: 扫描并更新错题本
+# ---------------------------------------------------------------------------
+
 
-        if not is_correct and is_correct is not None:
-            # 答错 → UPSERT 到错题本
-            tags = row["tags"] or []
-            bloom, mcs, skills = _parse_question_tags(tags)
-            content_zh = row["content_zh"] or {}
-            content_en = row["content_en"] or {}
-            if isinstance(content_zh, str):
-                content_zh = json.loads(content_zh)
-            if isinstance(content_en, str):
-                content_en = json.loads(content_en)
+async def scan_and_update_mistake_book(user_id: int, conn, rows) -> int:
+    """把尚未折叠（profile_folded）的新答案折叠进错题本（rows 来自 _fetch_new_answers），返回变更条目数。
+
+    锁定涉及题目的现有条目 → 内存中按答题顺序重放状态迁移 (fold_mistake_book)
+    → 一条 unnest UPSERT 写回最终状态，均在同一事务内；由 _compute_academic_profile
+    调用时该事务嵌套在折叠事务中（savepoint），随答案标记一起提交。
+    """
+    qids = sorted({r["question_id"] for r in rows if r["is_correct"] is not None})
+    if not qids:
+        return 0
+    async with conn.transaction():
+        existing = await conn.fetch(
+            """
+            SELECT question_id, wrong_count, correct_after_wrong, mastery_status, mastered_at,
+                   last_wrong_at, last_wrong_answer, bloom_level, misconception_ids, skill_tags
+            FROM mistake_book_entries
+            WHERE user_id = $1 AND question_id = ANY($2::int[])
+            FOR UPDATE
+            """,
+            user_id, qids,
+        )
+        changed = fold_mistake_book(
+            {r["question_id"]: dict(r) for r in existing}, rows, datetime.now(timezone.utc),
+        )
+        await _write_mistake_book(user_id, conn, list(changed.values()))
+    return len(changed)
+
+
+def _new_mistake_entry(row) -> dict:
+    """首次答错时的完整条目（题目内容只在这里解码一次）。"""
+    content_zh = row["content_zh"] or {}
+    content_en = row["content_en"] or {}
+    if isinstance(content_zh, str):
+        content_zh = json.loads(content_zh)
+    if isinstance(content_en, str):
+        content_en = json.loads(content_en)
+    return {
+        "question_id": row["question_id"],
+        "subject": row["subject"],
+        "topic": row["topic"],
+        "subtopic": row["subtopic"],
+        "difficulty": float(row["difficulty"]),
+        "first_wrong_at": row["created_at"],
+        "last_wrong_at": row["created_at"],
+        "wrong_count": 0,
+        "correct_after_wrong": 0,
+        "mastery_status": "new",
+        "mastered_at": None,
+        "last_wrong_answer": None,
+        "bloom_level": None,
+        "misconception_ids": None,
+        "skill_tags": None,
+        "correct_answer": content_zh.get("answer") or content_en.get("answer"),
+        "explanation_zh": row["explanation_zh"],
+        "explanation_en": row["explanation_en"],
+        "question_stem_zh": content_zh.get("stem"),
+        "question_stem_en": content_en.get("stem"),
+    }
+
+
+def fold_mistake_book(existing: dict[int, dict], rows, now: datetime) -> dict[int, dict]:
+    """按答题顺序重放错题本状态迁移，返回有变化的条目 {question_id: entry}。
+
+    与逐条的 db.upsert_mistake_book_entry / db.record_correct_after_wrong 语义一致:
+    - 答错: wrong_count+1；mastered → regressed（清空 mastered_at），new 保持，其余 → reviewing
+    - 答对（仅已在错题本中的题）: correct_after_wrong+1，≥2 → mastered，否则 → reviewing
+    """
+    changed: dict[int, dict] = {}
+    for row in rows:
+        is_correct = row["is_correct"]
+        if is_correct is None:
+            continue
+        qid = row["question_id"]
+        entry = changed.get(qid)
+        if entry is None and qid in existing:
+            entry = dict(existing[qid])
+            if isinstance(entry["last_wrong_answer"], str):
+                entry["last_wrong_answer"] = json.loads(entry["last_wrong_answer"])
+            # 现有条目只更新状态列；插入列取自本行以满足 NOT NULL
+            for key in ("subject", "topic", "subtopic", "difficulty"):
+                entry[key] = row[key]
+            entry["first_wrong_at"] = entry["last_wrong_at"]
+            for key in ("correct_answer", "explanation_zh", "explanation_en", "question_stem_zh", "question_stem_en"):
+                entry[key] = None
+
+        if not is_correct:
+            if entry is None:
+                entry = _new_mistake_entry(row)
+            elif entry["mastery_status"] == "mastered":
+                entry["mastery_status"] = "regressed"
+                entry["mastered_at"] = None
+            elif entry["mastery_status"] != "new":
+                entry["mastery_status"] = "reviewing"
+            entry["wrong_count"] += 1
+            entry["last_wrong_at"] = row["created_at"]
 
             user_answer = row["user_answer"]
             if isinstance(user_answer, str):
@@ -106,206 +435,205 @@ async def scan_and_update_mistake_book(user_id: int, conn) -> None:
                     user_answer = json.loads(user_answer)
                 except (json.JSONDecodeError, TypeError):
                     user_answer = {"text": user_answer}
+            if isinstance(user_answer, dict):
+                entry["last_wrong_answer"] = user_answer
+
+            bloom, mcs, skills = _parse_question_tags(row["tags"] or [])
+            entry["bloom_level"] = bloom or entry["bloom_level"]
+            entry["misconception_ids"] = mcs or entry["misconception_ids"]
+            entry["skill_tags"] = skills or entry["skill_tags"]
+
+        elif entry is not None:
+            entry["correct_after_wrong"] += 1
+            if entry["correct_after_wrong"] >= 2:
+                entry["mastery_status"] = "mastered"
+                entry["mastered_at"] = now
+            else:
+                entry["mastery_status"] = "reviewing"
+        else:
+            continue
+        changed[qid] = entry
+    return changed
 
-            await db.upsert_mistake_book_entry(
-                user_id, qid,
-                subject=row["subject"],
-                topic=row["topic"],
-                subtopic=row["subtopic"],
-                difficulty=float(row["difficulty"]),
-                wrong_at=row["created_at"],
-                bloom_level=bloom,
-                misconception_ids=mcs if mcs else None,
-                skill_tags=skills if skills else None,
-                last_wrong_answer=user_answer if isinstance(user_answer, dict) else None,
-                correct_answer=content_zh.get("answer") or content_en.get("answer"),
-                explanation_zh=row["explanation_zh"],
-                explanation_en=row["explanation_en"],
-                question_stem_zh=content_zh.get("stem"),
-                question_stem_en=content_en.get("stem"),
-            )
-            existing_ids.add(qid)
-
-        elif is_correct and qid in existing_ids:
-            # 答对且该题在错题本中 → 记录正确
-            await db.record_correct_after_wrong(user_id, qid)
 
+def _jsonb(value) -> str | None:
+    return None if value is None else json.dumps(value, ensure_ascii=False)
 
-# ---------------------------------------------------------------------------
-# Step 2: 计算知识点掌握度
-# ---------------------------------------------------------------------------
 
+async def _write_mistake_book(user_id: int, conn, entries: list[dict]) -> None:
+    """一条 INSERT ... SELECT FROM unnest(...) ON CONFLICT 写回折叠后的条目状态。"""
+    if not entries:
+        return
+    cols = {
+        key: [e[key] for e in entries]
+        for key in (
+            "question_id", "subject", "topic", "subtopic", "difficulty",
+            "first_wrong_at", "last_wrong_at", "wrong_count", "correct_after_wrong",
+            "mastery_status", "mastered_at", "bloom_level",
+            "explanation_zh", "explanation_en", "question_stem_zh", "question_stem_en",
+        )
+    }
+    # text[] 列长度不一，无法组成二维数组 → 以 jsonb[] 传入再展开
+    for key in ("misconception_ids", "skill_tags", "last_wrong_answer", "correct_answer"):
+        cols[key] = [_jsonb(e[key] or None) for e in entries]
 
-async def compute_topic_mastery(user_id: int, conn) -> None:
-    """从 assessment_answers 按 (subject, topic) 统计并 UPSERT 到 student_ability_scores。"""
-    # 统计每个 (subject, topic) 的答题情况
-    stats = await conn.fetch(
+    await conn.execute(
         """
-        SELECT q.subject, q.topic,
-               COUNT(*) as total,
-               SUM(CASE WHEN a.is_correct THEN 1 ELSE 0 END) as correct,
-               SUM(CASE WHEN a.is_correct = false THEN 1 ELSE 0 END) as wrong
-        FROM assessment_answers a
-        JOIN assessment_questions q ON q.id = a.question_id
-        JOIN assessment_sessions s ON s.id = a.session_id
-        WHERE s.user_id = $1 AND s.status = 'completed' AND a.is_correct IS NOT NULL
-        GROUP BY q.subject, q.topic
+        INSERT INTO mistake_book_entries
+            (user_id, question_id, subject, topic, subtopic, difficulty,
+             first_wrong_at, last_wrong_at, wrong_count, correct_after_wrong,
+             mastery_status, mastered_at, bloom_level, misconception_ids, skill_tags,
+             last_wrong_answer, correct_answer,
+             explanation_zh, explanation_en, question_stem_zh, question_stem_en, updated_at)
+        SELECT $1, u.question_id, u.subject, u.topic, u.subtopic, u.difficulty,
+               u.first_wrong_at, u.last_wrong_at, u.wrong_count, u.correct_after_wrong,
+               u.mastery_status, u.mastered_at, u.bloom_level,
+               (SELECT array_agg(x) FROM jsonb_array_elements_text(u.misconception_ids) x),
+               (SELECT array_agg(x) FROM jsonb_array_elements_text(u.skill_tags) x),
+               u.last_wrong_answer, u.correct_answer,
+               u.explanation_zh, u.explanation_en, u.question_stem_zh, u.question_stem_en, NOW()
+        FROM unnest(
+            $2::int[], $3::text[], $4::text[], $5::text[], $6::real[],
+            $7::timestamptz[], $8::timestamptz[], $9::int[], $10::int[],
+            $11::text[], $12::timestamptz[], $13::text[], $14::jsonb[], $15::jsonb[],
+            $16::jsonb[], $17::jsonb[], $18::text[], $19::text[], $20::text[], $21::text[]
+        ) AS u(question_id, subject, topic, subtopic, difficulty,
+               first_wrong_at, last_wrong_at, wrong_count, correct_after_wrong,
+               mastery_status, mastered_at, bloom_level, misconception_ids, skill_tags,
+               last_wrong_answer, correct_answer,
+               explanation_zh, explanation_en, question_stem_zh, question_stem_en)
+        ON CONFLICT (user_id, question_id) DO UPDATE SET
+            wrong_count = EXCLUDED.wrong_count,
+            correct_after_wrong = EXCLUDED.correct_after_wrong,
+            last_wrong_at = EXCLUDED.last_wrong_at,
+            last_wrong_answer = EXCLUDED.last_wrong_answer,
+            mastery_status = EXCLUDED.mastery_status,
+            mastered_at = EXCLUDED.mastered_at,
+            bloom_level = EXCLUDED.bloom_level,
+            misconception_ids = EXCLUDED.misconception_ids,
+            skill_tags = EXCLUDED.skill_tags,
+            updated_at = NOW()
         """,
         user_id,
+        cols["question_id"], cols["subject"], cols["topic"], cols["subtopic"], cols["difficulty"],
+        cols["first_wrong_at"], cols["last_wrong_at"], cols["wrong_count"], cols["correct_after_wrong"],
+        cols["mastery_status"], cols["mastered_at"], cols["bloom_level"],
+        cols["misconception_ids"], cols["skill_tags"], cols["last_wrong_answer"], cols["correct_answer"],
+        cols["explanation_zh"], cols["explanation_en"], cols["question_stem_zh"], cols["question_stem_en"],
     )
 
-    # 获取错题本统计
+
+# ---------------------------------------------------------------------------
+# Step 2: 计算知识点掌握度
+# ---------------------------------------------------------------------------
+
+
+def _bloom_rates(bloom_counts: dict) -> dict[str, float]:
+    return {
+        level: round(correct / total, 2) if total > 0 else 0
+        for level, (correct, total) in bloom_counts.items()
+    }
+
+
+def build_mastery_rows(
+    tallies: dict, touched: set[tuple[str, str]], mistakes: dict[tuple, dict],
+) -> list[dict]:
+    """受影响知识点 + 其所在学科汇总行 (topic=None) 的 student_ability_scores 取值。
+
+    mistakes: {(subject, topic): {"mastered", "active"}}，topic=None 为学科合计。
+    """
+    rows: list[dict] = []
+    no_mistakes = {"mastered": 0, "active": 0}
+
+    def add(subj, topic, total, correct, wrong, confidence, bloom):
+        accuracy = correct / total if total > 0 else 0
+        m = mistakes.get((subj, topic), no_mistakes)
+        rows.append({
+            "subject": subj, "topic": topic,
+            "ability_score": accuracy, "score_100": round(accuracy * 100, 1),
+            "confidence": confidence, "total": total, "correct": correct, "wrong": wrong,
+            "mastered": m["mastered"], "active": m["active"],
+            "bloom": json.dumps(bloom, ensure_ascii=False),
+        })
+
+    for subj, topic in sorted(touched):
+        t = tallies[subj][topic]
+        add(subj, topic, t["total"], t["correct"], t["wrong"],
+            min(1.0, 0.5 + t["total"] * 0.05),  # confidence grows with sample size
+            _bloom_rates(t["bloom"]))
+
+    # 学科汇总 — 该学科全部知识点的累计计数；Bloom 取各知识点正确率的平均
+    for subj in sorted({subj for subj, _ in touched}):
+        topics = tallies[subj].values()
+        total = sum(t["total"] for t in topics)
+        subj_bloom_agg: dict[str, list] = {}
+        for t in topics:
+            for level, rate in _bloom_rates(t["bloom"]).items():
+                subj_bloom_agg.setdefault(level, []).append(rate)
+        add(subj, None, total, sum(t["correct"] for t in topics), sum(t["wrong"] for t in topics),
+            min(1.0, 0.5 + total * 0.02),
+            {k: round(sum(v) / len(v), 2) for k, v in subj_bloom_agg.items()})
+    return rows
+
+
+async def compute_topic_mastery(
+    user_id: int, conn, tallies: dict, touched: set[tuple[str, str]],
+) -> int:
+    """按累计 tallies UPSERT student_ability_scores；只重写受影响的知识点及其学科。
+
+    固定两条语句：错题统计一次 GROUPING SETS 聚合；分数以一条数组 UPSERT 写入，
+    同一语句内用 CTE 取旧分数，分数新出现或变化 ≥ 2 分的行批量写入 ability_score_history。
+    返回写入的历史点数。
+    """
+    if not touched:
+        return 0
+    subjects = sorted({subj for subj, _ in touched})
+
+    # 错题本统计: 知识点级 + 学科级
     mistake_stats = await conn.fetch(
         """
-        SELECT subject, topic,
+        SELECT subject, topic, GROUPING(topic) AS subject_total,
                COUNT(*) FILTER (WHERE mastery_status = 'mastered') as mastered,
                COUNT(*) FILTER (WHERE mastery_status != 'mastered') as active
         FROM mistake_book_entries
-        WHERE user_id = $1
-        GROUP BY subject, topic
+        WHERE user_id = $1 AND subject = ANY($2::text[])
+        GROUP BY GROUPING SETS ((subject, topic), (subject))
         """,
-        user_id,
+        user_id, subjects,
     )
-    mistake_map: dict[tuple, dict] = {}
-    for r in mistake_stats:
-        mistake_map[(r["subject"], r["topic"])] = {
+    mistakes = {
+        (r["subject"], None if r["subject_total"] else r["topic"]): {
             "mastered": r["mastered"], "active": r["active"],
         }
+        for r in mistake_stats
+    }
 
-    # Bloom 统计
-    bloom_stats = await conn.fetch(
+    rows = build_mastery_rows(tallies, touched, mistakes)
+    cols = {key: [r[key] for r in rows] for key in rows[0]}
+    result = await conn.execute(
         """
-        SELECT q.subject, q.topic, t as tag,
-               COUNT(*) as total,
-               SUM(CASE WHEN a.is_correct THEN 1 ELSE 0 END) as correct
-        FROM assessment_answers a
-        JOIN assessment_questions q ON q.id = a.question_id
-        JOIN assessment_sessions s ON s.id = a.session_id,
-             unnest(q.tags) as t
-        WHERE s.user_id = $1 AND s.status = 'completed'
-              AND a.is_correct IS NOT NULL AND t LIKE 'bloom:%'
-        GROUP BY q.subject, q.topic, t
-        """,
-        user_id,
-    )
-    bloom_map: dict[tuple, dict] = {}
-    for r in bloom_stats:
-        key = (r["subject"], r["topic"])
-        if key not in bloom_map:
-            bloom_map[key] = {}
-        level = r["tag"].split(":", 1)[1]
-        bloom_map[key][level] = round(r["correct"] / r["total"], 2) if r["total"] > 0 else 0
-
-    # Subject-level aggregates
-    subject_agg: dict[str, dict] = {}
-    for row in stats:
-        subj = row["subject"]
-        if subj not in subject_agg:
-            subject_agg[subj] = {"total": 0, "correct": 0, "wrong": 0}
-        subject_agg[subj]["total"] += row["total"]
-        subject_agg[subj]["correct"] += row["correct"]
-        subject_agg[subj]["wrong"] += row["wrong"]
-
-    # UPSERT topic-level scores
-    for row in stats:
-        subj, topic = row["subject"], row["topic"]
-        total, correct = row["total"], row["correct"]
-        accuracy = correct / total if total > 0 else 0
-        score_100 = round(accuracy * 100, 1)
-        mdata = mistake_map.get((subj, topic), {"mastered": 0, "active": 0})
-        bloom = bloom_map.get((subj, topic), {})
-
-        # Check previous score for history insertion
-        prev = await conn.fetchrow(
-            "SELECT score_100 FROM student_ability_scores WHERE user_id = $1 AND subject = $2 AND topic = $3",
-            user_id, subj, topic,
-        )
-        prev_score = float(prev["score_100"]) if prev else None
-
-        await conn.execute(
-            """
-            INSERT INTO student_ability_scores
-                (user_id, subject, topic, ability_score, score_100, confidence,
-                 assessment_count, total_questions, correct_questions, wrong_questions,
-                 mastered_mistakes, active_mistakes, bloom_mastery, last_computed_at, updated_at)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, NOW(), NOW())
-            ON CONFLICT (user_id, subject, topic) DO UPDATE SET
-                ability_score = EXCLUDED.ability_score,
-                score_100 = EXCLUDED.score_100,
-                confidence = EXCLUDED.confidence,
-                assessment_count = EXCLUDED.assessment_count,
-                total_questions = EXCLUDED.total_questions,
-                correct_questions = EXCLUDED.correct_questions,
-                wrong_questions = EXCLUDED.wrong_questions,
-                mastered_mistakes = EXCLUDED.mastered_mistakes,
-                active_mistakes = EXCLUDED.active_mistakes,
-                bloom_mastery = EXCLUDED.bloom_mastery,
-                last_computed_at = NOW(),
-                updated_at = NOW()
-            """,
-            user_id, subj, topic, accuracy, score_100,
-            min(1.0, 0.5 + total * 0.05),  # confidence grows with sample size
-            total,  # assessment_count = total answers for this topic
-            total, correct, row["wrong"],
-            mdata["mastered"], mdata["active"],
-            json.dumps(bloom, ensure_ascii=False),
-        )
-
-        # Insert history if score changed significantly
-        if prev_score is not None and abs(score_100 - prev_score) >= 2:
-            await db.insert_ability_history(user_id, subj, topic, accuracy)
-        elif prev_score is None:
-            await db.insert_ability_history(user_id, subj, topic, accuracy)
-
-    # UPSERT subject-level scores (topic=None)
-    for subj, agg in subject_agg.items():
-        total, correct = agg["total"], agg["correct"]
-        accuracy = correct / total if total > 0 else 0
-        score_100 = round(accuracy * 100, 1)
-
-        # Subject-level mistake stats
-        subj_mistakes = await conn.fetchrow(
-            """SELECT
-                COUNT(*) FILTER (WHERE mastery_status = 'mastered') as mastered,
-                COUNT(*) FILTER (WHERE mastery_status != 'mastered') as active
-               FROM mistake_book_entries WHERE user_id = $1 AND subject = $2""",
-            user_id, subj,
-        )
-        mastered = subj_mistakes["mastered"] if subj_mistakes else 0
-        active = subj_mistakes["active"] if subj_mistakes else 0
-
-        # Subject-level bloom
-        subj_bloom: dict[str, float] = {}
-        for key, bloom in bloom_map.items():
-            if key[0] == subj:
-                for level, rate in bloom.items():
-                    if level not in subj_bloom:
-                        subj_bloom[level] = []
-                    subj_bloom[level].append(rate) if isinstance(subj_bloom.get(level), list) else None
-        # Average bloom rates across topics — rebuild correctly
-        subj_bloom_agg: dict[str, list] = {}
-        for key, bloom in bloom_map.items():
-            if key[0] == subj:
-                for level, rate in bloom.items():
-                    subj_bloom_agg.setdefault(level, []).append(rate)
-        subj_bloom_avg = {
-            k: round(sum(v) / len(v), 2) for k, v in subj_bloom_agg.items()
-        }
-
-        prev = await conn.fetchrow(
-            "SELECT score_100 FROM student_ability_scores WHERE user_id = $1 AND subject = $2 AND topic IS NULL",
-            user_id, subj,
-        )
-        prev_score = float(prev["score_100"]) if prev else None
-
-        await conn.execute(
-            """
+        WITH input AS (
+            SELECT * FROM unnest(
+                $2::text[], $3::text[], $4::real[], $5::real[], $6::real[],
+                $7::int[], $8::int[], $9::int[], $10::int[], $11::int[], $12::jsonb[]
+            ) AS u(subject, topic, ability_score, score_100, confidence,
+                   total, correct, wrong, mastered, active, bloom)
+        ),
+        prev AS (
+            SELECT s.subject, COALESCE(s.topic, '') AS topic_key, s.score_100
+            FROM student_ability_scores s
+            JOIN input i ON i.subject = s.subject AND COALESCE(i.topic, '') = COALESCE(s.topic, '')
+            WHERE s.user_id = $1
+        ),
+        upserted AS (
             INSERT INTO student_ability_scores
                 (user_id, subject, topic, ability_score, score_100, confidence,
                  assessment_count, total_questions, correct_questions, wrong_questions,
                  mastered_mistakes, active_mistakes, bloom_mastery, last_computed_at, updated_at)
-            VALUES ($1, $2, NULL, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, NOW(), NOW())
-            ON CONFLICT (user_id, subject, topic) DO UPDATE SET
+            SELECT $1, subject, topic, ability_score, score_100, confidence,
+                   total, total, correct, wrong, mastered, active, bloom, NOW(), NOW()
+            FROM input
+            ON CONFLICT (user_id, subject, (COALESCE(topic, ''))) DO UPDATE SET
                 ability_score = EXCLUDED.ability_score,
                 score_100 = EXCLUDED.score_100,
                 confidence = EXCLUDED.confidence,
@@ -318,18 +646,19 @@ async def compute_topic_mastery(user_id: int, conn) -> None:
                 bloom_mastery = EXCLUDED.bloom_mastery,
                 last_computed_at = NOW(),
                 updated_at = NOW()
-            """,
-            user_id, subj, accuracy, score_100,
-            min(1.0, 0.5 + total * 0.02),
-            total, total, correct, agg["wrong"],
-            mastered, active,
-            json.dumps(subj_bloom_avg, ensure_ascii=False),
+            RETURNING subject, topic, ability_score, score_100
         )
-
-        if prev_score is not None and abs(score_100 - prev_score) >= 2:
-            await db.insert_ability_history(user_id, subj, None, accuracy)
-        elif prev_score is None:
-            await db.insert_ability_history(user_id, subj, None, accuracy)
+        INSERT INTO ability_score_history (user_id, subject, topic, ability_score, score_100)
+        SELECT $1, u.subject, u.topic, u.ability_score, u.score_100
+        FROM upserted u
+        LEFT JOIN prev p ON p.subject = u.subject AND p.topic_key = COALESCE(u.topic, '')
+        WHERE p.score_100 IS NULL OR ABS(u.score_100 - p.score_100) >= 2
+        """,
+        user_id,
+        cols["subject"], cols["topic"], cols["ability_score"], cols["score_100"], cols["confidence"],
+        cols["total"], cols["correct"], cols["wrong"], cols["mastered"], cols["active"], cols["bloom"],
+    )
+    return int(result.split()[-1])
 
 
 # ---------------------------------------------------------------------------
@@ -366,6 +695,7 @@ async def extract_goals_from_mem0(user_id: int, conn) -> None:
                 target_value=goal.get("target_value"),
                 goal_metadata={"source_memory": text, "subject": goal.get("subject")},
                 source="mem0",
+                conn=conn,
             )
 
     except Exception as e:
@@ -417,10 +747,9 @@ async def compute_goal_gaps(user_id: int, conn) -> None:
 # ---------------------------------------------------------------------------
 
 
-async def _build_payload(user_id: int, activity: dict) -> dict:
-    """组装完整的学力档案 JSON payload。"""
-    pool = await db.get_pool()
-    async with pool.acquire() as conn:
+async def _build_payload(user_id: int, activity: dict, conn=None) -> dict:
+    """组装完整的学力档案 JSON payload（传入 conn 时复用，不另借连接）。"""
+    async with db.acquire(conn) as conn:
         # Student info (join biz_users + student_profiles)
         student_row = await conn.fetchrow(
             """SELECT u.id, u.nickname, sp.grade, sp.school_name, sp.campus, sp.ap_courses
@@ -497,8 +826,8 @@ async def _build_payload(user_id: int, activity: dict) -> dict:
         overall_acc = round(correct_q / total_q * 100, 1) if total_q > 0 else 0
 
         # Mistake book summary
-        mistake_summary = await db.get_mistake_book_summary(user_id)
-        mistake_entries = await db.get_mistake_book_entries(user_id, limit=100)
+        mistake_summary = await db.get_mistake_book_summary(user_id, conn=conn)
+        mistake_entries = await db.get_mistake_book_entries(user_id, limit=100, conn=conn)
 
         # Serialize mistake entries
         serialized_mistakes = []
@@ -533,7 +862,7 @@ async def _build_payload(user_id: int, activity: dict) -> dict:
                 improvement_pct = round(((last - first) / first) * 100, 1)
 
         # Goals
-        goals_rows = await db.get_goal_snapshots(user_id)
+        goals_rows = await db.get_goal_snapshots(user_id, conn=conn)
         goals = []
         for g in goals_rows:
             goals.append({
@@ -2,34 +2,60 @@
 Agent-based scoring for subjective questions (short_answer, essay, experiment).
 
 Calls the LLM via OpenAI-compatible API to evaluate student answers and return
-a structured score + feedback.
+a structured score + feedback. Requests go through the shared, pooled
+``llm_client.scoring_client``; when it is unavailable (errors, open circuit)
+the answer gets ``_fallback_score``. ``score_subjective_batch`` scores
+several answers of a session in one request.
 """
 
+import asyncio
 import json
 import logging
 import os
 import re
+import time
 
-import httpx
+from .. import metrics
+
+# LLM config lives with the shared pooled client (llm_client)
+from .llm_client import (  # noqa: F401
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    SCORING_MODEL,
+    SCORING_TIMEOUT,
+    ScoringUnavailable,
+    scoring_client,
+)
+from .scoring_cache import scoring_cache
 
 logger = logging.getLogger("basis.assessment.agent_scoring")
 
-# LLM config (same as subagent model, stripped of "openai:" prefix)
-_RAW_MODEL = os.getenv("BASIS_SUBAGENT_MODEL", "openai:minimax/minimax-m2.5")
-SCORING_MODEL = _RAW_MODEL.removeprefix("openai:")
-OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+# Bump when _build_scoring_prompt changes meaningfully; part of the scoring cache key
+SCORING_PROMPT_VERSION = "v1"
 
-# Timeout for LLM scoring call
-SCORING_TIMEOUT = int(os.getenv("BASIS_SCORING_TIMEOUT", "30"))
+# Max answers per batch scoring request (score_subjective_batch)
+SCORING_BATCH_SIZE = int(os.getenv("BASIS_SCORING_BATCH_SIZE", "8"))
 
+_UNPARSED_RESPONSE = {
+    "score": 0.5,
+    "is_correct": False,
+    "feedback_zh": "系统评分暂时不可用，请等待人工审核。",
+    "feedback_en": "Automated scoring temporarily unavailable. Pending manual review.",
+    "unparsed": True,
+}
 
-def _build_scoring_prompt(
-    question: dict,
-    user_answer: str,
-    lang: str = "zh",
-) -> str:
-    """Build a scoring prompt for the LLM."""
+
+_SCORE_SCALE = """评分标准:
+- 1.0 = 完美回答，覆盖所有要点
+- 0.8 = 大部分正确，有少量遗漏
+- 0.6 = 基本正确，但有明显不足
+- 0.4 = 部分正确，关键点缺失
+- 0.2 = 有一定思路但基本错误
+- 0.0 = 完全错误或答非所问"""
+
+
+def _question_info(question: dict) -> str:
+    """The "题型 / 题干 / 参考答案 / 评分标准 / 解析" lines of a scoring prompt."""
     content = question.get("content_zh") or question.get("content_en") or {}
     if isinstance(content, str):
         content = json.loads(content)
@@ -49,14 +75,23 @@ def _build_scoring_prompt(
         "experiment": "实验设计题",
     }.get(q_type, "开放题")
 
-    prompt = f"""你是一位专业的 BASIS 国际学校学科阅卷老师。请根据以下信息为学生的答案评分。
-
-## 题目信息
-- 题型: {type_label}
+    return f"""- 题型: {type_label}
 - 题干: {stem}
 - 参考答案: {expected or '无标准答案，请根据题目要求评判'}
 - 评分标准: {rubric or '根据答案的完整性、准确性和逻辑性综合评判'}
-- 解析: {explanation or '无'}
+- 解析: {explanation or '无'}"""
+
+
+def _build_scoring_prompt(
+    question: dict,
+    user_answer: str,
+    lang: str = "zh",
+) -> str:
+    """Build a scoring prompt for the LLM."""
+    prompt = f"""你是一位专业的 BASIS 国际学校学科阅卷老师。请根据以下信息为学生的答案评分。
+
+## 题目信息
+{_question_info(question)}
 
 ## 学生答案
 {user_answer}
@@ -73,17 +108,44 @@ def _build_scoring_prompt(
 }}
 ```
 
-评分标准:
-- 1.0 = 完美回答，覆盖所有要点
-- 0.8 = 大部分正确，有少量遗漏
-- 0.6 = 基本正确，但有明显不足
-- 0.4 = 部分正确，关键点缺失
-- 0.2 = 有一定思路但基本错误
-- 0.0 = 完全错误或答非所问"""
+{_SCORE_SCALE}"""
 
     return prompt
 
 
+def _build_batch_scoring_prompt(items: list[tuple[dict, str]]) -> str:
+    """One prompt for several (question, answer text) pairs, numbered from 1."""
+    blocks = []
+    for i, (question, answer_text) in enumerate(items, 1):
+        blocks.append(f"""## 第 {i} 题
+{_question_info(question)}
+
+### 学生答案
+{answer_text}""")
+    body = "\n\n".join(blocks)
+
+    return f"""你是一位专业的 BASIS 国际学校学科阅卷老师。下面共有 {len(items)} 道题，请分别为每道题的学生答案独立评分。
+
+{body}
+
+## 评分要求
+请严格按以下 JSON 数组格式输出，每道题一个对象，id 为题目编号（1 到 {len(items)}），不要输出其他内容:
+
+```json
+[
+  {{
+    "id": <题目编号>,
+    "score": <0.0 到 1.0 的浮点数，表示得分率>,
+    "is_correct": <true 或 false，得分率 >= 0.6 视为正确>,
+    "feedback_zh": "<中文评语，50-150 字，指出优缺点和改进建议>",
+    "feedback_en": "<英文评语，简洁版>"
+  }}
+]
+```
+
+{_SCORE_SCALE}"""
+
+
 def _parse_scoring_response(text: str) -> dict:
     """Parse the LLM response into structured scoring data."""
     # Try to extract JSON from the response
@@ -111,12 +173,37 @@ def _parse_scoring_response(text: str) -> dict:
 
     # Failed to parse — return a conservative fallback
     logger.warning(f"Failed to parse LLM scoring response: {text[:200]}")
-    return {
-        "score": 0.5,
-        "is_correct": False,
-        "feedback_zh": "系统评分暂时不可用，请等待人工审核。",
-        "feedback_en": "Automated scoring temporarily unavailable. Pending manual review.",
-    }
+    return dict(_UNPARSED_RESPONSE)
+
+
+_NO_ANSWER = (False, 0.0, "未作答 / No answer provided")
+
+
+def _answer_text(user_answer: str | dict) -> str:
+    """Normalize user_answer (string, JSON string or dict with "text") to text."""
+    if isinstance(user_answer, dict):
+        return user_answer.get("text", str(user_answer))
+    if isinstance(user_answer, str):
+        try:
+            parsed = json.loads(user_answer)
+            return parsed.get("text", user_answer) if isinstance(parsed, dict) else user_answer
+        except (json.JSONDecodeError, TypeError):
+            return user_answer
+    return str(user_answer)
+
+
+def _to_result(parsed: dict) -> tuple[bool, float, str]:
+    """(is_correct, score, combined feedback) from a parsed scoring object."""
+    score = max(0.0, min(1.0, float(parsed.get("score", 0.5))))
+    is_correct = parsed.get("is_correct", score >= 0.6)
+    feedback_zh = parsed.get("feedback_zh", "")
+    feedback_en = parsed.get("feedback_en", "")
+
+    # Combine feedback
+    feedback = feedback_zh
+    if feedback_en:
+        feedback = f"{feedback_zh}\n\n{feedback_en}" if feedback_zh else feedback_en
+    return bool(is_correct), score, feedback
 
 
 async def score_subjective_question(
@@ -136,71 +223,166 @@ async def score_subjective_question(
         - score: float 0-1
         - feedback: combined zh+en feedback string
     """
-    # Normalize user_answer to string
-    if isinstance(user_answer, dict):
-        answer_text = user_answer.get("text", str(user_answer))
-    elif isinstance(user_answer, str):
-        try:
-            parsed = json.loads(user_answer)
-            answer_text = parsed.get("text", user_answer) if isinstance(parsed, dict) else user_answer
-        except (json.JSONDecodeError, TypeError):
-            answer_text = user_answer
-    else:
-        answer_text = str(user_answer)
+    answer_text = _answer_text(user_answer)
 
     # Empty answer = zero score
     if not answer_text or not answer_text.strip():
-        return False, 0.0, "未作答 / No answer provided"
+        return _NO_ANSWER
+
+    # Identical (normalized) answers to the same item reuse the earlier verdict
+    cache_key = None
+    if question.get("id") is not None:
+        cache_key = scoring_cache.key(question["id"], answer_text, SCORING_MODEL, SCORING_PROMPT_VERSION)
+        cached = await scoring_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
     prompt = _build_scoring_prompt(question, answer_text)
 
     try:
-        async with httpx.AsyncClient(timeout=SCORING_TIMEOUT) as client:
-            resp = await client.post(
-                f"{OPENAI_BASE_URL}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {OPENAI_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": SCORING_MODEL,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.1,
-                    "max_tokens": 500,
-                },
-            )
+        content = await scoring_client.chat(
+            [{"role": "user", "content": prompt}],
+            model=SCORING_MODEL,
+            temperature=0.1,
+            max_tokens=500,
+        )
+    except ScoringUnavailable as e:
+        logger.warning(f"LLM scoring unavailable: {e}")
+        metrics.incr("scoring.fallback", reason="unavailable")
+        return _fallback_score(question, answer_text)
+    except Exception as e:
+        logger.error(f"LLM scoring error: {e}")
+        metrics.incr("scoring.fallback", reason="error")
+        return _fallback_score(question, answer_text)
 
-            if resp.status_code != 200:
-                logger.error(f"LLM scoring API error: {resp.status_code} {resp.text[:200]}")
-                return _fallback_score(question, answer_text)
+    if not content:
+        logger.warning("LLM scoring returned empty content")
+        metrics.incr("scoring.fallback", reason="empty")
+        return _fallback_score(question, answer_text)
 
-            data = resp.json()
-            content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+    parsed = _parse_scoring_response(content)
+    result = _to_result(parsed)
 
-            if not content:
-                logger.warning("LLM scoring returned empty content")
-                return _fallback_score(question, answer_text)
+    # Only genuine verdicts are cached, never the unparsed fallback
+    if cache_key is not None and not parsed.get("unparsed"):
+        await scoring_cache.put(cache_key, *result)
 
-            parsed = _parse_scoring_response(content)
+    return result
 
-            score = max(0.0, min(1.0, float(parsed.get("score", 0.5))))
-            is_correct = parsed.get("is_correct", score >= 0.6)
-            feedback_zh = parsed.get("feedback_zh", "")
-            feedback_en = parsed.get("feedback_en", "")
 
-            # Combine feedback
-            feedback = feedback_zh
-            if feedback_en:
-                feedback = f"{feedback_zh}\n\n{feedback_en}" if feedback_zh else feedback_en
+# ---------------------------------------------------------------------------
+# Batch scoring
+# ---------------------------------------------------------------------------
 
-            return bool(is_correct), score, feedback
 
-    except httpx.TimeoutException:
-        logger.warning("LLM scoring timed out")
-        return _fallback_score(question, answer_text)
-    except Exception as e:
-        logger.error(f"LLM scoring error: {e}")
-        return _fallback_score(question, answer_text)
+def _parse_batch_response(text: str, n_items: int) -> dict[int, dict]:
+    """Parse a batch response into {item number: scoring object}.
+
+    Items that are missing, duplicated or lack a numeric score are left out
+    so the caller can retry them individually.
+    """
+    candidates = []
+    json_match = re.search(r"```json\s*(\[.*?\])\s*```", text, re.DOTALL)
+    if json_match:
+        candidates.append(json_match.group(1))
+    start, end = text.find("["), text.rfind("]")
+    if start != -1 and end > start:
+        candidates.append(text[start:end + 1])
+
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(data, list):
+            continue
+        results: dict[int, dict] = {}
+        for obj in data:
+            if not isinstance(obj, dict):
+                continue
+            try:
+                item_no = int(obj.get("id"))
+                float(obj["score"])
+            except (TypeError, ValueError, KeyError):
+                continue
+            if 1 <= item_no <= n_items and item_no not in results:
+                results[item_no] = obj
+        return results
+
+    logger.warning(f"Failed to parse LLM batch scoring response: {text[:200]}")
+    return {}
+
+
+async def score_subjective_batch(
+    items: list[tuple[dict, str | dict]],
+) -> list[tuple[bool, float, str]]:
+    """
+    Score several subjective answers with one LLM request per chunk of
+    ``SCORING_BATCH_SIZE`` items (shared instructions, per-item JSON output).
+
+    Empty answers and scoring-cache hits never reach the model. Items the
+    batch response leaves out (or a failed batch request) are retried one by
+    one through ``score_subjective_question``, which applies the fallback.
+
+    Returns one (is_correct, score, feedback) per input item, in order.
+    """
+    results: list[tuple[bool, float, str] | None] = [None] * len(items)
+    pending: list[tuple[int, dict, str, tuple | None]] = []
+    for i, (question, user_answer) in enumerate(items):
+        answer_text = _answer_text(user_answer)
+        if not answer_text or not answer_text.strip():
+            results[i] = _NO_ANSWER
+            continue
+        cache_key = None
+        if question.get("id") is not None:
+            cache_key = scoring_cache.key(question["id"], answer_text, SCORING_MODEL, SCORING_PROMPT_VERSION)
+            cached = await scoring_cache.get(cache_key)
+            if cached is not None:
+                results[i] = cached
+                continue
+        pending.append((i, question, answer_text, cache_key))
+
+    for start in range(0, len(pending), SCORING_BATCH_SIZE):
+        chunk = pending[start:start + SCORING_BATCH_SIZE]
+        if len(chunk) == 1:
+            i, question, answer_text, _ = chunk[0]
+            results[i] = await score_subjective_question(question, answer_text)
+            continue
+
+        prompt = _build_batch_scoring_prompt([(q, text) for _, q, text, _ in chunk])
+        parsed: dict[int, dict] = {}
+        t0 = time.monotonic()
+        try:
+            content = await scoring_client.chat(
+                [{"role": "user", "content": prompt}],
+                model=SCORING_MODEL,
+                temperature=0.1,
+                max_tokens=min(400 * len(chunk) + 200, 8000),
+            )
+            parsed = _parse_batch_response(content or "", len(chunk))
+        except Exception as e:
+            logger.warning(f"LLM batch scoring failed ({len(chunk)} items): {e}")
+        metrics.observe("scoring.batch_ms", (time.monotonic() - t0) * 1000)
+        metrics.observe("scoring.batch_size", len(chunk))
+
+        retry = []
+        for n, (i, question, answer_text, cache_key) in enumerate(chunk, 1):
+            if n in parsed:
+                results[i] = _to_result(parsed[n])
+                if cache_key is not None:
+                    await scoring_cache.put(cache_key, *results[i])
+            else:
+                retry.append((i, question, answer_text))
+        if retry:
+            # 批量结果缺失的题目逐题重试
+            metrics.incr("scoring.batch_retry_items", len(retry))
+            retried = await asyncio.gather(
+                *(score_subjective_question(q, text) for _, q, text in retry)
+            )
+            for (i, _, _), result in zip(retry, retried):
+                results[i] = result
+
+    return results
 
 
 def _fallback_score(question: dict, answer_text: str) -> tuple[bool, float, str]:
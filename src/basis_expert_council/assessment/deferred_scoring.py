@@ -0,0 +1,194 @@
+"""
+Deferred scoring of subjective answers (opt-in, ``BASIS_DEFERRED_SCORING=1``).
+
+With it on, ``submit_answer`` stores short_answer / essay / experiment
+answers with ``is_correct``/``score`` NULL and moves on along the
+provisional CAT path (treated as correct for the next difficulty step).
+The LLM call runs on a pool of ``BASIS_DEFERRED_SCORING_WORKERS`` workers
+that patch the answer row via ``db.update_answer_score``.
+
+With ``BASIS_BATCH_SCORING=1`` answers are deferred the same way but not
+queued: ``settle`` scores all of them at completion with
+``agent_scoring.score_subjective_batch`` (one request per chunk).
+
+``complete_session`` calls ``settle``: it waits up to
+``BASIS_DEFERRED_SCORING_WAIT`` seconds for the session's in-flight jobs,
+then scores whatever is still NULL inline (jobs lost to a restart or
+handled by another replica). The patch only applies while ``score IS
+NULL``, so a late worker never overwrites a reconciled score.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from .. import metrics
+
+logger = logging.getLogger("basis.assessment.deferred_scoring")
+
+DEFERRED_SCORING = os.getenv("BASIS_DEFERRED_SCORING", "0") == "1"
+DEFERRED_SCORING_WORKERS = int(os.getenv("BASIS_DEFERRED_SCORING_WORKERS", "4"))
+DEFERRED_SCORING_WAIT = float(os.getenv("BASIS_DEFERRED_SCORING_WAIT", "20"))
+# 批量模式：答题时不评分也不入队，交卷时一次请求批量评分
+BATCH_SCORING = os.getenv("BASIS_BATCH_SCORING", "0") == "1"
+
+SUBJECTIVE_TYPES = ("short_answer", "essay", "experiment")
+
+
+def is_deferrable(question: dict) -> bool:
+    return (DEFERRED_SCORING or BATCH_SCORING) and question.get("question_type") in SUBJECTIVE_TYPES
+
+
+def _unscored(answer: dict) -> bool:
+    return answer.get("score") is None and answer.get("question_type") in SUBJECTIVE_TYPES
+
+
+async def _score_and_patch(answer_id: int, question: dict, user_answer) -> bool:
+    from ..assessment_engine import score_question_async
+
+    result = await score_question_async(question, user_answer)
+    return await _patch(answer_id, question, result)
+
+
+async def _patch(answer_id: int, question: dict, result: tuple) -> bool:
+    from .. import db
+
+    is_correct, score, feedback = result
+    patched = await db.update_answer_score(
+        answer_id, is_correct=is_correct, score=score, agent_feedback=feedback,
+    )
+    if patched and is_correct is not None:
+        from .usage_buffer import usage_buffer
+        usage_buffer.add(question["id"], is_correct)
+    return patched
+
+
+class DeferredScorer:
+    def __init__(self, workers: int = DEFERRED_SCORING_WORKERS) -> None:
+        self.workers = workers
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # session_id → {answer_id: Future}
+        self._pending: dict[str, dict[int, asyncio.Future]] = {}
+
+    def pending_count(self, session_id: str | None = None) -> int:
+        if session_id is not None:
+            return len(self._pending.get(session_id, {}))
+        return sum(len(p) for p in self._pending.values())
+
+    def start(self) -> None:
+        """Start the worker pool in the running loop (idempotent)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and all(not t.done() for t in self._tasks):
+            return
+        if self._loop is not loop:
+            self._queue = asyncio.Queue()
+            self._pending = {}
+            self._loop = loop
+        self._tasks = [t for t in self._tasks if not t.done() and t.get_loop() is loop]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(loop.create_task(self._worker()))
+
+    async def stop(self) -> None:
+        """Cancel the workers; unfinished answers are reconciled on completion."""
+        for t in self._tasks:
+            t.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, session_id: str, answer_id: int, question: dict, user_answer) -> None:
+        if BATCH_SCORING:
+            # 批量模式下留到 settle 统一评分
+            return
+        self.start()
+        future = self._loop.create_future()
+        self._pending.setdefault(session_id, {})[answer_id] = future
+        self._queue.put_nowait((session_id, answer_id, question, user_answer, future, time.monotonic()))
+        metrics.incr("deferred_scoring.enqueued")
+        metrics.gauge("deferred_scoring.queue_depth", self._queue.qsize())
+
+    async def _worker(self) -> None:
+        while True:
+            session_id, answer_id, question, user_answer, future, enqueued_at = await self._queue.get()
+            try:
+                await _score_and_patch(answer_id, question, user_answer)
+                metrics.observe("deferred_scoring.latency_ms", (time.monotonic() - enqueued_at) * 1000)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.incr("deferred_scoring.errors")
+                logger.warning(f"Deferred scoring failed for answer {answer_id}: {e}")
+            finally:
+                if not future.done():
+                    future.set_result(None)
+                session = self._pending.get(session_id)
+                if session is not None:
+                    session.pop(answer_id, None)
+                    if not session:
+                        self._pending.pop(session_id, None)
+                self._queue.task_done()
+                metrics.gauge("deferred_scoring.queue_depth", self._queue.qsize())
+
+    def needs_settle(self, session_id: str, answers: list[dict]) -> bool:
+        return session_id in self._pending or any(_unscored(a) for a in answers)
+
+    async def settle(self, session_id: str, timeout: float = DEFERRED_SCORING_WAIT) -> int:
+        """Make sure no subjective answer of the session is left unscored.
+
+        Waits for in-flight jobs, then scores remaining NULL answers inline.
+        Returns the number of answers scored inline.
+        """
+        from .. import db
+        from .item_pool import get_question
+
+        futures = list(self._pending.get(session_id, {}).values())
+        if futures:
+            t0 = time.monotonic()
+            _, not_done = await asyncio.wait(futures, timeout=timeout)
+            metrics.observe("deferred_scoring.settle_wait_ms", (time.monotonic() - t0) * 1000)
+            if not_done:
+                metrics.incr("deferred_scoring.settle_timeout", len(not_done))
+
+        unscored = [a for a in await db.get_session_answers(session_id) if _unscored(a)]
+        if not unscored:
+            return 0
+
+        if BATCH_SCORING and len(unscored) > 1:
+            results = await self._settle_batch(unscored)
+        else:
+            async def _inline(answer: dict) -> bool:
+                question = await get_question(answer["question_id"])
+                if not question:
+                    return False
+                return await _score_and_patch(answer["id"], question, answer.get("user_answer"))
+
+            results = await asyncio.gather(*(_inline(a) for a in unscored), return_exceptions=True)
+        reconciled = sum(1 for r in results if r is True)
+        for r in results:
+            if isinstance(r, Exception):
+                logger.warning(f"Inline scoring failed for session {session_id}: {r}")
+        metrics.incr("deferred_scoring.reconciled", reconciled)
+        return reconciled
+
+    async def _settle_batch(self, unscored: list[dict]) -> list:
+        """Score all unscored answers with score_subjective_batch, then patch."""
+        from .agent_scoring import score_subjective_batch
+        from .item_pool import get_question
+
+        questions = await asyncio.gather(*(get_question(a["question_id"]) for a in unscored))
+        pairs = [(a, q) for a, q in zip(unscored, questions) if q]
+        try:
+            scored = await score_subjective_batch([(q, a.get("user_answer")) for a, q in pairs])
+        except Exception as e:
+            return [e]
+        return await asyncio.gather(
+            *(_patch(a["id"], q, result) for (a, q), result in zip(pairs, scored)),
+            return_exceptions=True,
+        )
+
+
+# 进程级单例
+deferred_scorer = DeferredScorer()
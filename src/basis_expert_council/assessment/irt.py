@@ -0,0 +1,235 @@
+"""
+Item Response Theory ability estimation (2PL / 3PL, EAP / MLE).
+
+Item parameters come from ``assessment_questions``:
+
+- ``difficulty`` (0.0-1.0) maps linearly onto the IRT ``b`` scale [-3, 3]
+- ``discrimination`` is the ``a`` parameter (NULL → ``DEFAULT_DISCRIMINATION``)
+- 3PL adds a guessing floor ``c`` for multiple-choice items
+
+Everything is vectorized: responses are packed into padded
+(sessions × items) matrices with a mask, so one call scores a single session
+or the whole answer history. Theta is reported on the IRT scale and mapped
+back to the 0-1 ``ability_level`` used everywhere else.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+# b = (difficulty - 0.5) * B_SCALE，difficulty 0/1 对应 b = -3/+3
+B_SCALE = 6.0
+THETA_MIN, THETA_MAX = -4.0, 4.0
+DEFAULT_DISCRIMINATION = 1.0
+# 四选一 MCQ 的猜测参数（3PL）
+MCQ_GUESSING = 0.25
+
+# EAP 正交网格（N(0,1) 先验）
+QUADRATURE_POINTS = 61
+PRIOR_SD = 1.0
+
+# 每批处理的会话数，限制 (S, L, Q) 中间数组的内存占用
+_CHUNK = 2048
+_EPS = 1e-9
+
+
+# ---------------------------------------------------------------------------
+# 量表换算
+# ---------------------------------------------------------------------------
+
+
+def difficulty_to_b(difficulty):
+    return (np.asarray(difficulty, dtype=float) - 0.5) * B_SCALE
+
+
+def b_to_difficulty(b):
+    return np.clip(np.asarray(b, dtype=float) / B_SCALE + 0.5, 0.0, 1.0)
+
+
+def theta_to_ability(theta):
+    """IRT theta → 0-1 ability_level (same linear map as difficulty)."""
+    return np.clip((np.asarray(theta, dtype=float) + B_SCALE / 2) / B_SCALE, 0.0, 1.0)
+
+
+def ability_to_theta(ability):
+    return (np.asarray(ability, dtype=float) - 0.5) * B_SCALE
+
+
+# ---------------------------------------------------------------------------
+# 模型
+# ---------------------------------------------------------------------------
+
+
+def probability(theta, a, b, c=0.0):
+    """P(correct | theta) under the 3PL model (c=0 gives 2PL). Broadcasts."""
+    return c + (1.0 - c) / (1.0 + np.exp(-a * (theta - b)))
+
+
+def item_information(theta, a, b, c=0.0):
+    """Fisher information of an item at theta. Broadcasts."""
+    p = probability(theta, a, b, c)
+    q = 1.0 - p
+    return (a ** 2) * (q / np.maximum(p, _EPS)) * ((p - c) / (1.0 - c)) ** 2
+
+
+def quadrature(points: int = QUADRATURE_POINTS, prior_sd: float = PRIOR_SD):
+    """(nodes, log prior weights) of a normal prior on an even theta grid."""
+    nodes = np.linspace(THETA_MIN, THETA_MAX, points)
+    log_w = -0.5 * (nodes / prior_sd) ** 2
+    log_w -= np.log(np.exp(log_w).sum())
+    return nodes, log_w
+
+
+# ---------------------------------------------------------------------------
+# 作答矩阵
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class ResponseMatrix:
+    """Padded item parameters and responses, shape (sessions, max_items)."""
+    a: np.ndarray
+    b: np.ndarray
+    c: np.ndarray
+    u: np.ndarray       # 0..1，主观题允许部分得分
+    mask: np.ndarray    # bool，有效作答
+
+    @property
+    def n_sessions(self) -> int:
+        return self.u.shape[0]
+
+
+def _response_value(answer: dict) -> float | None:
+    is_correct = answer.get("is_correct")
+    if is_correct is not None:
+        return 1.0 if is_correct else 0.0
+    score = answer.get("score")
+    if score is not None:
+        return min(1.0, max(0.0, float(score)))
+    return None  # 尚未评分
+
+
+def pack_responses(sessions: list[list[dict]], model: str = "2pl") -> ResponseMatrix:
+    """Build a ResponseMatrix from answer rows (``db.get_session_answers`` shape).
+
+    Uses the question's current ``difficulty`` (falls back to ``difficulty_at``)
+    and ``discrimination``; unscored answers are masked out.
+    """
+    width = max((len(s) for s in sessions), default=0) or 1
+    shape = (len(sessions), width)
+    a = np.full(shape, DEFAULT_DISCRIMINATION)
+    b = np.zeros(shape)
+    c = np.zeros(shape)
+    u = np.zeros(shape)
+    mask = np.zeros(shape, dtype=bool)
+
+    for i, answers in enumerate(sessions):
+        for j, ans in enumerate(answers):
+            value = _response_value(ans)
+            if value is None:
+                continue
+            d = ans.get("difficulty")
+            if d is None:
+                d = ans.get("difficulty_at")
+            b[i, j] = (float(d if d is not None else 0.5) - 0.5) * B_SCALE
+            if ans.get("discrimination"):
+                a[i, j] = float(ans["discrimination"])
+            if model == "3pl" and ans.get("question_type", "mcq") == "mcq":
+                c[i, j] = MCQ_GUESSING
+            u[i, j] = value
+            mask[i, j] = True
+    return ResponseMatrix(a=a, b=b, c=c, u=u, mask=mask)
+
+
+# ---------------------------------------------------------------------------
+# 估计
+# ---------------------------------------------------------------------------
+
+
+def _log_likelihood_on_grid(rm: ResponseMatrix, sl: slice, nodes: np.ndarray) -> np.ndarray:
+    """log L(theta_q) per session, shape (S, Q)."""
+    p = probability(
+        nodes[None, None, :],
+        rm.a[sl, :, None], rm.b[sl, :, None], rm.c[sl, :, None],
+    )
+    p = np.clip(p, _EPS, 1.0 - _EPS)
+    u = rm.u[sl, :, None]
+    ll = u * np.log(p) + (1.0 - u) * np.log1p(-p)
+    return (ll * rm.mask[sl, :, None]).sum(axis=1)
+
+
+def eap(
+    rm: ResponseMatrix,
+    points: int = QUADRATURE_POINTS,
+    prior_sd: float = PRIOR_SD,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Expected-a-posteriori theta and posterior SD for every session."""
+    nodes, log_prior = quadrature(points, prior_sd)
+    theta = np.empty(rm.n_sessions)
+    se = np.empty(rm.n_sessions)
+    for start in range(0, rm.n_sessions, _CHUNK):
+        sl = slice(start, start + _CHUNK)
+        log_post = _log_likelihood_on_grid(rm, sl, nodes) + log_prior
+        log_post -= log_post.max(axis=1, keepdims=True)
+        post = np.exp(log_post)
+        post /= post.sum(axis=1, keepdims=True)
+        mean = post @ nodes
+        theta[sl] = mean
+        se[sl] = np.sqrt(np.maximum(post @ (nodes ** 2) - mean ** 2, 0.0))
+    return theta, se
+
+
+def mle(rm: ResponseMatrix, iterations: int = 30, tol: float = 1e-6) -> tuple[np.ndarray, np.ndarray]:
+    """Maximum-likelihood theta (Fisher scoring) and SE = 1/sqrt(I(theta)).
+
+    All-correct / all-wrong patterns have no finite MLE and end at the
+    THETA_MIN / THETA_MAX bounds.
+    """
+    theta = np.zeros(rm.n_sessions)
+    m = rm.mask
+    for _ in range(iterations):
+        t = theta[:, None]
+        p = np.clip(probability(t, rm.a, rm.b, rm.c), _EPS, 1.0 - _EPS)
+        p_star = (p - rm.c) / (1.0 - rm.c)
+        # d logL / d theta
+        grad = (m * rm.a * (rm.u - p) * p_star / p).sum(axis=1)
+        info = (m * item_information(t, rm.a, rm.b, rm.c)).sum(axis=1)
+        step = np.where(info > _EPS, grad / np.maximum(info, _EPS), np.sign(grad))
+        theta = np.clip(theta + step, THETA_MIN, THETA_MAX)
+        if np.all(np.abs(step) < tol):
+            break
+    info = (m * item_information(theta[:, None], rm.a, rm.b, rm.c)).sum(axis=1)
+    se = np.where(info > _EPS, 1.0 / np.sqrt(np.maximum(info, _EPS)), np.inf)
+    return theta, se
+
+
+@dataclass
+class AbilityEstimate:
+    theta: float
+    se: float
+    ability: float   # 0-1 ability_level
+    n_items: int
+
+
+def estimate_batch(
+    sessions: list[list[dict]],
+    *,
+    method: str = "eap",
+    model: str = "2pl",
+) -> list[AbilityEstimate]:
+    """Estimate ability for many sessions in one vectorized pass."""
+    if not sessions:
+        return []
+    rm = pack_responses(sessions, model=model)
+    theta, se = (mle if method == "mle" else eap)(rm)
+    ability = theta_to_ability(theta)
+    n_items = rm.mask.sum(axis=1)
+    return [
+        AbilityEstimate(float(t), float(s), float(ab), int(n))
+        for t, s, ab, n in zip(theta, se, ability, n_items)
+    ]
+
+
+def estimate(answers: list[dict], *, method: str = "eap", model: str = "2pl") -> AbilityEstimate:
+    """Estimate ability for a single session's answers."""
+    return estimate_batch([answers], method=method, model=model)[0]
@@ -0,0 +1,295 @@
+"""
+In-process item-pool index for CAT next-question selection.
+
+Every assessment question is held in memory, bucketed by (subject, grade_level)
+with difficulties kept in sorted arrays. The multi-level fallback of
+``db.find_next_question`` is answered with bisect lookups instead of one
+``ORDER BY random()`` scan per level.
+
+The index is loaded lazily, patched in place by the question CRUD helpers in
+``db`` and reloaded after ``BASIS_ITEM_POOL_TTL`` seconds so that changes made
+by other API replicas are picked up.
+"""
+
+import asyncio
+import bisect
+import logging
+import os
+import random
+import time
+
+from .. import db
+from .matchers import matcher_cache
+
+logger = logging.getLogger("basis.assessment.item_pool")
+
+# 索引最长存活时间（秒），过期后整体重载，兼容多副本部署
+ITEM_POOL_TTL = int(os.getenv("BASIS_ITEM_POOL_TTL", "300"))
+
+# 与 db.find_next_question 的 approved_filter 保持一致
+SELECTABLE_STATUSES = {"approved", "draft", None}
+
+# Widened window used by fallback level 2 (same as the SQL cascade)
+WIDE_TOLERANCE = 0.35
+
+# Random probes tried before scanning a window for a non-excluded item
+_MAX_PROBES = 8
+
+
+class _Bucket:
+    """Question ids of one key, kept sorted by difficulty."""
+
+    __slots__ = ("difficulties", "ids")
+
+    def __init__(self) -> None:
+        self.difficulties: list[float] = []
+        self.ids: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, difficulty: float, question_id: int) -> None:
+        i = bisect.bisect_right(self.difficulties, difficulty)
+        self.difficulties.insert(i, difficulty)
+        self.ids.insert(i, question_id)
+
+    def remove(self, difficulty: float, question_id: int) -> None:
+        i = bisect.bisect_left(self.difficulties, difficulty)
+        j = bisect.bisect_right(self.difficulties, difficulty)
+        for k in range(i, j):
+            if self.ids[k] == question_id:
+                del self.difficulties[k]
+                del self.ids[k]
+                return
+
+    def sample(
+        self, d_min: float, d_max: float, exclude: set[int], rng: random.Random,
+    ) -> int | None:
+        """Random non-excluded id with d_min <= difficulty <= d_max."""
+        i = bisect.bisect_left(self.difficulties, d_min)
+        j = bisect.bisect_right(self.difficulties, d_max)
+        if i >= j:
+            return None
+        # 窗口内已答题通常很少，先随机探测，失败再整窗过滤
+        for _ in range(min(_MAX_PROBES, j - i)):
+            qid = self.ids[rng.randrange(i, j)]
+            if qid not in exclude:
+                return qid
+        candidates = [qid for qid in self.ids[i:j] if qid not in exclude]
+        return rng.choice(candidates) if candidates else None
+
+    def nearest(self, target: float, exclude: set[int]) -> tuple[float, int] | None:
+        """(distance, id) of the non-excluded item closest to target."""
+        n = len(self.ids)
+        right = bisect.bisect_left(self.difficulties, target)
+        left = right - 1
+        while left >= 0 or right < n:
+            d_left = target - self.difficulties[left] if left >= 0 else float("inf")
+            d_right = self.difficulties[right] - target if right < n else float("inf")
+            if d_left <= d_right:
+                if self.ids[left] not in exclude:
+                    return d_left, self.ids[left]
+                left -= 1
+            else:
+                if self.ids[right] not in exclude:
+                    return d_right, self.ids[right]
+                right += 1
+        return None
+
+
+class ItemPoolIndex:
+    """In-memory question index answering the CAT selection cascade."""
+
+    def __init__(self, ttl: int = ITEM_POOL_TTL, rng: random.Random | None = None) -> None:
+        self.ttl = ttl
+        self.version = 0
+        self._rng = rng or random.Random()
+        self._rows: dict[int, dict] = {}
+        self._selectable: dict[tuple[str, str], _Bucket] = {}
+        self._by_subject: dict[str, _Bucket] = {}
+        self._loaded_at: float | None = None
+        self._stale = False
+        self._lock = asyncio.Lock()
+
+    # ------------------------------------------------------------------
+    # 加载 / 变更
+    # ------------------------------------------------------------------
+
+    @property
+    def is_fresh(self) -> bool:
+        if self._loaded_at is None or self._stale:
+            return False
+        return self.ttl <= 0 or time.monotonic() - self._loaded_at < self.ttl
+
+    def load(self, rows: list[dict]) -> None:
+        """Rebuild the whole index from question rows."""
+        self._rows = {}
+        self._selectable = {}
+        self._by_subject = {}
+        for row in sorted(rows, key=lambda r: (r["difficulty"], r["id"])):
+            self._add(dict(row))
+        self._loaded_at = time.monotonic()
+        self._stale = False
+        self.version += 1
+
+    async def ensure_loaded(self) -> None:
+        """Load the index from Postgres if it is missing, stale or expired."""
+        if self.is_fresh:
+            return
+        async with self._lock:
+            if self.is_fresh:
+                return
+            t0 = time.monotonic()
+            rows = await db.get_all_questions()
+            self.load(rows)
+            logger.info(
+                f"Item pool loaded: {len(rows)} questions in "
+                f"{(time.monotonic() - t0) * 1000:.0f}ms"
+            )
+
+    def upsert(self, row: dict) -> None:
+        """Insert or replace one question (called after create/update)."""
+        if self._loaded_at is None:
+            return
+        self._discard(row["id"])
+        self._add(dict(row))
+        self.version += 1
+
+    def remove(self, question_id: int) -> None:
+        if self._loaded_at is None:
+            return
+        self._discard(question_id)
+        matcher_cache.discard(question_id)
+        self.version += 1
+
+    def invalidate(self) -> None:
+        """Force a full reload on the next lookup (e.g. after bulk import)."""
+        self._stale = True
+        self.version += 1
+
+    def _add(self, row: dict) -> None:
+        qid = row["id"]
+        # 规则判分题在加载 / 更新时预编译判分器
+        matcher_cache.compile(row)
+        difficulty = float(row["difficulty"])
+        self._rows[qid] = row
+        self._by_subject.setdefault(row["subject"], _Bucket()).add(difficulty, qid)
+        if row.get("review_status") in SELECTABLE_STATUSES:
+            key = (row["subject"], row["grade_level"])
+            self._selectable.setdefault(key, _Bucket()).add(difficulty, qid)
+
+    def _discard(self, question_id: int) -> None:
+        row = self._rows.pop(question_id, None)
+        if row is None:
+            return
+        difficulty = float(row["difficulty"])
+        bucket = self._by_subject.get(row["subject"])
+        if bucket is not None:
+            bucket.remove(difficulty, question_id)
+        bucket = self._selectable.get((row["subject"], row["grade_level"]))
+        if bucket is not None:
+            bucket.remove(difficulty, question_id)
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, question_id: int) -> dict | None:
+        return self._rows.get(question_id)
+
+    def selectable_ids(self, subject: str, grade_level: str) -> list[int]:
+        """Ids eligible for selection in one (subject, grade_level) bucket."""
+        bucket = self._selectable.get((subject, grade_level))
+        return list(bucket.ids) if bucket else []
+
+    def select(
+        self,
+        subject: str,
+        grade_level: str,
+        target_difficulty: float,
+        exclude_ids: list[int] | set[int],
+        tolerance: float = 0.15,
+    ) -> dict | None:
+        """Same cascade as ``db.find_next_question``, served from memory.
+
+        1. 目标年级 + 目标难度窗口
+        2. 目标年级 + 扩大难度窗口 (±0.35)
+        3. 目标年级 + 无难度限制
+        4. 相邻年级 (±1)，按难度距离最近
+        5. 同学科全题库（不限状态），按难度距离最近
+        """
+        exclude = exclude_ids if isinstance(exclude_ids, set) else set(exclude_ids or ())
+        bucket = self._selectable.get((subject, grade_level))
+
+        if bucket:
+            for tol in (tolerance, WIDE_TOLERANCE):
+                qid = bucket.sample(
+                    max(0.0, target_difficulty - tol),
+                    min(1.0, target_difficulty + tol),
+                    exclude, self._rng,
+                )
+                if qid is not None:
+                    return self._rows[qid]
+            qid = bucket.sample(float("-inf"), float("inf"), exclude, self._rng)
+            if qid is not None:
+                return self._rows[qid]
+
+        best: tuple[float, int] | None = None
+        for grade in db._adjacent_grades(grade_level):
+            adjacent = self._selectable.get((subject, grade))
+            hit = adjacent.nearest(target_difficulty, exclude) if adjacent else None
+            if hit and (best is None or hit[0] < best[0]):
+                best = hit
+        if best is not None:
+            return self._rows[best[1]]
+
+        everything = self._by_subject.get(subject)
+        hit = everything.nearest(target_difficulty, exclude) if everything else None
+        return self._rows[hit[1]] if hit else None
+
+
+# 进程级单例
+item_pool = ItemPoolIndex()
+
+
+async def find_next_question(
+    subject: str,
+    grade_level: str,
+    target_difficulty: float,
+    exclude_ids: list[int],
+    tolerance: float = 0.15,
+) -> dict | None:
+    """Drop-in replacement for ``db.find_next_question`` backed by the index.
+
+    Falls back to the SQL cascade if the index cannot be loaded.
+    """
+    try:
+        await item_pool.ensure_loaded()
+    except Exception as e:
+        logger.warning(f"Item pool unavailable, falling back to SQL selection: {e}")
+        return await db.find_next_question(
+            subject=subject,
+            grade_level=grade_level,
+            target_difficulty=target_difficulty,
+            exclude_ids=exclude_ids,
+            tolerance=tolerance,
+        )
+    row = item_pool.select(subject, grade_level, target_difficulty, exclude_ids, tolerance)
+    return dict(row) if row else None
+
+
+
+async def get_question(question_id: int) -> dict | None:
+    """``db.get_question`` served from the index (SQL fallback on miss)."""
+    try:
+        await item_pool.ensure_loaded()
+    except Exception as e:
+        logger.warning(f"Item pool unavailable, falling back to SQL lookup: {e}")
+        return await db.get_question(question_id)
+    row = item_pool.get(question_id)
+    if row is None:
+        return await db.get_question(question_id)
+    return dict(row)
@@ -0,0 +1,294 @@
+"""
+Shared OpenAI-compatible chat client for subjective scoring.
+
+One ``httpx.AsyncClient`` per event loop with a keep-alive pool (HTTP/2 when
+``h2`` is installed), so scoring calls reuse connections instead of paying a
+TCP/TLS handshake per answer. Around each call:
+
+- a global semaphore (``BASIS_SCORING_MAX_CONCURRENCY``) and a per-model one
+  (``BASIS_SCORING_MODEL_CONCURRENCY``) cap in-flight requests
+- timeouts, transport errors, 429 and 5xx are retried with full-jitter
+  exponential backoff (``BASIS_SCORING_RETRIES``), all within one overall
+  deadline (``BASIS_SCORING_DEADLINE``, queueing included): later attempts get
+  only the time that is left, so an inline ``submit_answer`` never waits
+  longer than a single un-retried request used to
+- a per-model circuit breaker opens after ``BASIS_SCORING_BREAKER_THRESHOLD``
+  consecutive failures and rejects calls for ``BASIS_SCORING_BREAKER_RESET``
+  seconds, so callers fall back immediately instead of waiting on timeouts
+
+Failures surface as ``ScoringUnavailable``; callers decide the fallback.
+Metrics: ``scoring.latency_ms``, ``scoring.queue_ms``, ``scoring.tokens``,
+``scoring.requests{status}``, ``scoring.retries``, ``scoring.circuit_open``.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+
+import httpx
+
+from .. import metrics
+
+logger = logging.getLogger("basis.assessment.llm_client")
+
+# LLM config (same as subagent model, stripped of "openai:" prefix)
+_RAW_MODEL = os.getenv("BASIS_SUBAGENT_MODEL", "openai:minimax/minimax-m2.5")
+SCORING_MODEL = _RAW_MODEL.removeprefix("openai:")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+
+# Timeout for a single LLM scoring request (seconds)
+SCORING_TIMEOUT = int(os.getenv("BASIS_SCORING_TIMEOUT", "30"))
+SCORING_MAX_CONCURRENCY = int(os.getenv("BASIS_SCORING_MAX_CONCURRENCY", "16"))
+SCORING_MODEL_CONCURRENCY = int(os.getenv("BASIS_SCORING_MODEL_CONCURRENCY", "8"))
+SCORING_RETRIES = int(os.getenv("BASIS_SCORING_RETRIES", "2"))
+# 单次 chat() 的总时限（排队 + 全部重试 + 退避），默认与单次请求超时相同
+SCORING_DEADLINE = float(os.getenv("BASIS_SCORING_DEADLINE", str(SCORING_TIMEOUT)))
+SCORING_BREAKER_THRESHOLD = int(os.getenv("BASIS_SCORING_BREAKER_THRESHOLD", "5"))
+SCORING_BREAKER_RESET = float(os.getenv("BASIS_SCORING_BREAKER_RESET", "30"))
+
+_RETRY_BASE = 0.5
+_RETRY_CAP = 8.0
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+try:
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+
+class ScoringUnavailable(Exception):
+    """The LLM could not produce a response (errors exhausted or breaker open)."""
+
+
+class CircuitOpenError(ScoringUnavailable):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Circuit breaker
+# ---------------------------------------------------------------------------
+
+
+class CircuitBreaker:
+    """Closed → open after N consecutive failures → half-open probe after reset."""
+
+    def __init__(self, threshold: int = SCORING_BREAKER_THRESHOLD, reset_after: float = SCORING_BREAKER_RESET) -> None:
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            # 半开状态只放行一个探测请求
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def release(self) -> None:
+        """Probe ended without a verdict (e.g. cancelled)."""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+
+def _backoff(attempt: int, retry_after: str | None = None) -> float:
+    if retry_after:
+        try:
+            return min(float(retry_after), _RETRY_CAP)
+        except ValueError:
+            pass
+    return random.uniform(0, min(_RETRY_CAP, _RETRY_BASE * 2 ** attempt))
+
+
+class ScoringClient:
+    def __init__(
+        self,
+        *,
+        base_url: str = OPENAI_BASE_URL,
+        api_key: str = OPENAI_API_KEY,
+        timeout: float = SCORING_TIMEOUT,
+        max_concurrency: int = SCORING_MAX_CONCURRENCY,
+        model_concurrency: int = SCORING_MODEL_CONCURRENCY,
+        retries: int = SCORING_RETRIES,
+        deadline: float = SCORING_DEADLINE,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.model_concurrency = model_concurrency
+        self.retries = retries
+        self.deadline = deadline
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._global_sem: asyncio.Semaphore | None = None
+        self._model_sems: dict[str, asyncio.Semaphore] = {}
+        self.breakers: dict[str, CircuitBreaker] = {}
+
+    def _bind(self) -> httpx.AsyncClient:
+        """Client and semaphores belong to the running loop; rebuild on a new one."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                http2=_HTTP2 and self._transport is None,
+                transport=self._transport,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                    keepalive_expiry=60,
+                ),
+                headers={"Authorization": f"Bearer {self.api_key}"},
+            )
+            self._loop = loop
+            self._global_sem = asyncio.Semaphore(self.max_concurrency)
+            self._model_sems = {}
+        return self._client
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        b = self.breakers.get(model)
+        if b is None:
+            b = self.breakers[model] = CircuitBreaker()
+        return b
+
+    async def chat(
+        self,
+        messages: list[dict],
+        *,
+        model: str = SCORING_MODEL,
+        temperature: float = 0.1,
+        max_tokens: int = 500,
+    ) -> str:
+        """POST /chat/completions and return the message content."""
+        breaker = self.breaker(model)
+        if not breaker.allow():
+            metrics.incr("scoring.circuit_open", model=model)
+            raise CircuitOpenError(f"scoring circuit open for {model}")
+
+        client = self._bind()
+        model_sem = self._model_sems.get(model)
+        if model_sem is None:
+            model_sem = self._model_sems[model] = asyncio.Semaphore(self.model_concurrency)
+
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        try:
+            return await self._post(client, model_sem, breaker, payload, model)
+        except ScoringUnavailable:
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+
+    async def _post(
+        self, client: httpx.AsyncClient, model_sem: asyncio.Semaphore,
+        breaker: CircuitBreaker, payload: dict, model: str,
+    ) -> str:
+        t_queue = time.monotonic()
+        deadline = t_queue + self.deadline
+        async with self._global_sem, model_sem:
+            metrics.observe("scoring.queue_ms", (time.monotonic() - t_queue) * 1000)
+            last_error: Exception | None = None
+            for attempt in range(self.retries + 1):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if attempt:
+                    metrics.incr("scoring.retries", model=model)
+                t0 = time.monotonic()
+                retry_after = None
+                try:
+                    resp = await client.post(
+                        "/chat/completions", json=payload, timeout=min(self.timeout, remaining),
+                    )
+                except httpx.TimeoutException as e:
+                    status, last_error = "timeout", e
+                except httpx.TransportError as e:
+                    status, last_error = "transport_error", e
+                else:
+                    metrics.observe("scoring.latency_ms", (time.monotonic() - t0) * 1000, model=model)
+                    if resp.status_code == 200:
+                        metrics.incr("scoring.requests", status="ok")
+                        breaker.record_success()
+                        data = resp.json()
+                        usage = data.get("usage") or {}
+                        for kind in ("prompt_tokens", "completion_tokens"):
+                            if usage.get(kind):
+                                metrics.incr("scoring.tokens", usage[kind], kind=kind.removesuffix("_tokens"))
+                        return data.get("choices", [{}])[0].get("message", {}).get("content", "") or ""
+                    status = f"http_{resp.status_code}"
+                    last_error = ScoringUnavailable(f"{resp.status_code} {resp.text[:200]}")
+                    if resp.status_code not in _RETRYABLE_STATUS:
+                        # 请求本身有误，重试无意义；服务可达，不计入熔断
+                        metrics.incr("scoring.requests", status=status)
+                        breaker.record_success()
+                        raise last_error
+                    retry_after = resp.headers.get("retry-after")
+                metrics.incr("scoring.requests", status=status)
+                if attempt < self.retries:
+                    delay = _backoff(attempt, retry_after)
+                    if time.monotonic() + delay >= deadline:
+                        break
+                    await asyncio.sleep(delay)
+
+            if last_error is None:
+                # 排队已耗尽时限，未发出请求：与模型健康无关，不计入熔断
+                metrics.incr("scoring.requests", status="deadline")
+                breaker.release()
+                raise ScoringUnavailable(f"scoring deadline ({self.deadline}s) exceeded while queued")
+            breaker.record_failure()
+            if breaker.state != "closed":
+                logger.warning(f"Scoring circuit opened for {model} after {breaker.failures} failures")
+            raise ScoringUnavailable(str(last_error)) from last_error
+
+    async def aclose(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            try:
+                await self._client.aclose()
+            except RuntimeError:
+                # 所属事件循环已关闭
+                pass
+        self._client = None
+        self._loop = None
+
+
+# 进程级单例
+scoring_client = ScoringClient()
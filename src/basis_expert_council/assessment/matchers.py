@@ -0,0 +1,238 @@
+"""
+Precompiled answer matchers for rule-scored questions (mcq, fill_in).
+
+A matcher parses a question's content once — accepted answers, option map,
+numeric alternatives — so scoring an answer is a normalize-and-lookup.
+Matchers live in a per-process LRU keyed by question id and invalidated by
+(updated_at, version); the item pool compiles them when it loads or patches
+a question, so the submit path normally finds them ready.
+
+MCQ accepts the option key in any case and common decorations ("b", "B.",
+"(B)"), a 0-based integer option index, or the exact (normalized) text of a
+unique option.
+
+Fill-in accepts any ``|``-separated alternative after case/whitespace
+normalization. Numeric alternatives also match numerically: integers,
+decimals, thousands separators, fractions ("3/4") and mixed numbers
+("1 1/2"), within ``content.tolerance`` (absolute; default 1e-9 relative).
+A trailing unit from ``UNITS`` is stripped; a given unit must equal the
+expected one, an omitted unit is accepted. Anything else after the number
+("2x", "3n") keeps the answer textual.
+"""
+
+import json
+import re
+from collections import OrderedDict
+
+from .. import metrics
+
+MATCHER_CACHE_SIZE = 50_000
+_REL_TOLERANCE = 1e-9
+
+# 可省略的计量单位（小写、去空格后比较）
+UNITS = frozenset({
+    "mm", "cm", "m", "km", "in", "ft", "yd", "mi", "mm²", "cm²", "m²", "km²", "cm³", "m³",
+    "mg", "g", "kg", "lb", "oz", "ml", "l", "s", "sec", "min", "h", "hr", "hrs",
+    "m/s", "km/h", "mph", "%", "°", "°c", "°f", "degrees", "dollars", "cents", "$", "¢",
+    "毫米", "厘米", "分米", "米", "千米", "公里", "平方厘米", "平方米", "立方厘米",
+    "克", "千克", "公斤", "毫升", "升", "秒", "分", "分钟", "时", "小时", "天", "度", "元", "角",
+    "个", "人", "只", "本", "朵", "支", "块", "次", "岁",
+})
+
+_WHITESPACE = re.compile(r"\s+")
+_MCQ_KEY = re.compile(r"^[(\[（]?\s*([A-Za-z])\s*[)\]）.．、:]?$")
+_OPTION_PREFIX = re.compile(r"^([A-Za-z])\s*[.)．、:]\s*")
+_NUMBER = re.compile(
+    r"^(?P<num>[-+−]?(?:\d+\s+\d+/\d+|\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d*)?(?:/\d+)?|\.\d+))"
+    r"\s*(?P<unit>[^\d\s.,/+\-−][^\d]*)?$"
+)
+
+
+def _normalize(text: str) -> str:
+    return _WHITESPACE.sub(" ", str(text).strip().lower())
+
+
+def _content(question: dict) -> dict:
+    content = question.get("content_en") or question.get("content_zh") or {}
+    if isinstance(content, str):
+        content = json.loads(content)
+    return content
+
+
+def _given(user_answer, key: str) -> object:
+    """Extract the submitted value: {"selected"/"text": v}, its JSON string, or v."""
+    if isinstance(user_answer, dict):
+        return user_answer.get(key, "")
+    if isinstance(user_answer, str):
+        if not user_answer.lstrip().startswith("{"):
+            return user_answer
+        try:
+            parsed = json.loads(user_answer)
+        except (json.JSONDecodeError, TypeError):
+            return user_answer
+        return parsed.get(key, user_answer) if isinstance(parsed, dict) else user_answer
+    return user_answer
+
+
+def _to_float(raw: str) -> float:
+    num, _, den = raw.partition("/")
+    return float(num) / float(den) if den else float(num)
+
+
+def parse_number(text: str) -> tuple[float, str] | None:
+    """'1,250 cm' → (1250.0, 'cm'); '1 1/2' → (1.5, ''); None if not numeric."""
+    return _parse_normalized(_normalize(text))
+
+
+def _parse_normalized(text: str) -> tuple[float, str] | None:
+    m = _NUMBER.match(text)
+    if not m:
+        return None
+    raw = m.group("num").replace("−", "-").replace(",", "")
+    sign = -1 if raw.startswith("-") else 1
+    raw = raw.lstrip("+-")
+    try:
+        if " " in raw:
+            whole, frac = raw.split(" ", 1)
+            value = float(whole) + _to_float(frac)
+        else:
+            value = _to_float(raw)
+    except (ValueError, ZeroDivisionError):
+        return None
+    unit = _WHITESPACE.sub("", m.group("unit") or "")
+    return sign * value, unit
+
+
+# ---------------------------------------------------------------------------
+# Matchers
+# ---------------------------------------------------------------------------
+
+
+class McqMatcher:
+    __slots__ = ("accepted", "index_keys", "text_keys")
+
+    def __init__(self, content: dict) -> None:
+        correct = str(content.get("answer", "")).strip().upper()
+        self.accepted = correct
+        self.index_keys: list[str] = []
+        self.text_keys: dict[str, str] = {}
+        seen_texts: set[str] = set()
+        for opt in content.get("options") or []:
+            opt_str = str(opt).strip()
+            m = _OPTION_PREFIX.match(opt_str)
+            key = m.group(1).upper() if m else opt_str[:1].upper()
+            text = _normalize(opt_str[m.end():] if m else opt_str)
+            self.index_keys.append(key)
+            if text in seen_texts:
+                self.text_keys.pop(text, None)  # 文本重复的选项不按文本判分
+            else:
+                seen_texts.add(text)
+                self.text_keys[text] = key
+
+    def match(self, user_answer) -> bool:
+        given = _given(user_answer, "selected")
+        if isinstance(given, int) and not isinstance(given, bool):
+            return 0 <= given < len(self.index_keys) and self.index_keys[given] == self.accepted
+        given = str(given).strip()
+        if given.upper() == self.accepted:
+            return True
+        m = _MCQ_KEY.match(given)
+        if m:
+            return m.group(1).upper() == self.accepted
+        return self.text_keys.get(_normalize(given)) == self.accepted
+
+
+class FillInMatcher:
+    __slots__ = ("accepted", "numbers", "tolerance")
+
+    def __init__(self, content: dict) -> None:
+        correct = str(content.get("answer", "")).strip()
+        alternatives = [a for a in correct.split("|")]
+        self.accepted = frozenset(
+            [_normalize(a) for a in alternatives] + [a.strip().lower() for a in alternatives] + [_normalize(correct)]
+        )
+        self.numbers = [
+            n for n in (parse_number(a) for a in alternatives)
+            if n is not None and (not n[1] or n[1] in UNITS)
+        ]
+        tol = content.get("tolerance")
+        self.tolerance = float(tol) if tol is not None else None
+
+    def _close(self, a: float, b: float) -> bool:
+        if self.tolerance is not None:
+            return abs(a - b) <= self.tolerance
+        return abs(a - b) <= _REL_TOLERANCE * max(abs(a), abs(b), 1)
+
+    def match(self, user_answer) -> bool:
+        given = _normalize(_given(user_answer, "text"))
+        if given in self.accepted:
+            return True
+        if not self.numbers:
+            return False
+        parsed = _parse_normalized(given)
+        if parsed is None:
+            return False
+        value, unit = parsed
+        if unit and unit not in UNITS:
+            return False
+        return any(
+            self._close(value, expected) and (not unit or unit == expected_unit)
+            for expected, expected_unit in self.numbers
+        )
+
+
+_MATCHER_TYPES = {"mcq": McqMatcher, "fill_in": FillInMatcher}
+
+
+def compile_matcher(question: dict) -> McqMatcher | FillInMatcher | None:
+    cls = _MATCHER_TYPES.get(question.get("question_type", ""))
+    return cls(_content(question)) if cls else None
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+
+class MatcherCache:
+    def __init__(self, maxsize: int = MATCHER_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        # question_id → (version key, matcher)
+        self._entries: OrderedDict[int, tuple[tuple, object]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _version(question: dict) -> tuple | None:
+        key = (question.get("updated_at"), question.get("version"))
+        return None if key == (None, None) else key
+
+    def compile(self, question: dict):
+        """Build and store the matcher of a question row (load / update time)."""
+        matcher = compile_matcher(question)
+        qid, version = question.get("id"), self._version(question)
+        if matcher is None or qid is None or version is None:
+            return matcher
+        self._entries[qid] = (version, matcher)
+        self._entries.move_to_end(qid)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return matcher
+
+    def get(self, question: dict):
+        entry = self._entries.get(question.get("id"))
+        if entry is not None and entry[0] == self._version(question):
+            return entry[1]
+        metrics.incr("matchers.compile")
+        return self.compile(question)
+
+    def discard(self, question_id: int) -> None:
+        self._entries.pop(question_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# 进程级单例
+matcher_cache = MatcherCache()
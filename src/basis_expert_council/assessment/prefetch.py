@@ -0,0 +1,106 @@
+"""
+Speculative next-question prefetch.
+
+Once a question is served, the next CAT state and item depend only on
+whether the answer is (effectively) correct. Both outcomes are computed in
+the background and stashed per session. ``submit_answer`` then takes the
+precomputed branch after scoring, skipping state update and selection.
+
+Entries are bound to the item-pool version they were computed against and
+to the session's answered count, so pool edits, stale sessions and
+out-of-order submits simply miss.
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+
+from .. import metrics
+from .item_pool import item_pool
+
+logger = logging.getLogger("basis.assessment.prefetch")
+
+PREFETCH_CACHE_SIZE = 10_000
+# 后台预取任务的强引用，避免事件循环只持有弱引用时被回收
+_background: set[asyncio.Task] = set()
+
+
+class _Entry:
+    __slots__ = ("question_id", "base_count", "version", "outcomes")
+
+    def __init__(self, question_id: int, base_count: int, version: int, outcomes: dict) -> None:
+        self.question_id = question_id
+        self.base_count = base_count
+        self.version = version
+        # effective_correct → (new CATState, next question row | None, is_last)
+        self.outcomes = outcomes
+
+
+class PrefetchCache:
+    def __init__(self, maxsize: int = PREFETCH_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def prefetch(self, session: dict, state, question: dict) -> None:
+        """Precompute both outcomes of answering ``question`` from ``state``."""
+        from ..assessment_engine import _advance_cat_state
+        from .selection import select_next_question
+
+        version = item_pool.version
+        outcomes = {}
+        for correct in (True, False):
+            new_state, is_last = _advance_cat_state(state, question, correct)
+            next_q = None if is_last else await select_next_question(session, new_state)
+            outcomes[correct] = (new_state, next_q, is_last or next_q is None)
+
+        session_id = str(session["id"])
+        self._entries[session_id] = _Entry(question["id"], state.question_count, version, outcomes)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        metrics.gauge("prefetch.size", len(self._entries))
+
+    def schedule(self, session: dict, state, question: dict | None) -> None:
+        """Fire-and-forget prefetch after a question has been served."""
+        if question is None:
+            return
+        task = asyncio.create_task(self._safe_prefetch(session, state, question))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+
+    async def _safe_prefetch(self, session: dict, state, question: dict) -> None:
+        try:
+            await self.prefetch(session, state, question)
+        except Exception as e:
+            metrics.incr("prefetch.error")
+            logger.warning(f"Prefetch failed for session {session.get('id')}: {e}")
+
+    def take(
+        self, session_id: str, question_id: int, base_count: int, correct: bool,
+    ) -> tuple | None:
+        """Pop the precomputed branch, or None on a miss."""
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            reason = "absent"
+        elif entry.version != item_pool.version:
+            reason = "pool_changed"
+        elif entry.question_id != question_id or entry.base_count != base_count:
+            reason = "mismatch"
+        else:
+            metrics.incr("prefetch.hit")
+            return entry.outcomes[correct]
+        metrics.incr("prefetch.miss", reason=reason)
+        return None
+
+    def discard(self, session_id: str) -> None:
+        self._entries.pop(session_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# 进程级单例
+prefetch_cache = PrefetchCache()
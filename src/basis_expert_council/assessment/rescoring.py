@@ -0,0 +1,281 @@
+"""
+Bulk ability-score backfill / rescoring for the whole user base.
+
+Completed sessions (with their report) are streamed in (user_id, completed_at)
+order over a server-side cursor and cut into batches of whole users. Each
+batch's answers are fetched with one query, all of its sessions are
+re-estimated in a single vectorized ``irt.estimate_batch`` pass, and the
+per-(user, subject, topic) rolling averages are folded with ``np.bincount``.
+Results are COPYed into temp staging tables and merged with one upsert and one
+history insert (``db.merge_ability_batch``) in the same transaction as the job
+checkpoint, so an interrupted run resumes after the last committed user.
+
+Modes:
+  rescore   replace each user's session-sourced snapshot rows and history with
+            the recomputed ones, deleting keys that no longer occur; rerunnable
+  backfill  fold sessions into the existing rolling averages, one session at a
+            time in completion order
+
+Snapshot rows that the academic profile computation has written
+(``last_computed_at`` set) are derived from answer tallies and owned by it;
+neither mode overwrites or deletes them.
+
+Usage: ``python -m src.basis_expert_council.question_bank rescore-abilities``
+"""
+
+import json
+import logging
+import time
+from array import array
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from . import irt
+
+logger = logging.getLogger("basis.assessment.rescoring")
+
+MODES = ("rescore", "backfill")
+# 每批（一个事务）处理的用户数
+BATCH_USERS = 200
+# 游标预取行数
+_PREFETCH = 2_000
+
+# $1: 断点 user_id（只处理其后的用户）；$2: 可选的用户白名单
+_SESSIONS_SQL = """
+    SELECT s.id, s.user_id, s.subject, s.final_score, s.ability_level,
+           COALESCE(s.completed_at, s.created_at) AS completed_at, r.report_data
+    FROM assessment_sessions s
+    LEFT JOIN LATERAL (
+        SELECT report_data FROM assessment_reports
+        WHERE session_id = s.id ORDER BY created_at DESC LIMIT 1
+    ) r ON TRUE
+    WHERE s.status = 'completed' AND s.user_id > $1
+      AND ($2::int[] IS NULL OR s.user_id = ANY($2::int[]))
+    ORDER BY s.user_id, s.completed_at, s.id
+"""
+
+_ANSWERS_SQL = """
+    SELECT a.session_id, a.is_correct, a.score, a.difficulty_at,
+           q.difficulty, q.discrimination, q.question_type
+    FROM assessment_answers a
+    JOIN assessment_questions q ON q.id = a.question_id
+    WHERE a.session_id = ANY($1::uuid[])
+    ORDER BY a.session_id, a.question_order
+"""
+
+
+@dataclass
+class ScoredBatch:
+    # (user_id, subject, topic, n, ability_sum, last_session_id)，每个键一行
+    scores: list[tuple] = field(default_factory=list)
+    # (user_id, subject, topic, ability_score, score_100, session_id, recorded_at)，每个会话每个键一行
+    history: list[tuple] = field(default_factory=list)
+
+
+@dataclass
+class RescoreReport:
+    job: str
+    mode: str
+    resumed_from: int = 0
+    users: int = 0
+    sessions: int = 0
+    rows: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    already_finished: bool = False
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def format(self) -> str:
+        lines = [
+            "=" * 60,
+            f"  能力分{'重算' if self.mode == 'rescore' else '回填'}报告 (job={self.job})",
+            "=" * 60,
+        ]
+        if self.already_finished:
+            lines.append("  任务已完成，如需重跑请加 --restart 或换一个 --job")
+        else:
+            if self.resumed_from:
+                lines.append(f"  从断点续跑: user_id > {self.resumed_from}")
+            lines += [
+                f"  用户数: {self.users}   会话数: {self.sessions}   批次: {self.batches}",
+                f"  写入行数: {self.rows}   耗时: {self.seconds:.1f}s   ({self.rows_per_sec:.0f} rows/s)",
+            ]
+        lines.append("=" * 60)
+        return "\n".join(lines)
+
+
+# ---------------------------------------------------------------------------
+# 计算（纯函数）
+# ---------------------------------------------------------------------------
+
+
+def topic_abilities(report_data) -> list[tuple[str, float]]:
+    """Topic-level abilities from a report's ``topic_scores`` (accuracy in % or 0-1)."""
+    if isinstance(report_data, str):
+        try:
+            report_data = json.loads(report_data)
+        except ValueError:
+            return []
+    if not isinstance(report_data, dict):
+        return []
+    out = []
+    for topic, data in (report_data.get("topic_scores") or {}).items():
+        if not topic or not isinstance(data, dict):
+            continue
+        acc = data.get("accuracy", 0)
+        if isinstance(acc, (int, float)) and not isinstance(acc, bool):
+            out.append((topic, acc / 100.0 if acc > 1 else float(acc)))
+    return out
+
+
+def score_sessions(sessions: list[dict], answers_by_session: dict) -> ScoredBatch:
+    """Score a batch of sessions (ordered by completion within each user).
+
+    Subject-level ability comes from one vectorized IRT pass over all sessions,
+    falling back to the stored ability_level / final_score when a session has
+    no scored answers; topic-level ability from the report's topic accuracy.
+    """
+    estimates = irt.estimate_batch([answers_by_session.get(s["id"], []) for s in sessions])
+    keys: dict[tuple, int] = {}
+    last_session: list = []
+    group = array("i")
+    values = array("d")
+    batch = ScoredBatch()
+
+    for sess, est in zip(sessions, estimates):
+        if sess["final_score"] is None:
+            continue
+        if est.n_items:
+            ability = est.ability
+        elif sess["ability_level"]:
+            ability = float(sess["ability_level"])
+        else:
+            ability = float(sess["final_score"]) / 100.0
+
+        for topic, value in [(None, ability), *topic_abilities(sess["report_data"])]:
+            key = (sess["user_id"], sess["subject"], topic)
+            g = keys.get(key)
+            if g is None:
+                g = keys[key] = len(keys)
+                last_session.append(None)
+            last_session[g] = sess["id"]
+            group.append(g)
+            values.append(value)
+            batch.history.append(
+                (*key, value, round(value * 100, 1), sess["id"], sess["completed_at"])
+            )
+
+    if not keys:
+        return batch
+    idx = np.frombuffer(group, dtype=np.int32)
+    counts = np.bincount(idx, minlength=len(keys))
+    sums = np.bincount(idx, weights=np.frombuffer(values, dtype=np.float64), minlength=len(keys))
+    batch.scores = [
+        (*key, int(counts[g]), float(sums[g]), last_session[g]) for key, g in keys.items()
+    ]
+    return batch
+
+
+# ---------------------------------------------------------------------------
+# 读取 / 写入
+# ---------------------------------------------------------------------------
+
+
+async def _fetch_answers(conn, session_ids: list) -> dict:
+    answers: dict = {}
+    if session_ids:
+        for r in await conn.fetch(_ANSWERS_SQL, session_ids):
+            answers.setdefault(r["session_id"], []).append(dict(r))
+    return answers
+
+
+async def rescore_users(user_ids: list[int], mode: str = "backfill") -> int:
+    """Rescore a few users in one merge; returns the number of history points written."""
+    from .. import db
+
+    pool = await db.get_pool()
+    async with pool.acquire() as conn:
+        sessions = [dict(r) for r in await conn.fetch(_SESSIONS_SQL, 0, user_ids)]
+        answers = await _fetch_answers(conn, [s["id"] for s in sessions])
+    batch = score_sessions(sessions, answers)
+    await db.merge_ability_batch(
+        batch.scores, batch.history, user_ids=user_ids, replace=mode == "rescore",
+    )
+    return len(batch.history)
+
+
+# ---------------------------------------------------------------------------
+# 入口
+# ---------------------------------------------------------------------------
+
+
+async def rescore_abilities(
+    *,
+    mode: str = "rescore",
+    job: str | None = None,
+    batch_users: int = BATCH_USERS,
+    restart: bool = False,
+    on_progress: Callable[[RescoreReport], None] | None = None,
+) -> RescoreReport:
+    """Backfill or rescore every user's ability scores, resumable by ``job`` name."""
+    from .. import db, metrics
+
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}")
+    job = job or mode
+    state = await db.start_rescore_job(job, mode, restart=restart)
+    if state["mode"] != mode:
+        raise ValueError(
+            f"Job {job!r} was started in {state['mode']} mode; use --restart or another --job"
+        )
+    report = RescoreReport(job=job, mode=mode, resumed_from=state["last_user_id"])
+    if state["finished_at"] is not None:
+        report.already_finished = True
+        return report
+
+    t0 = time.monotonic()
+
+    async def flush(conn, sessions: list[dict], user_ids: list[int]) -> None:
+        batch = score_sessions(sessions, await _fetch_answers(conn, [s["id"] for s in sessions]))
+        written = await db.merge_ability_batch(
+            batch.scores, batch.history, user_ids=user_ids, replace=mode == "rescore",
+            job=job, sessions=len(sessions),
+        )
+        report.batches += 1
+        report.users += len(user_ids)
+        report.sessions += len(sessions)
+        report.rows += written
+        report.seconds = time.monotonic() - t0
+        metrics.incr("ability_rescore.rows", written)
+        metrics.gauge("ability_rescore.rows_per_sec", report.rows_per_sec)
+        if on_progress:
+            on_progress(report)
+
+    pool = await db.get_pool()
+    async with pool.acquire() as conn:
+        # 只读快照内的游标；每批的写入走另一条连接并各自提交
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            sessions: list[dict] = []
+            user_ids: list[int] = []
+            async for row in conn.cursor(_SESSIONS_SQL, state["last_user_id"], None, prefetch=_PREFETCH):
+                if not user_ids or row["user_id"] != user_ids[-1]:
+                    if len(user_ids) >= batch_users:
+                        await flush(conn, sessions, user_ids)
+                        sessions, user_ids = [], []
+                    user_ids.append(row["user_id"])
+                sessions.append(dict(row))
+            if user_ids:
+                await flush(conn, sessions, user_ids)
+
+    await db.finish_rescore_job(job)
+    report.seconds = time.monotonic() - t0
+    logger.info(
+        f"Ability {mode} {job!r} done: {report.users} users, {report.sessions} sessions, "
+        f"{report.rows} rows in {report.seconds:.1f}s ({report.rows_per_sec:.0f} rows/s)"
+    )
+    return report
@@ -1,5 +1,7 @@
 """Compute statistics from session answers."""
 
+from . import irt
+
 
 def compute_session_stats(answers: list[dict], questions_map: dict[int, dict]) -> dict:
     """
@@ -54,13 +56,16 @@ def compute_session_stats(answers: list[dict], questions_map: dict[int, dict]) -
     # Difficulty progression
     difficulty_progression = [a.get("difficulty_at", 0.5) for a in answers]
 
-    # Ability level: recency-weighted average of last 5 difficulties
-    last_diffs = difficulty_progression[-5:]
-    if last_diffs:
-        weights = list(range(1, len(last_diffs) + 1))
-        ability_level = sum(d * w for d, w in zip(last_diffs, weights)) / sum(weights)
-    else:
-        ability_level = 0.5
+    # Ability level: IRT EAP estimate, item parameters from questions_map
+    items = []
+    for a in answers:
+        q = questions_map.get(a.get("question_id"), {})
+        items.append({
+            **a,
+            "difficulty": q.get("difficulty", a.get("difficulty_at")),
+            "discrimination": q.get("discrimination"),
+        })
+    ability_level = irt.estimate(items).ability
 
     # Weak and strong topics (threshold: < 0.5 weak, >= 0.7 strong)
     weak_topics = [t for t, d in topic_scores.items() if d["accuracy"] < 0.5 and d["total"] >= 2]
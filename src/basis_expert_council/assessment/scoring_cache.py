@@ -0,0 +1,132 @@
+"""
+Content-addressed cache for LLM scoring results.
+
+Key: (question_id, sha256 of the normalized answer, scoring model, prompt
+version). Normalization (NFKC, case-fold, collapsed whitespace, trailing
+punctuation stripped) makes trivially different submissions share a key.
+
+Two tiers:
+
+- in-process LRU (``BASIS_SCORING_CACHE_SIZE`` entries); entries are
+  re-checked against Postgres after ``SCORING_CACHE_LOCAL_TTL`` seconds so a
+  purge on one replica reaches the others
+- ``scoring_cache`` table with a ``BASIS_SCORING_CACHE_TTL`` expiry; expired
+  rows are deleted by ``evict_expired`` (daily cleanup loop)
+
+Only genuine LLM verdicts are stored — never fallback scores. Entries of a
+question are purged when its content, explanation or type changes
+(``db.update_question``) and via ``POST /api/admin/scoring-cache/purge``.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+
+from .. import metrics
+
+logger = logging.getLogger("basis.assessment.scoring_cache")
+
+SCORING_CACHE_SIZE = int(os.getenv("BASIS_SCORING_CACHE_SIZE", "10000"))
+SCORING_CACHE_TTL = float(os.getenv("BASIS_SCORING_CACHE_TTL", str(30 * 86400)))
+SCORING_CACHE_LOCAL_TTL = 300.0
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCT = "。．.!！?？;；,，、 "
+
+
+def normalize_answer(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _WHITESPACE.sub(" ", text).strip().rstrip(_TRAILING_PUNCT)
+
+
+def answer_hash(text: str) -> str:
+    return hashlib.sha256(normalize_answer(text).encode("utf-8")).hexdigest()
+
+
+class ScoringCache:
+    def __init__(self, maxsize: int = SCORING_CACHE_SIZE, ttl: float = SCORING_CACHE_TTL) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key → (checked_at, (is_correct, score, feedback))
+        self._lru: OrderedDict[tuple, tuple[float, tuple]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    @staticmethod
+    def key(question_id: int, answer_text: str, model: str, prompt_version: str) -> tuple:
+        return (question_id, answer_hash(answer_text), model, prompt_version)
+
+    def _remember(self, key: tuple, value: tuple) -> None:
+        self._lru[key] = (time.monotonic(), value)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    async def get(self, key: tuple) -> tuple[bool, float, str] | None:
+        """Cached (is_correct, score, feedback) or None."""
+        from .. import db
+
+        entry = self._lru.get(key)
+        if entry is not None and time.monotonic() - entry[0] < SCORING_CACHE_LOCAL_TTL:
+            self._lru.move_to_end(key)
+            metrics.incr("scoring_cache.hit", tier="memory")
+            return entry[1]
+
+        try:
+            row = await db.get_cached_score(*key)
+        except Exception as e:
+            logger.warning(f"Scoring cache lookup failed: {e}")
+            row = None
+        if row is None:
+            self._lru.pop(key, None)
+            metrics.incr("scoring_cache.miss")
+            return None
+        value = (row["is_correct"], round(row["score"], 4), row["feedback"])  # REAL 精度
+        self._remember(key, value)
+        metrics.incr("scoring_cache.hit", tier="db")
+        return value
+
+    async def put(self, key: tuple, is_correct: bool, score: float, feedback: str | None) -> None:
+        from .. import db
+
+        value = (is_correct, score, feedback)
+        self._remember(key, value)
+        try:
+            await db.put_cached_score(
+                *key, is_correct=is_correct, score=score, feedback=feedback, ttl_sec=self.ttl,
+            )
+        except Exception as e:
+            logger.warning(f"Scoring cache write failed: {e}")
+
+    def forget(self, question_ids: list[int] | None = None) -> None:
+        """Drop in-process entries of the given questions (None = all)."""
+        if question_ids is None:
+            self._lru.clear()
+            return
+        ids = set(question_ids)
+        for key in [k for k in self._lru if k[0] in ids]:
+            del self._lru[key]
+
+    async def purge(self, question_ids: list[int] | None = None) -> int:
+        """Drop entries of the given questions (None = all) in both tiers."""
+        from .. import db
+
+        self.forget(question_ids)
+        deleted = await db.purge_scoring_cache(question_ids)
+        metrics.incr("scoring_cache.purged", deleted)
+        logger.info(f"Scoring cache purged: {deleted} rows (questions={question_ids or 'all'})")
+        return deleted
+
+    async def evict_expired(self) -> int:
+        from .. import db
+
+        return await db.evict_expired_scoring_cache()
+
+
+# 进程级单例
+scoring_cache = ScoringCache()
@@ -0,0 +1,155 @@
+"""
+Pluggable CAT next-question selection strategies.
+
+- ``staircase`` (default): target the ±0.15/0.25 step difficulty from
+  ``compute_next_difficulty`` and sample from the item-pool cascade.
+- ``max_info``: pick among the unexposed items with the highest Fisher
+  information at the session's current theta (2PL, ``assessment.irt``).
+  Information is precomputed per item on a theta grid, one table per
+  (subject, grade_level), so selection is a column lookup plus a partial sort.
+  Topic counts soft-balance content by down-weighting topics that were
+  already asked. For exposure control the item is drawn at random from the
+  ``BASIS_CAT_RANDOMESQUE`` most informative ones (randomesque selection), so
+  sessions with the same responses do not all walk the same item path.
+
+The strategy is chosen with ``BASIS_CAT_SELECTION``.
+"""
+
+import logging
+import os
+import random
+
+import numpy as np
+
+from . import irt
+from .item_pool import find_next_question, item_pool
+
+logger = logging.getLogger("basis.assessment.selection")
+
+CAT_SELECTION = os.getenv("BASIS_CAT_SELECTION", "staircase")
+STRATEGIES = ("staircase", "max_info")
+# max_info 曝光控制：在信息量最高的 k 道题中随机抽取（1 = 纯 argmax）
+CAT_RANDOMESQUE = max(1, int(os.getenv("BASIS_CAT_RANDOMESQUE", "5")))
+
+# 信息量表的 theta 网格
+THETA_GRID = np.linspace(irt.THETA_MIN, irt.THETA_MAX, 81)
+# 内容均衡：同一 topic 每多出一道题，信息量乘以该系数
+TOPIC_DECAY = 0.6
+
+
+class InformationTable:
+    """Item information on THETA_GRID for the selectable items of one bucket."""
+
+    __slots__ = ("ids", "topics", "topic_codes", "info")
+
+    def __init__(self, rows: list[dict]) -> None:
+        self.ids = np.array([r["id"] for r in rows], dtype=np.int64)
+        a = np.array(
+            [float(r.get("discrimination") or irt.DEFAULT_DISCRIMINATION) for r in rows]
+        )
+        b = irt.difficulty_to_b([float(r["difficulty"]) for r in rows])
+        self.topics: list[str] = sorted({r.get("topic") or "" for r in rows})
+        code = {t: i for i, t in enumerate(self.topics)}
+        self.topic_codes = np.array([code[r.get("topic") or ""] for r in rows], dtype=np.int32)
+        # (n_items, n_grid)
+        self.info = irt.item_information(THETA_GRID[None, :], a[:, None], b[:, None])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def best(
+        self,
+        theta: float,
+        exclude_ids: list[int] | set[int],
+        topic_counts: dict[str, int] | None = None,
+        *,
+        top_k: int = 1,
+        rng: random.Random | None = None,
+    ) -> int | None:
+        """Id of a non-excluded item at theta, or None.
+
+        With ``top_k`` > 1 the item is drawn uniformly from the ``top_k`` most
+        informative ones; otherwise the single most informative is returned.
+        """
+        if not len(self.ids):
+            return None
+        g = int(np.abs(THETA_GRID - theta).argmin())
+        score = self.info[:, g].copy()
+        if exclude_ids:
+            score[np.isin(self.ids, list(exclude_ids))] = -np.inf
+        if topic_counts:
+            counts = np.array([topic_counts.get(t, 0) for t in self.topics])
+            score *= TOPIC_DECAY ** counts[self.topic_codes]
+        k = min(top_k, int(np.isfinite(score).sum()))
+        if k <= 0:
+            return None
+        if k == 1:
+            return int(self.ids[int(score.argmax())])
+        top = np.argpartition(-score, k - 1)[:k]
+        return int(self.ids[int(top[(rng or random).randrange(k)])])
+
+
+# (subject, grade_level) → InformationTable，随 item_pool.version 失效
+_tables: dict[tuple[str, str], InformationTable] = {}
+_tables_version = -1
+_rng = random.Random()
+
+
+def information_table(subject: str, grade_level: str) -> InformationTable:
+    global _tables_version
+    if _tables_version != item_pool.version:
+        _tables.clear()
+        _tables_version = item_pool.version
+    key = (subject, grade_level)
+    table = _tables.get(key)
+    if table is None:
+        rows = [item_pool.get(qid) for qid in item_pool.selectable_ids(subject, grade_level)]
+        table = _tables[key] = InformationTable(rows)
+    return table
+
+
+def _topic_counts(answered_ids: list[int]) -> dict[str, int]:
+    counts: dict[str, int] = {}
+    for qid in answered_ids:
+        row = item_pool.get(qid)
+        if row is not None:
+            topic = row.get("topic") or ""
+            counts[topic] = counts.get(topic, 0) + 1
+    return counts
+
+
+async def select_next_question(
+    session: dict, state, strategy: str | None = None, tolerance: float = 0.15,
+) -> dict | None:
+    """Next question for a session given its CATState.
+
+    Falls back to the item-pool cascade (wider windows, adjacent grades,
+    subject-wide) when the strategy finds nothing in the target grade.
+    """
+    strategy = strategy or CAT_SELECTION
+    target = state.current_difficulty
+
+    if strategy == "max_info":
+        try:
+            await item_pool.ensure_loaded()
+            table = information_table(session["subject"], session["grade_level"])
+            qid = table.best(
+                state.theta,
+                set(state.answered_question_ids),
+                _topic_counts(state.answered_question_ids),
+                top_k=CAT_RANDOMESQUE,
+                rng=_rng,
+            )
+            if qid is not None:
+                return dict(item_pool.get(qid))
+        except Exception as e:
+            logger.warning(f"max_info selection failed, using cascade: {e}")
+        target = float(irt.theta_to_ability(state.theta))
+
+    return await find_next_question(
+        subject=session["subject"],
+        grade_level=session["grade_level"],
+        target_difficulty=target,
+        exclude_ids=state.answered_question_ids,
+        tolerance=tolerance,
+    )
@@ -0,0 +1,299 @@
+"""
+Offline CAT simulation harness (no database).
+
+Simulated examinees with known true theta answer from a 2PL model whose item
+parameters are the bank's own ``difficulty`` / ``discrimination``. Each
+strategy drives the same code the live path uses:
+
+- ``staircase``: ``_advance_cat_state`` (step difficulty + stopping policy)
+  with the in-memory item-pool cascade
+- ``max_info``: ``_advance_cat_state`` with max-information (randomesque)
+  selection
+- ``cat_engine``: the standalone ``CATEngine`` (its own window selection,
+  15-25 item stopping rule and recency-weighted ability)
+
+Reported per strategy: per-decision latency, items used, stop reasons,
+estimation bias / RMSE / correlation on the theta scale, and item exposure.
+
+Usage: ``python -m src.basis_expert_council.question_bank simulate``
+"""
+
+import random
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from . import irt
+
+STRATEGIES = ("staircase", "max_info", "cat_engine")
+
+
+# ---------------------------------------------------------------------------
+# 题库
+# ---------------------------------------------------------------------------
+
+
+def synthetic_bank(
+    n_items: int, *, subject: str = "math", grade_level: str = "G7",
+    n_topics: int = 6, seed: int = 0,
+) -> list[dict]:
+    """Items with uniform difficulty and log-normal discrimination."""
+    rng = np.random.default_rng(seed)
+    difficulty = rng.uniform(0.02, 0.98, n_items)
+    discrimination = np.clip(rng.lognormal(0.1, 0.3, n_items), 0.4, 3.0)
+    return [
+        {
+            "id": i + 1,
+            "subject": subject,
+            "grade_level": grade_level,
+            "topic": f"topic_{i % n_topics}",
+            "difficulty": round(float(d), 4),
+            "discrimination": round(float(a), 3),
+            "question_type": "mcq",
+            "review_status": "approved",
+        }
+        for i, (d, a) in enumerate(zip(difficulty, discrimination))
+    ]
+
+
+def load_bank(path: str | Path) -> list[dict]:
+    """Load items from an import/export JSON file or a directory of them."""
+    from ..question_bank.importer import load_json_file, scan_directory
+
+    path = Path(path)
+    files = scan_directory(path) if path.is_dir() else [path]
+    rows: list[dict] = []
+    seen: set[tuple] = set()
+    for f in files:
+        try:
+            _, questions = load_json_file(f)
+        except ValueError:
+            continue
+        for q in questions:
+            if q.get("difficulty") is None or not q.get("subject"):
+                continue
+            # 汇总文件与分年级文件会重复收录同一题
+            stem = (q.get("content_en") or q.get("content_zh") or {}).get("stem")
+            key = (q["subject"], q.get("grade_level"), stem)
+            if stem and key in seen:
+                continue
+            seen.add(key)
+            rows.append({**q, "id": len(rows) + 1, "review_status": "approved"})
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# 结果
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class StrategyResult:
+    strategy: str
+    true_theta: np.ndarray
+    est_theta: np.ndarray
+    items_used: np.ndarray
+    decision_us: list[float] = field(default_factory=list)
+    stop_reasons: dict[str, int] = field(default_factory=dict)
+    exposure: dict[int, int] = field(default_factory=dict)
+    bank_size: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> dict:
+        err = self.est_theta - self.true_theta
+        lat = np.array(self.decision_us) if self.decision_us else np.zeros(1)
+        n = len(self.true_theta)
+        rates = np.array(list(self.exposure.values()), dtype=float) / max(n, 1)
+        return {
+            "strategy": self.strategy,
+            "examinees": n,
+            "items_mean": round(float(self.items_used.mean()), 2),
+            "items_p95": int(np.percentile(self.items_used, 95)),
+            "bias": round(float(err.mean()), 3),
+            "rmse": round(float(np.sqrt((err ** 2).mean())), 3),
+            "corr": round(float(np.corrcoef(self.true_theta, self.est_theta)[0, 1]), 3) if n > 1 else 0.0,
+            "decision_us_p50": round(float(np.percentile(lat, 50)), 1),
+            "decision_us_p99": round(float(np.percentile(lat, 99)), 1),
+            "exposure_max": round(float(rates.max()), 3) if len(rates) else 0.0,
+            "unused_items": self.bank_size - len(self.exposure),
+            "stop_reasons": dict(sorted(self.stop_reasons.items())),
+            "seconds": round(self.seconds, 2),
+        }
+
+
+def format_report(results: list[StrategyResult]) -> str:
+    lines = ["=" * 72, "  CAT 模拟报告", "=" * 72]
+    header = (
+        f"  {'strategy':12s} {'items':>6s} {'p95':>4s} {'bias':>7s} {'rmse':>6s} "
+        f"{'corr':>6s} {'µs p50':>8s} {'µs p99':>8s} {'maxexp':>7s} {'unused':>6s}"
+    )
+    lines += [header, "  " + "-" * 70]
+    for r in results:
+        s = r.summary()
+        lines.append(
+            f"  {s['strategy']:12s} {s['items_mean']:6.2f} {s['items_p95']:4d} "
+            f"{s['bias']:7.3f} {s['rmse']:6.3f} {s['corr']:6.3f} "
+            f"{s['decision_us_p50']:8.1f} {s['decision_us_p99']:8.1f} "
+            f"{s['exposure_max']:7.3f} {s['unused_items']:6d}"
+        )
+    lines.append("")
+    for r in results:
+        s = r.summary()
+        reasons = ", ".join(f"{k}={v}" for k, v in s["stop_reasons"].items())
+        lines.append(f"  {s['strategy']:12s} 结束原因: {reasons}   耗时 {s['seconds']}s")
+    lines.append("=" * 72)
+    return "\n".join(lines)
+
+
+# ---------------------------------------------------------------------------
+# 模拟
+# ---------------------------------------------------------------------------
+
+
+def _respond(rng: random.Random, theta: float, item: dict) -> bool:
+    a = float(item.get("discrimination") or irt.DEFAULT_DISCRIMINATION)
+    b = float(irt.difficulty_to_b(item["difficulty"]))
+    return rng.random() < float(irt.probability(theta, a, b))
+
+
+def _run_engine_strategy(
+    strategy: str, bank: list[dict], thetas: np.ndarray, *,
+    subject: str, grade_level: str, assessment_type: str, max_questions: int, seed: int,
+) -> StrategyResult:
+    from ..assessment_engine import CATState, _advance_cat_state
+    from .item_pool import ItemPoolIndex
+    from .selection import CAT_RANDOMESQUE, InformationTable
+
+    rng = random.Random(seed)
+    pool = ItemPoolIndex(ttl=0, rng=rng)
+    pool.load(bank)
+    table = InformationTable([pool.get(i) for i in pool.selectable_ids(subject, grade_level)])
+
+    result = StrategyResult(
+        strategy, thetas, np.zeros(len(thetas)), np.zeros(len(thetas), dtype=int),
+        bank_size=len(bank),
+    )
+    t_start = time.perf_counter()
+    for k, true_theta in enumerate(thetas):
+        state = CATState(
+            subject=subject, grade_level=grade_level,
+            assessment_type=assessment_type, max_questions=max_questions,
+        )
+        topic_counts: dict[str, int] = {}
+        answers: list[dict] = []
+        reason = "pool_exhausted"
+        while True:
+            t0 = time.perf_counter()
+            if strategy == "max_info":
+                qid = table.best(
+                    state.theta, set(state.answered_question_ids), topic_counts,
+                    top_k=CAT_RANDOMESQUE, rng=rng,
+                )
+                item = pool.get(qid) if qid is not None else pool.select(
+                    subject, grade_level, float(irt.theta_to_ability(state.theta)),
+                    state.answered_question_ids,
+                )
+            else:
+                item = pool.select(
+                    subject, grade_level, state.current_difficulty, state.answered_question_ids,
+                )
+            if item is None:
+                result.decision_us.append((time.perf_counter() - t0) * 1e6)
+                break
+            correct = _respond(rng, true_theta, item)
+            state, is_last = _advance_cat_state(state, item, correct)
+            result.decision_us.append((time.perf_counter() - t0) * 1e6)
+
+            answers.append({**item, "is_correct": correct})
+            topic = item.get("topic") or ""
+            topic_counts[topic] = topic_counts.get(topic, 0) + 1
+            result.exposure[item["id"]] = result.exposure.get(item["id"], 0) + 1
+            if is_last:
+                reason = state.stop_reason or reason
+                break
+
+        # 与 complete_session 相同：对全部作答做 EAP
+        result.est_theta[k] = irt.estimate(answers).theta
+        result.items_used[k] = len(answers)
+        result.stop_reasons[reason] = result.stop_reasons.get(reason, 0) + 1
+    result.seconds = time.perf_counter() - t_start
+    return result
+
+
+def _run_cat_engine(
+    bank: list[dict], thetas: np.ndarray, *, subject: str, grade_level: str, seed: int,
+) -> StrategyResult:
+    from .engine import CATEngine
+
+    rng = random.Random(seed)
+    items = [q for q in bank if q["subject"] == subject and q["grade_level"] == grade_level]
+    engine = CATEngine(items)
+    result = StrategyResult(
+        "cat_engine", thetas, np.zeros(len(thetas)), np.zeros(len(thetas), dtype=int),
+        bank_size=len(bank),
+    )
+    t_start = time.perf_counter()
+    for k, true_theta in enumerate(thetas):
+        difficulty, cc, cw = 0.5, 0, 0
+        answered: list[int] = []
+        difficulties: list[float] = []
+        topic_counts: dict[str, int] = {}
+        reason = "pool_exhausted"
+        while True:
+            t0 = time.perf_counter()
+            item = engine.select_next_question(difficulty, answered, topic_counts, cc, cw)
+            if item is None:
+                result.decision_us.append((time.perf_counter() - t0) * 1e6)
+                break
+            correct = _respond(rng, true_theta, item)
+            cc, cw = (cc + 1, 0) if correct else (0, cw + 1)
+            difficulty = engine.adjust_difficulty(difficulty, correct, cc, cw)
+            answered.append(item["id"])
+            difficulties.append(item["difficulty"])
+            stop = engine.should_stop(len(answered), difficulties)
+            result.decision_us.append((time.perf_counter() - t0) * 1e6)
+
+            topic = item.get("topic") or ""
+            topic_counts[topic] = topic_counts.get(topic, 0) + 1
+            result.exposure[item["id"]] = result.exposure.get(item["id"], 0) + 1
+            if stop:
+                reason = "max_items" if len(answered) >= 25 else "difficulty_converged"
+                break
+
+        result.est_theta[k] = float(irt.ability_to_theta(engine.compute_ability(difficulties)))
+        result.items_used[k] = len(answered)
+        result.stop_reasons[reason] = result.stop_reasons.get(reason, 0) + 1
+    result.seconds = time.perf_counter() - t_start
+    return result
+
+
+def simulate(
+    bank: list[dict],
+    *,
+    strategies: list[str] | tuple[str, ...] = STRATEGIES,
+    examinees: int = 1000,
+    subject: str = "math",
+    grade_level: str = "G7",
+    assessment_type: str = "pre_admission",
+    seed: int = 0,
+) -> list[StrategyResult]:
+    """Run every strategy on the same N(0, 1) examinee sample."""
+    from ..assessment_engine import QUESTION_COUNT
+
+    thetas = np.random.default_rng(seed).normal(0.0, 1.0, examinees)
+    max_questions = QUESTION_COUNT.get(assessment_type, 15)
+    results = []
+    for strategy in strategies:
+        if strategy == "cat_engine":
+            results.append(_run_cat_engine(
+                bank, thetas, subject=subject, grade_level=grade_level, seed=seed,
+            ))
+        else:
+            results.append(_run_engine_strategy(
+                strategy, bank, thetas,
+                subject=subject, grade_level=grade_level,
+                assessment_type=assessment_type, max_questions=max_questions, seed=seed,
+            ))
+    return results
@@ -0,0 +1,109 @@
+"""
+Write-behind buffer for question usage counters.
+
+Every scored answer used to ``UPDATE assessment_questions SET usage_count =
+usage_count + 1`` on its question row, which serializes concurrent sessions
+on popular items. Deltas (attempts, corrects) are now aggregated in process
+and flushed every ``BASIS_USAGE_FLUSH_INTERVAL`` seconds with one
+``UPDATE ... FROM unnest(...)`` (``db.flush_question_usage``).
+
+The flusher starts with the API (``lifespan``) or lazily on the first add,
+and ``lifespan`` flushes once more on shutdown. Deltas of a failed flush are
+merged back and retried on the next tick.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from .. import metrics
+
+logger = logging.getLogger("basis.assessment.usage_buffer")
+
+USAGE_FLUSH_INTERVAL = float(os.getenv("BASIS_USAGE_FLUSH_INTERVAL", "5"))
+
+
+class UsageBuffer:
+    def __init__(self, interval: float = USAGE_FLUSH_INTERVAL) -> None:
+        self.interval = interval
+        # question_id → [attempts, corrects]
+        self._deltas: dict[int, list[int]] = {}
+        self._oldest: float | None = None
+        self._task: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._deltas)
+
+    def add(self, question_id: int, is_correct: bool) -> None:
+        delta = self._deltas.get(question_id)
+        if delta is None:
+            delta = self._deltas[question_id] = [0, 0]
+        delta[0] += 1
+        delta[1] += int(is_correct)
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        metrics.gauge("usage_buffer.pending", len(self._deltas))
+        self.start()
+
+    async def flush(self) -> int:
+        """Write all pending deltas; returns the number of questions updated."""
+        from .. import db
+
+        async with self._flush_lock:
+            if not self._deltas:
+                return 0
+            deltas, self._deltas = self._deltas, {}
+            oldest, self._oldest = self._oldest, None
+            rows = [(qid, d[0], d[1]) for qid, d in sorted(deltas.items())]
+            t0 = time.monotonic()
+            try:
+                await db.flush_question_usage(rows)
+            except Exception:
+                # 合并回缓冲区，下个周期重试
+                for qid, (attempts, corrects) in deltas.items():
+                    d = self._deltas.setdefault(qid, [0, 0])
+                    d[0] += attempts
+                    d[1] += corrects
+                if oldest is not None:
+                    self._oldest = min(oldest, self._oldest or oldest)
+                metrics.incr("usage_buffer.flush_errors")
+                raise
+            now = time.monotonic()
+            metrics.observe("usage_buffer.flush_size", len(rows))
+            metrics.observe("usage_buffer.flush_ms", (now - t0) * 1000)
+            if oldest is not None:
+                metrics.observe("usage_buffer.lag_sec", now - oldest)
+            metrics.gauge("usage_buffer.pending", len(self._deltas))
+            return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.sleep(self.interval)
+                await self.flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.warning(f"Usage buffer flush failed: {e}")
+
+    def start(self) -> None:
+        """Start the periodic flusher in the running loop (idempotent)."""
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        except RuntimeError:
+            self._task = None
+
+    async def stop(self) -> None:
+        """Stop the flusher and write what is left (shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+
+# 进程级单例
+usage_buffer = UsageBuffer()
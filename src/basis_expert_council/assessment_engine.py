@@ -3,12 +3,18 @@ BasisPilot (贝领) — 测评引擎
 CAT 自适应出题 + 规则评分 + 能力估算
 """
 
+import copy
 import json
-import re
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 
 from . import db
+from .assessment import irt, item_pool, selection, stopping
+from .assessment.deferred_scoring import deferred_scorer, is_deferrable
+from .assessment.matchers import matcher_cache
+from .assessment.prefetch import prefetch_cache
+from .assessment.usage_buffer import usage_buffer
 
 # ---------------------------------------------------------------------------
 # 常量
@@ -92,17 +98,67 @@ class CATState:
     answered_question_ids: list[int] = field(default_factory=list)
     difficulty_history: list[float] = field(default_factory=list)
     correct_history: list[bool] = field(default_factory=list)
+    discrimination_history: list[float] = field(default_factory=list)
     question_count: int = 0
     max_questions: int = 15
+    # IRT 能力估计（EAP），每次答题后更新
+    theta: float = 0.0
+    theta_se: float = irt.PRIOR_SD
+    # 结束原因（assessment.stopping），未结束为 None
+    stop_reason: str | None = None
 
     @property
     def is_complete(self) -> bool:
-        return self.question_count >= self.max_questions
+        return self.stop_reason is not None or self.question_count >= self.max_questions
+
+    @property
+    def total_questions(self) -> int:
+        """Session length: where it stopped, or the maximum while it runs."""
+        return self.question_count if self.stop_reason else self.max_questions
 
     @property
     def progress(self) -> float:
         return min(1.0, self.question_count / self.max_questions)
 
+    def to_dict(self) -> dict:
+        """Compact form stored in assessment_sessions.cat_state.
+
+        subject / grade_level / assessment_type already live on the session row.
+        """
+        return {
+            "d": round(self.current_difficulty, 4),
+            "cc": self.consecutive_correct,
+            "cw": self.consecutive_wrong,
+            "ids": self.answered_question_ids,
+            "dh": [round(d, 4) for d in self.difficulty_history],
+            "ch": "".join("1" if c else "0" for c in self.correct_history),
+            "ah": [round(a, 3) for a in self.discrimination_history],
+            "n": self.question_count,
+            "t": round(self.theta, 4),
+            "se": round(self.theta_se, 4),
+            "sr": self.stop_reason,
+        }
+
+    @classmethod
+    def from_dict(cls, session: dict, data: dict, max_q: int) -> "CATState":
+        return cls(
+            subject=session["subject"],
+            grade_level=session["grade_level"],
+            assessment_type=session["assessment_type"],
+            current_difficulty=data.get("d", 0.5),
+            consecutive_correct=data.get("cc", 0),
+            consecutive_wrong=data.get("cw", 0),
+            answered_question_ids=list(data.get("ids", [])),
+            difficulty_history=list(data.get("dh", [])),
+            correct_history=[c == "1" for c in data.get("ch", "")],
+            discrimination_history=list(data.get("ah", [])),
+            question_count=data.get("n", 0),
+            max_questions=max_q,
+            theta=data.get("t", 0.0),
+            theta_se=data.get("se", irt.PRIOR_SD),
+            stop_reason=data.get("sr"),
+        )
+
 
 def compute_next_difficulty(state: CATState, is_correct: bool) -> float:
     """
@@ -134,24 +190,16 @@ def compute_next_difficulty(state: CATState, is_correct: bool) -> float:
 
 def estimate_ability(state: CATState) -> float:
     """
-    Ability = mean difficulty of last N answered questions, weighted by correctness.
-    Uses last 5 questions or all if fewer.
+    IRT (2PL, EAP) ability over the session's difficulty / correctness history,
+    mapped to 0-1. See assessment.irt.
     """
-    n = min(5, len(state.difficulty_history))
-    if n == 0:
+    if not state.difficulty_history:
         return 0.5
-
-    recent_d = state.difficulty_history[-n:]
-    recent_c = state.correct_history[-n:]
-
-    # Weighted average: correct answers at that difficulty count positively
-    total = 0.0
-    for d, c in zip(recent_d, recent_c):
-        if c:
-            total += d
-        else:
-            total += max(0.0, d - 0.15)
-    return max(0.0, min(1.0, total / n))
+    answers = [
+        {"difficulty": d, "is_correct": c}
+        for d, c in zip(state.difficulty_history, state.correct_history)
+    ]
+    return irt.estimate(answers).ability
 
 
 def ability_to_grade_equivalent(ability: float, target_grade: str) -> str:
@@ -193,53 +241,14 @@ def ability_to_score(ability: float) -> float:
 
 def score_mcq(question: dict, user_answer: str | dict) -> tuple[bool, float]:
     """Score a multiple-choice question. Returns (is_correct, score)."""
-    # content_en or content_zh contains {answer: "A"} or {answer: "B"}
-    content = question.get("content_en") or question.get("content_zh") or {}
-    if isinstance(content, str):
-        content = json.loads(content)
-    correct_answer = content.get("answer", "")
-
-    # user_answer could be {"selected": "A"} or just "A"
-    if isinstance(user_answer, dict):
-        given = user_answer.get("selected", "")
-    elif isinstance(user_answer, str):
-        try:
-            parsed = json.loads(user_answer)
-            given = parsed.get("selected", user_answer) if isinstance(parsed, dict) else user_answer
-        except (json.JSONDecodeError, TypeError):
-            given = user_answer
-    else:
-        given = str(user_answer)
-
-    is_correct = str(given).strip().upper() == str(correct_answer).strip().upper()
+    # Option map / accepted key are precompiled per question (assessment.matchers)
+    is_correct = matcher_cache.get(question).match(user_answer)
     return is_correct, 1.0 if is_correct else 0.0
 
 
 def score_fill_in(question: dict, user_answer: str | dict) -> tuple[bool, float]:
-    """Score a fill-in-the-blank question with fuzzy matching."""
-    content = question.get("content_en") or question.get("content_zh") or {}
-    if isinstance(content, str):
-        content = json.loads(content)
-    correct_answer = str(content.get("answer", "")).strip()
-
-    if isinstance(user_answer, dict):
-        given = str(user_answer.get("text", "")).strip()
-    elif isinstance(user_answer, str):
-        try:
-            parsed = json.loads(user_answer)
-            given = str(parsed.get("text", user_answer)).strip() if isinstance(parsed, dict) else user_answer.strip()
-        except (json.JSONDecodeError, TypeError):
-            given = user_answer.strip()
-    else:
-        given = str(user_answer).strip()
-
-    # Normalize: strip whitespace, lowercase
-    norm_correct = re.sub(r'\s+', ' ', correct_answer.lower())
-    norm_given = re.sub(r'\s+', ' ', given.lower())
-
-    # Check for acceptable answers (pipe-separated alternatives)
-    acceptable = [a.strip().lower() for a in correct_answer.split("|")]
-    is_correct = norm_given in acceptable or norm_given == norm_correct
+    """Score a fill-in-the-blank question with fuzzy and numeric matching."""
+    is_correct = matcher_cache.get(question).match(user_answer)
     return is_correct, 1.0 if is_correct else 0.0
 
 
@@ -316,6 +325,12 @@ async def start_session(
     """
     max_q = QUESTION_COUNT.get(assessment_type, 15)
 
+    initial_state = CATState(
+        subject=subject,
+        grade_level=grade_level,
+        assessment_type=assessment_type,
+        max_questions=max_q,
+    )
     session = await db.create_assessment_session(
         assessment_type=assessment_type,
         subject=subject,
@@ -326,16 +341,12 @@ async def start_session(
         referral_code=referral_code,
         utm_source=utm_source,
         utm_campaign=utm_campaign,
+        cat_state=initial_state.to_dict(),
     )
 
     # Find the first question at medium difficulty
-    first_q = await db.find_next_question(
-        subject=subject,
-        grade_level=grade_level,
-        target_difficulty=0.5,
-        exclude_ids=[],
-        tolerance=0.2,
-    )
+    first_q = await selection.select_next_question(session, initial_state, tolerance=0.2)
+    prefetch_cache.schedule(session, initial_state, first_q)
 
     return {
         "session": session,
@@ -356,74 +367,94 @@ async def submit_answer(
     2. Update CAT state
     3. Select next question
     4. Return result
+
+    The answer and CAT state are written by a single compare-and-swap
+    statement (db.record_answer); question usage stats go through the
+    write-behind usage_buffer. Session state is cached in
+    process, so a steady-state submit costs one database round trip; a stale
+    cache or a concurrent double-submit fails the CAS and is re-read once.
     """
-    session = await db.get_assessment_session(session_id)
-    if not session:
-        raise ValueError("Session not found")
-    if session["status"] != "in_progress":
-        raise ValueError("Session is not in progress")
+    cached = _session_cache.get(session_id)
+    if cached:
+        session, state = cached[0], copy.deepcopy(cached[1])
+    else:
+        session, state = await _load_session_state(session_id)
+    max_q = state.max_questions
 
-    question = await db.get_question(question_id)
+    question = await item_pool.get_question(question_id)
     if not question:
         raise ValueError("Question not found")
+    if question_id in state.answered_question_ids:
+        raise ValueError("Question already answered")
+
+    # Score the answer (Agent LLM for subjective types; deferred to the
+    # background workers when BASIS_DEFERRED_SCORING is on)
+    deferred = is_deferrable(question)
+    if deferred:
+        is_correct, score, agent_feedback = None, None, None
+    else:
+        is_correct, score, agent_feedback = await score_question_async(question, user_answer)
 
-    # Get existing answers to reconstruct CAT state
-    existing_answers = await db.get_session_answers(session_id)
-    question_order = len(existing_answers) + 1
-    max_q = QUESTION_COUNT.get(session["assessment_type"], 15)
-
-    # Score the answer (Agent LLM for subjective types)
-    is_correct, score, agent_feedback = await score_question_async(question, user_answer)
-
-    # Save the answer record
-    answer_record = await db.save_answer(
-        session_id=session_id,
-        question_id=question_id,
-        question_order=question_order,
-        user_answer=user_answer if isinstance(user_answer, (dict, list)) else {"text": user_answer},
-        is_correct=is_correct,
-        score=score,
-        difficulty_at=question["difficulty"],
-        time_spent_sec=time_spent_sec,
-        agent_feedback=agent_feedback,
+    # 预取命中时直接使用预先计算的状态与下一题
+    prefetched = prefetch_cache.take(
+        session_id, question_id, state.question_count,
+        is_correct if is_correct is not None else True,
     )
 
-    # Update question usage stats (only for scored questions)
-    if is_correct is not None:
-        await db.increment_question_usage(question_id, is_correct)
+    for attempt in range(2):
+        if prefetched and attempt == 0:
+            new_state, next_q, is_last = prefetched
+        else:
+            new_state, is_last = _advance_cat_state(state, question, is_correct)
+            next_q = None
+        answer_record = await db.record_answer(
+            session_id=session_id,
+            expected_count=state.question_count,
+            cat_state=new_state.to_dict(),
+            question_id=question_id,
+            user_answer=user_answer if isinstance(user_answer, (dict, list)) else {"text": user_answer},
+            is_correct=is_correct,
+            score=score,
+            difficulty_at=question["difficulty"],
+            time_spent_sec=time_spent_sec,
+            agent_feedback=agent_feedback,
+        )
+        if answer_record:
+            break
+        # CAS 失败：本地状态过期或同一会话并发提交，重新读取后重试一次
+        _session_cache.pop(session_id, None)
+        session, state = await _load_session_state(session_id)
+        if question_id in state.answered_question_ids:
+            raise ValueError("Question already answered")
+    else:
+        raise ValueError("Concurrent submission, please retry")
 
-    # Rebuild CAT state from history
-    state = _rebuild_cat_state(session, existing_answers, max_q)
+    state = new_state
+    _cache_session(session_id, session, state)
 
-    # Record this answer in CAT state
-    state.answered_question_ids.append(question_id)
-    state.difficulty_history.append(question["difficulty"])
-    if is_correct is not None:
-        state.correct_history.append(is_correct)
-    else:
-        # For agent-scored questions, assume partial credit for CAT progression
-        state.correct_history.append(True)
-    state.question_count += 1
+    if deferred:
+        deferred_scorer.enqueue(session_id, answer_record["id"], question, user_answer)
 
-    is_last = state.question_count >= max_q
+    # Update question usage stats (only for scored questions, write-behind)
+    if is_correct is not None:
+        usage_buffer.add(question_id, is_correct)
 
-    # Compute next difficulty and find next question
+    # Find next question
     next_question = None
     if not is_last:
-        effective_correct = is_correct if is_correct is not None else True
-        state.current_difficulty = compute_next_difficulty(state, effective_correct)
-        # find_next_question 内建多级 fallback（扩难度→同年级全部→相邻年级→全题库）
-        next_q = await db.find_next_question(
-            subject=session["subject"],
-            grade_level=session["grade_level"],
-            target_difficulty=state.current_difficulty,
-            exclude_ids=state.answered_question_ids,
-        )
+        if next_q is None:
+            # 选题策略见 assessment.selection，内建多级 fallback（扩难度→同年级全部→相邻年级→全题库）
+            next_q = await selection.select_next_question(session, state)
         next_question = _format_question(next_q) if next_q else None
         # If still no question, session is complete
         if not next_question:
             is_last = True
+        else:
+            prefetch_cache.schedule(session, state, next_q)
 
+    stop_reason = state.stop_reason or ("pool_exhausted" if is_last else None)
+    # 提前结束时报告实际题数，而不是题数上限
+    total = state.question_count if is_last else max_q
     result = {
         "answer_id": answer_record["id"],
         "is_correct": is_correct,
@@ -431,12 +462,16 @@ async def submit_answer(
         "next_question": next_question,
         "progress": {
             "current": state.question_count + 1,  # next question number
-            "total": max_q,
+            "total": total,
+            "theta_se": round(state.theta_se, 3),
         },
         "questions_answered": state.question_count,
-        "total_questions": max_q,
+        "total_questions": total,
         "is_last": is_last,
+        "stop_reason": stop_reason,
     }
+    if deferred:
+        result["scoring"] = "pending"
     if agent_feedback:
         result["agent_feedback"] = agent_feedback
     return result
@@ -445,11 +480,14 @@ async def submit_answer(
 async def complete_session(session_id: str) -> dict:
     """
     Finalize an assessment session:
+    0. Settle deferred subjective scores
     1. Compute ability level + score
     2. Update session record
     3. Generate a basic rule-based report
     Returns: { session, report_data }
     """
+    _session_cache.pop(session_id, None)
+    prefetch_cache.discard(session_id)
     session = await db.get_assessment_session(session_id)
     if not session:
         raise ValueError("Session not found")
@@ -458,6 +496,11 @@ async def complete_session(session_id: str) -> dict:
     if not answers:
         raise ValueError("No answers found")
 
+    # 延迟评分：等待 / 补齐未完成的主观题评分后再出报告
+    if deferred_scorer.needs_settle(session_id, answers):
+        await deferred_scorer.settle(session_id)
+        answers = await db.get_session_answers(session_id)
+
     # Compute stats
     stats = compute_session_stats(session, answers)
 
@@ -484,10 +527,11 @@ async def complete_session(session_id: str) -> dict:
         recommendations=stats.get("recommendations"),
     )
 
-    # --- 学力档案 v2: 异步触发 profile 重计算 ---
+    # --- 学力档案 v2: 标脏并异步触发 profile 重计算（读请求在计算完成前拿到 meta.stale） ---
     if session.get("user_id"):
-        import asyncio
-        asyncio.create_task(_safe_recompute(session["user_id"]))
+        from .academic_profile import refresh_in_background
+        await db.mark_profile_dirty(session["user_id"])
+        refresh_in_background(session["user_id"])
 
     return {
         "session": updated_session,
@@ -508,20 +552,9 @@ def compute_session_stats(session: dict, answers: list[dict]) -> dict:
     correct = sum(1 for a in scored if a["is_correct"])
     accuracy = correct / len(scored) if scored else 0.0
 
-    # Ability estimation using difficulty history
-    difficulty_history = [a["difficulty_at"] or a.get("difficulty", 0.5) for a in answers]
-    correct_history = [bool(a.get("is_correct", False)) for a in answers]
-
-    # Build a minimal CAT state for ability estimation
-    state = CATState(
-        subject=session["subject"],
-        grade_level=session["grade_level"],
-        assessment_type=session["assessment_type"],
-        difficulty_history=difficulty_history,
-        correct_history=correct_history,
-        question_count=total,
-    )
-    ability = estimate_ability(state)
+    # IRT ability estimation (EAP over item difficulty / discrimination)
+    estimate = irt.estimate(answers)
+    ability = estimate.ability
     score = ability_to_score(ability)
     grade_eq = ability_to_grade_equivalent(ability, session["grade_level"])
     label_en, label_zh = ability_to_label(ability)
@@ -628,6 +661,8 @@ def compute_session_stats(session: dict, answers: list[dict]) -> dict:
         "correct": correct,
         "accuracy": round(accuracy, 3),
         "ability_level": round(ability, 3),
+        "theta": round(estimate.theta, 3),
+        "theta_se": round(estimate.se, 3),
         "score": score,
         "grade_equivalent": grade_eq,
         "ability_label_en": label_en,
@@ -650,6 +685,83 @@ def compute_session_stats(session: dict, answers: list[dict]) -> dict:
 # ---------------------------------------------------------------------------
 
 
+# 进程内会话缓存：session_id → (会话行, 最近一次成功写入的 CATState)
+_SESSION_CACHE_SIZE = 10_000
+_session_cache: OrderedDict[str, tuple[dict, CATState]] = OrderedDict()
+
+
+def _cache_session(session_id: str, session: dict, state: CATState) -> None:
+    _session_cache[session_id] = (session, state)
+    _session_cache.move_to_end(session_id)
+    while len(_session_cache) > _SESSION_CACHE_SIZE:
+        _session_cache.popitem(last=False)
+
+
+async def _load_session_state(session_id: str) -> tuple[dict, CATState]:
+    session = await db.get_assessment_session(session_id)
+    if not session:
+        raise ValueError("Session not found")
+    if session["status"] != "in_progress":
+        raise ValueError("Session is not in progress")
+    max_q = QUESTION_COUNT.get(session["assessment_type"], 15)
+    return session, await load_cat_state(session, max_q)
+
+
+def _advance_cat_state(
+    state: CATState, question: dict, is_correct: bool | None,
+) -> tuple[CATState, bool]:
+    """Return (new state, is_last) after answering question; state is not mutated."""
+    state = copy.deepcopy(state)
+    state.answered_question_ids.append(question["id"])
+    state.difficulty_history.append(question["difficulty"])
+    state.discrimination_history.append(
+        float(question.get("discrimination") or irt.DEFAULT_DISCRIMINATION)
+    )
+    if is_correct is not None:
+        state.correct_history.append(is_correct)
+    else:
+        # For agent-scored questions, assume partial credit for CAT progression
+        state.correct_history.append(True)
+    state.question_count += 1
+    _update_theta(state)
+
+    state.stop_reason = stopping.policy_for(state.assessment_type).stop_reason(state)
+    is_last = state.stop_reason is not None
+    if not is_last:
+        effective_correct = is_correct if is_correct is not None else True
+        state.current_difficulty = compute_next_difficulty(state, effective_correct)
+    return state, is_last
+
+
+def _update_theta(state: CATState) -> None:
+    """Refresh the EAP theta / SE of a state from its histories."""
+    discriminations = state.discrimination_history
+    answers = [
+        {
+            "difficulty": d,
+            "is_correct": c,
+            "discrimination": discriminations[i] if i < len(discriminations) else None,
+        }
+        for i, (d, c) in enumerate(zip(state.difficulty_history, state.correct_history))
+    ]
+    est = irt.estimate(answers)
+    state.theta, state.theta_se = est.theta, est.se
+
+
+async def load_cat_state(session: dict, max_q: int) -> CATState:
+    """Load the persisted CAT state of a session.
+
+    Sessions created before cat_state existed fall back to replaying the
+    answer history.
+    """
+    raw = session.get("cat_state")
+    if raw:
+        data = json.loads(raw) if isinstance(raw, str) else raw
+        return CATState.from_dict(session, data, max_q)
+    answers = await db.get_session_answers(str(session["id"]))
+    return _rebuild_cat_state(session, answers, max_q)
+
+
 def _rebuild_cat_state(session: dict, answers: list[dict], max_q: int) -> CATState:
     """Reconstruct CAT state from session + existing answers."""
     state = CATState(
@@ -662,6 +774,9 @@ def _rebuild_cat_state(session: dict, answers: list[dict], max_q: int) -> CATSta
     for a in answers:
         state.answered_question_ids.append(a["question_id"])
         state.difficulty_history.append(a.get("difficulty_at") or a.get("difficulty", 0.5))
+        state.discrimination_history.append(
+            float(a.get("discrimination") or irt.DEFAULT_DISCRIMINATION)
+        )
         is_c = a.get("is_correct")
         state.correct_history.append(bool(is_c) if is_c is not None else True)
         state.question_count += 1
@@ -669,6 +784,7 @@ def _rebuild_cat_state(session: dict, answers: list[dict], max_q: int) -> CATSta
         if is_c is not None:
             state.current_difficulty = compute_next_difficulty(state, is_c)
 
+    _update_theta(state)
     return state
 
 
@@ -790,15 +906,3 @@ def _generate_recommendations(
     })
 
     return recs
-
-
-async def _safe_recompute(user_id: int) -> None:
-    """Safely recompute academic profile in the background after assessment completion."""
-    import logging
-    _logger = logging.getLogger("basis.assessment_engine")
-    try:
-        from .academic_profile import compute_academic_profile
-        await compute_academic_profile(user_id)
-        _logger.info(f"Academic profile recomputed for user {user_id}")
-    except Exception as e:
-        _logger.warning(f"Background profile recompute failed for user {user_id}: {e}")
@@ -5,6 +5,7 @@ PostgreSQL 连接池 + 用户/订阅/用量 CRUD
 
 import json
 import os
+from contextlib import asynccontextmanager
 from datetime import date, datetime
 from enum import Enum
 from typing import Any
@@ -35,6 +36,20 @@ async def get_pool() -> asyncpg.Pool:
     return _pool
 
 
+@asynccontextmanager
+async def acquire(conn: asyncpg.Connection | None = None):
+    """复用调用方已持有的连接（传入时），否则从池中借一条。
+
+    一次计算内串联多个 helper 时传同一条连接，避免同时占用多条连接。
+    """
+    if conn is not None:
+        yield conn
+        return
+    pool = await get_pool()
+    async with pool.acquire() as c:
+        yield c
+
+
 async def close_pool() -> None:
     global _pool
     if _pool and not _pool._closed:
@@ -291,6 +306,8 @@ CREATE TABLE IF NOT EXISTS assessment_sessions (
 CREATE INDEX IF NOT EXISTS idx_as_user ON assessment_sessions(user_id);
 CREATE INDEX IF NOT EXISTS idx_as_anonymous ON assessment_sessions(anonymous_id);
 CREATE INDEX IF NOT EXISTS idx_as_status ON assessment_sessions(status);
+-- 增量 CAT 状态（难度、连对/连错、已答题、历史），随每次答题原子更新
+ALTER TABLE assessment_sessions ADD COLUMN IF NOT EXISTS cat_state JSONB;
 
 -- 答题记录表
 CREATE TABLE IF NOT EXISTS assessment_answers (
@@ -308,6 +325,21 @@ CREATE TABLE IF NOT EXISTS assessment_answers (
 );
 CREATE INDEX IF NOT EXISTS idx_aa_session ON assessment_answers(session_id);
 
+-- 主观题 LLM 评分缓存（题目 × 归一化答案哈希 × 模型 × prompt 版本）
+CREATE TABLE IF NOT EXISTS scoring_cache (
+    question_id     INT NOT NULL REFERENCES assessment_questions(id) ON DELETE CASCADE,
+    answer_hash     TEXT NOT NULL,
+    model           TEXT NOT NULL,
+    prompt_version  TEXT NOT NULL,
+    is_correct      BOOLEAN NOT NULL,
+    score           REAL NOT NULL,
+    feedback        TEXT,
+    created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    expires_at      TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (question_id, answer_hash, model, prompt_version)
+);
+CREATE INDEX IF NOT EXISTS idx_sc_expires ON scoring_cache(expires_at);
+
 -- 测评报告表
 CREATE TABLE IF NOT EXISTS assessment_reports (
     id              UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -401,6 +433,59 @@ CREATE TABLE IF NOT EXISTS academic_profile_cache (
     version         INT NOT NULL DEFAULT 1,
     compute_time_ms INT
 );
+-- 增量计算: 按 (subject, topic) 的累计计数（watermark_* 为旧版水位，仅用于下方一次性迁移）
+ALTER TABLE academic_profile_cache ADD COLUMN IF NOT EXISTS watermark_at        TIMESTAMPTZ;
+ALTER TABLE academic_profile_cache ADD COLUMN IF NOT EXISTS watermark_answer_id INT NOT NULL DEFAULT 0;
+ALTER TABLE academic_profile_cache ADD COLUMN IF NOT EXISTS answer_tallies      JSONB NOT NULL DEFAULT '{}';
+
+-- 已计入学力档案累计计数的答案。逐条标记而非按时间水位：会话晚提交、延迟评分晚落库的答案
+-- 不会被跳过。首次添加列时把旧水位之前已折叠的答案标为已折叠，避免重复计数
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'assessment_answers' AND column_name = 'profile_folded'
+    ) THEN
+        ALTER TABLE assessment_answers ADD COLUMN profile_folded BOOLEAN NOT NULL DEFAULT FALSE;
+        UPDATE assessment_answers a SET profile_folded = TRUE
+        FROM assessment_sessions s, academic_profile_cache p
+        WHERE s.id = a.session_id AND p.user_id = s.user_id AND p.watermark_at IS NOT NULL
+          AND s.status = 'completed' AND a.is_correct IS NOT NULL
+          AND (COALESCE(s.completed_at, s.created_at), a.id) <= (p.watermark_at, p.watermark_answer_id);
+    END IF;
+END $$;
+CREATE INDEX IF NOT EXISTS idx_aa_unfolded ON assessment_answers(session_id) WHERE NOT profile_folded;
+
+-- 学力档案待刷新标记: 记忆变更等无法从业务表推导的信号，夜间刷新只处理有变化的用户
+CREATE TABLE IF NOT EXISTS profile_refresh_marks (
+    user_id         INT PRIMARY KEY REFERENCES biz_users(id) ON DELETE CASCADE,
+    dirty_at        TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- 每日活跃度汇总（热力图 / 连续学习天数）: 写答题、回填评分、对话计数时同一语句内增量维护，
+-- 历史数据用 `python -m src.basis_expert_council.maintenance backfill-activity` 回填
+CREATE TABLE IF NOT EXISTS user_daily_activity (
+    user_id         INT NOT NULL REFERENCES biz_users(id) ON DELETE CASCADE,
+    day             DATE NOT NULL,
+    questions       INT NOT NULL DEFAULT 0,
+    correct         INT NOT NULL DEFAULT 0,
+    messages        INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+);
+
+-- 能力分批量回填/重算任务断点 (`question_bank rescore-abilities`): 每批合并与断点同一事务提交，
+-- 中断后从 last_user_id 之后续跑
+CREATE TABLE IF NOT EXISTS ability_rescore_jobs (
+    job             TEXT PRIMARY KEY,
+    mode            TEXT NOT NULL,                -- rescore | backfill
+    last_user_id    INT NOT NULL DEFAULT 0,
+    users           INT NOT NULL DEFAULT 0,
+    sessions        INT NOT NULL DEFAULT 0,
+    rows_written    BIGINT NOT NULL DEFAULT 0,
+    started_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    finished_at     TIMESTAMPTZ
+);
 
 -- 目标追踪表
 CREATE TABLE IF NOT EXISTS goal_snapshots (
@@ -427,6 +512,14 @@ ALTER TABLE student_ability_scores ADD COLUMN IF NOT EXISTS mastered_mistakes IN
 ALTER TABLE student_ability_scores ADD COLUMN IF NOT EXISTS active_mistakes   INT DEFAULT 0;
 ALTER TABLE student_ability_scores ADD COLUMN IF NOT EXISTS bloom_mastery     JSONB DEFAULT '{}';
 ALTER TABLE student_ability_scores ADD COLUMN IF NOT EXISTS last_computed_at  TIMESTAMPTZ;
+-- 学科汇总行 topic 为 NULL，UNIQUE(user_id, subject, topic) 对它不生效：
+-- 去掉重复的汇总行（保留最新），再以 COALESCE(topic, '') 唯一索引作为 UPSERT 冲突目标
+DELETE FROM student_ability_scores a
+USING student_ability_scores b
+WHERE a.topic IS NULL AND b.topic IS NULL
+  AND a.user_id = b.user_id AND a.subject = b.subject AND a.id < b.id;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_sas_user_subject_topic
+    ON student_ability_scores(user_id, subject, COALESCE(topic, ''));
 
 -- 文件上传记录
 CREATE TABLE IF NOT EXISTS file_uploads (
@@ -636,6 +729,10 @@ async def increment_usage(user_id: int, agent_name: str | None = None) -> dict:
         # Upsert 用量记录
         row = await conn.fetchrow(
             """
+            WITH activity AS (
+                INSERT INTO user_daily_activity (user_id, day, messages) VALUES ($1, $2, 1)
+                ON CONFLICT (user_id, day) DO UPDATE SET messages = user_daily_activity.messages + 1
+            )
             INSERT INTO usage_logs (user_id, usage_date, message_count, updated_at)
             VALUES ($1, $2, 1, NOW())
             ON CONFLICT (user_id, usage_date) DO UPDATE
@@ -840,6 +937,32 @@ async def get_question(question_id: int) -> dict | None:
         return dict(row) if row else None
 
 
+async def get_all_questions() -> list[dict]:
+    """加载全部题目（供进程内题库索引 assessment.item_pool 使用）"""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("SELECT * FROM assessment_questions")
+        return [dict(r) for r in rows]
+
+
+def _on_questions_changed(
+    rows: list[dict] | None = None, *, removed_ids: list[int] | None = None,
+) -> None:
+    """题目变更后刷新进程内题库索引；rows=None 表示批量变更，整体失效重载"""
+    from .assessment.item_pool import item_pool
+    from .assessment.scoring_cache import scoring_cache
+
+    if rows is None and not removed_ids:
+        item_pool.invalidate()
+        return
+    for row in rows or []:
+        item_pool.upsert(row)
+    for qid in removed_ids or []:
+        item_pool.remove(qid)
+    if removed_ids:
+        scoring_cache.forget(removed_ids)
+
+
 async def query_questions(
     subject: str,
     grade_level: str,
@@ -1013,6 +1136,52 @@ async def increment_question_usage(question_id: int, is_correct: bool) -> None:
         )
 
 
+async def flush_question_usage(rows: list[tuple[int, int, int]]) -> None:
+    """批量写回题目使用统计增量 (question_id, attempts, corrects)"""
+    if not rows:
+        return
+    ids, attempts, corrects = (list(col) for col in zip(*rows))
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """
+            UPDATE assessment_questions q
+            SET usage_count = q.usage_count + u.attempts,
+                correct_rate = CASE
+                    WHEN q.usage_count = 0 THEN u.corrects::real / u.attempts
+                    ELSE (q.correct_rate * q.usage_count + u.corrects) / (q.usage_count + u.attempts)
+                END,
+                updated_at = NOW()
+            FROM unnest($1::int[], $2::int[], $3::int[]) AS u(id, attempts, corrects)
+            WHERE q.id = u.id
+            """,
+            ids, attempts, corrects,
+        )
+
+
+async def bulk_update_item_parameters(rows: list[tuple[int, float, float]]) -> int:
+    """批量写回 IRT 标定结果 (question_id, difficulty, discrimination)，返回更新数量"""
+    if not rows:
+        return 0
+    ids, difficulties, discriminations = (list(col) for col in zip(*rows))
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        result = await conn.execute(
+            """
+            UPDATE assessment_questions q
+            SET difficulty = u.difficulty,
+                discrimination = u.discrimination,
+                updated_at = NOW()
+            FROM unnest($1::int[], $2::real[], $3::real[])
+                 AS u(id, difficulty, discrimination)
+            WHERE q.id = u.id
+            """,
+            ids, difficulties, discriminations,
+        )
+    _on_questions_changed()
+    return int(result.split()[-1])
+
+
 async def bulk_insert_questions(questions: list[dict], *, batch_id: int | None = None) -> int:
     """批量导入题目（支持新字段），返回插入数量"""
     pool = await get_pool()
@@ -1054,7 +1223,9 @@ async def bulk_insert_questions(questions: list[dict], *, batch_id: int | None =
                     batch_id,
                 )
                 count += 1
-        return count
+    if count:
+        _on_questions_changed()
+    return count
 
 
 # ---------------------------------------------------------------------------
@@ -1099,7 +1270,15 @@ async def create_question(q: dict) -> dict:
             q.get("image_urls"),
             json.dumps(q.get("metadata") or {}, ensure_ascii=False),
         )
-        return dict(row)
+    question = dict(row)
+    _on_questions_changed([question])
+    return question
+
+
+# 影响主观题评分结果的字段，变更时清除该题的评分缓存
+_SCORING_FIELDS = {
+    "question_type", "content_zh", "content_en", "explanation_zh", "explanation_en",
+}
 
 
 async def update_question(question_id: int, **fields) -> dict | None:
@@ -1131,7 +1310,14 @@ async def update_question(question_id: int, **fields) -> dict | None:
             f"UPDATE assessment_questions SET {sets}, updated_at = NOW() WHERE id = $1 RETURNING *",
             *vals,
         )
-        return dict(row) if row else None
+    if not row:
+        return None
+    question = dict(row)
+    _on_questions_changed([question])
+    if data.keys() & _SCORING_FIELDS:
+        from .assessment.scoring_cache import scoring_cache
+        await scoring_cache.purge([question_id])
+    return question
 
 
 async def delete_question(question_id: int, hard: bool = False) -> bool:
@@ -1142,12 +1328,17 @@ async def delete_question(question_id: int, hard: bool = False) -> bool:
             result = await conn.execute(
                 "DELETE FROM assessment_questions WHERE id = $1", question_id,
             )
-        else:
-            result = await conn.execute(
-                "UPDATE assessment_questions SET review_status = 'archived', updated_at = NOW() WHERE id = $1",
-                question_id,
-            )
-        return result.endswith("1")
+            if result.endswith("1"):
+                _on_questions_changed(removed_ids=[question_id])
+            return result.endswith("1")
+        row = await conn.fetchrow(
+            "UPDATE assessment_questions SET review_status = 'archived', updated_at = NOW() WHERE id = $1 RETURNING *",
+            question_id,
+        )
+    if not row:
+        return False
+    _on_questions_changed([dict(row)])
+    return True
 
 
 async def review_question(question_id: int, status: str, reviewed_by: str) -> dict | None:
@@ -1160,7 +1351,11 @@ async def review_question(question_id: int, status: str, reviewed_by: str) -> di
                WHERE id = $1 RETURNING *""",
             question_id, status, reviewed_by,
         )
-        return dict(row) if row else None
+    if not row:
+        return None
+    question = dict(row)
+    _on_questions_changed([question])
+    return question
 
 
 async def query_questions_paginated(
@@ -1476,20 +1671,24 @@ async def create_assessment_session(
     referral_code: str | None = None,
     utm_source: str | None = None,
     utm_campaign: str | None = None,
+    cat_state: dict | None = None,
 ) -> dict:
     """创建测评会话（支持匿名用户）"""
     pool = await get_pool()
+    state_json = json.dumps(cat_state) if cat_state is not None else None
     async with pool.acquire() as conn:
         row = await conn.fetchrow(
             """
             INSERT INTO assessment_sessions
                 (assessment_type, subject, grade_level, campus,
-                 user_id, anonymous_id, referral_code, utm_source, utm_campaign)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+                 user_id, anonymous_id, referral_code, utm_source, utm_campaign,
+                 cat_state)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10::jsonb)
             RETURNING *
             """,
             assessment_type, subject, grade_level, campus,
             user_id, anonymous_id, referral_code, utm_source, utm_campaign,
+            state_json,
         )
         return dict(row)
 
@@ -1549,6 +1748,19 @@ async def get_user_assessment_sessions(
 # ---------------------------------------------------------------------------
 
 
+# 把 CTE `a`（新写入的答案: session_id, created_at, is_correct）计入 user_daily_activity
+_ROLLUP_ANSWER = """
+    INSERT INTO user_daily_activity (user_id, day, questions, correct)
+    SELECT s.user_id, a.created_at::date, COUNT(*), COUNT(*) FILTER (WHERE a.is_correct)
+    FROM a JOIN assessment_sessions s ON s.id = a.session_id
+    WHERE s.user_id IS NOT NULL
+    GROUP BY s.user_id, a.created_at::date
+    ON CONFLICT (user_id, day) DO UPDATE SET
+        questions = user_daily_activity.questions + EXCLUDED.questions,
+        correct = user_daily_activity.correct + EXCLUDED.correct
+"""
+
+
 async def save_answer(
     *,
     session_id: str,
@@ -1560,25 +1772,139 @@ async def save_answer(
     difficulty_at: float | None = None,
     time_spent_sec: int | None = None,
     agent_feedback: str | None = None,
+    cat_state: dict | None = None,
 ) -> dict:
-    """保存一条答题记录"""
+    """保存一条答题记录
+
+    传入 cat_state 时，在同一事务内更新 assessment_sessions.cat_state，
+    保证答题记录与 CAT 状态一致。
+    """
+    pool = await get_pool()
+    answer_json = None
+    if user_answer is not None:
+        answer_json = json.dumps(user_answer, ensure_ascii=False) if isinstance(user_answer, (dict, list)) else json.dumps(user_answer)
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            row = await conn.fetchrow(
+                """
+                INSERT INTO assessment_answers
+                    (session_id, question_id, question_order, user_answer,
+                     is_correct, score, difficulty_at, time_spent_sec, agent_feedback)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+                RETURNING *
+                """,
+                session_id, question_id, question_order, answer_json,
+                is_correct, score, difficulty_at, time_spent_sec, agent_feedback,
+            )
+            await conn.execute(
+                f"""
+                WITH a AS (SELECT $1::uuid AS session_id, $2::timestamptz AS created_at, $3::bool AS is_correct)
+                {_ROLLUP_ANSWER}
+                """,
+                row["session_id"], row["created_at"], row["is_correct"],
+            )
+            if cat_state is not None:
+                await conn.execute(
+                    "UPDATE assessment_sessions SET cat_state = $2::jsonb WHERE id = $1",
+                    session_id, json.dumps(cat_state),
+                )
+        return dict(row)
+
+
+async def record_answer(
+    *,
+    session_id: str,
+    expected_count: int,
+    cat_state: dict,
+    question_id: int,
+    user_answer: dict | str | None = None,
+    is_correct: bool | None = None,
+    score: float | None = None,
+    difficulty_at: float | None = None,
+    time_spent_sec: int | None = None,
+    agent_feedback: str | None = None,
+) -> dict | None:
+    """单语句提交答题：CAS 更新 cat_state + 写答题记录
+
+    题目使用统计由 assessment.usage_buffer 异步批量写回。
+
+    仅当会话仍为 in_progress 且已答题数等于 expected_count 时生效，
+    否则返回 None（重复提交 / 并发提交 / 本地状态过期）。
+    UPDATE 持有会话行锁，同一 session 的并发提交被串行化，
+    后到者在重新检查条件时失败。
+    """
     pool = await get_pool()
     answer_json = None
     if user_answer is not None:
         answer_json = json.dumps(user_answer, ensure_ascii=False) if isinstance(user_answer, (dict, list)) else json.dumps(user_answer)
     async with pool.acquire() as conn:
         row = await conn.fetchrow(
+            f"""
+            WITH s AS (
+                UPDATE assessment_sessions
+                SET cat_state = $3::jsonb
+                WHERE id = $1
+                  AND status = 'in_progress'
+                  AND COALESCE(
+                        (cat_state->>'n')::int,
+                        (SELECT COUNT(*) FROM assessment_answers WHERE session_id = $1)
+                      ) = $2
+                RETURNING id
+            ), a AS (
+                INSERT INTO assessment_answers
+                    (session_id, question_id, question_order, user_answer,
+                     is_correct, score, difficulty_at, time_spent_sec, agent_feedback)
+                SELECT s.id, $4, $2 + 1, $5::jsonb, $6, $7, $8, $9, $10 FROM s
+                RETURNING *
+            ), activity AS (
+                {_ROLLUP_ANSWER}
+            )
+            SELECT * FROM a
+            """,
+            session_id, expected_count, json.dumps(cat_state),
+            question_id, answer_json, is_correct, score, difficulty_at,
+            time_spent_sec, agent_feedback,
+        )
+        return dict(row) if row else None
+
+
+async def update_answer_score(
+    answer_id: int,
+    *,
+    is_correct: bool | None,
+    score: float | None,
+    agent_feedback: str | None = None,
+) -> bool:
+    """回填延迟评分结果；仅更新尚未评分的记录（先到者生效），返回是否写入"""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        patched = await conn.fetchval(
             """
-            INSERT INTO assessment_answers
-                (session_id, question_id, question_order, user_answer,
-                 is_correct, score, difficulty_at, time_spent_sec, agent_feedback)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-            RETURNING *
+            WITH a AS (
+                UPDATE assessment_answers ans
+                SET is_correct = $2, score = $3, agent_feedback = $4
+                FROM (SELECT id, is_correct AS was_correct FROM assessment_answers WHERE id = $1) old
+                WHERE ans.id = old.id AND ans.score IS NULL
+                RETURNING ans.session_id, ans.created_at, ans.is_correct, old.was_correct
+            ), activity AS (
+                UPDATE user_daily_activity d
+                SET correct = d.correct + 1
+                FROM a JOIN assessment_sessions s ON s.id = a.session_id
+                WHERE a.is_correct AND NOT COALESCE(a.was_correct, FALSE)
+                  AND d.user_id = s.user_id AND d.day = a.created_at::date
+            ), dirty AS (
+                -- 已完成会话的评分晚到：档案标脏，下次刷新折叠这条答案
+                INSERT INTO profile_refresh_marks (user_id, dirty_at)
+                SELECT s.user_id, NOW()
+                FROM a JOIN assessment_sessions s ON s.id = a.session_id
+                WHERE s.status = 'completed' AND s.user_id IS NOT NULL
+                ON CONFLICT (user_id) DO UPDATE SET dirty_at = NOW()
+            )
+            SELECT COUNT(*) FROM a
             """,
-            session_id, question_id, question_order, answer_json,
-            is_correct, score, difficulty_at, time_spent_sec, agent_feedback,
+            answer_id, is_correct, score, agent_feedback,
         )
-        return dict(row)
+        return patched == 1
 
 
 async def get_session_answers(session_id: str) -> list[dict]:
@@ -1587,7 +1913,8 @@ async def get_session_answers(session_id: str) -> list[dict]:
     async with pool.acquire() as conn:
         rows = await conn.fetch(
             """
-            SELECT a.*, q.subject, q.topic, q.subtopic, q.difficulty, q.question_type, q.tags
+            SELECT a.*, q.subject, q.topic, q.subtopic, q.difficulty, q.discrimination,
+                   q.question_type, q.tags
             FROM assessment_answers a
             JOIN assessment_questions q ON q.id = a.question_id
             WHERE a.session_id = $1
@@ -1598,6 +1925,72 @@ async def get_session_answers(session_id: str) -> list[dict]:
         return [dict(r) for r in rows]
 
 
+# ---------------------------------------------------------------------------
+# 主观题评分缓存
+# ---------------------------------------------------------------------------
+
+
+async def get_cached_score(
+    question_id: int, answer_hash: str, model: str, prompt_version: str,
+) -> dict | None:
+    """读取未过期的评分缓存"""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            """
+            SELECT is_correct, score, feedback, expires_at FROM scoring_cache
+            WHERE question_id = $1 AND answer_hash = $2 AND model = $3
+              AND prompt_version = $4 AND expires_at > NOW()
+            """,
+            question_id, answer_hash, model, prompt_version,
+        )
+        return dict(row) if row else None
+
+
+async def put_cached_score(
+    question_id: int, answer_hash: str, model: str, prompt_version: str,
+    *, is_correct: bool, score: float, feedback: str | None, ttl_sec: float,
+) -> None:
+    """写入评分缓存（覆盖同键旧值）"""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """
+            INSERT INTO scoring_cache
+                (question_id, answer_hash, model, prompt_version,
+                 is_correct, score, feedback, expires_at)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, NOW() + make_interval(secs => $8))
+            ON CONFLICT (question_id, answer_hash, model, prompt_version) DO UPDATE
+            SET is_correct = EXCLUDED.is_correct, score = EXCLUDED.score,
+                feedback = EXCLUDED.feedback, created_at = NOW(),
+                expires_at = EXCLUDED.expires_at
+            """,
+            question_id, answer_hash, model, prompt_version,
+            is_correct, score, feedback, float(ttl_sec),
+        )
+
+
+async def purge_scoring_cache(question_ids: list[int] | None = None) -> int:
+    """删除指定题目（None 为全部）的评分缓存，返回删除行数"""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        if question_ids is None:
+            result = await conn.execute("DELETE FROM scoring_cache")
+        else:
+            result = await conn.execute(
+                "DELETE FROM scoring_cache WHERE question_id = ANY($1::int[])", question_ids,
+            )
+        return int(result.split()[-1])
+
+
+async def evict_expired_scoring_cache() -> int:
+    """清理过期评分缓存，返回删除行数"""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        result = await conn.execute("DELETE FROM scoring_cache WHERE expires_at <= NOW()")
+        return int(result.split()[-1])
+
+
 # ---------------------------------------------------------------------------
 # 测评报告 CRUD
 # ---------------------------------------------------------------------------
@@ -1688,20 +2081,38 @@ async def generate_share_token(report_id: str) -> str:
 
 
 async def claim_anonymous_sessions(user_id: int, anonymous_id: str) -> int:
-    """将匿名会话 + 报告关联到已注册用户，返回认领数量"""
+    """将匿名会话 + 报告关联到已注册用户，返回认领数量
+
+    匿名答题时 _ROLLUP_ANSWER 跳过了 user_id 为空的会话，认领的同一事务内把这些
+    答案补进 user_daily_activity，并标脏学力档案（会话的 completed_at 可能早于
+    档案缓存，get_profiles_to_refresh 不会自己发现）。
+    """
     pool = await get_pool()
     async with pool.acquire() as conn:
         async with conn.transaction():
             # Update sessions
-            result = await conn.execute(
+            claimed = await conn.fetch(
                 """
                 UPDATE assessment_sessions
                 SET user_id = $1
                 WHERE anonymous_id = $2 AND user_id IS NULL
+                RETURNING id
                 """,
                 user_id, anonymous_id,
             )
-            count = int(result.split()[-1])  # "UPDATE N"
+            count = len(claimed)
+            if count:
+                await conn.execute(
+                    f"""
+                    WITH a AS (
+                        SELECT session_id, created_at, is_correct FROM assessment_answers
+                        WHERE session_id = ANY($1::uuid[])
+                    )
+                    {_ROLLUP_ANSWER}
+                    """,
+                    [r["id"] for r in claimed],
+                )
+                await conn.execute(_MARK_PROFILE_DIRTY, user_id)
 
             # Update reports linked to those sessions
             await conn.execute(
@@ -1724,36 +2135,6 @@ async def claim_anonymous_sessions(user_id: int, anonymous_id: str) -> int:
 # ---------------------------------------------------------------------------
 
 
-async def upsert_ability_score(
-    user_id: int, subject: str, topic: str | None,
-    ability_score: float, session_id: str | None = None,
-) -> dict:
-    """Upsert ability score with rolling weighted average."""
-    pool = await get_pool()
-    score_100 = round(ability_score * 100, 1)
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow(
-            """
-            INSERT INTO student_ability_scores
-                (user_id, subject, topic, ability_score, score_100, assessment_count, last_session_id, updated_at)
-            VALUES ($1, $2, $3, $4, $5, 1, $6, NOW())
-            ON CONFLICT (user_id, subject, topic) DO UPDATE SET
-                ability_score = (student_ability_scores.ability_score * student_ability_scores.assessment_count + EXCLUDED.ability_score)
-                                / (student_ability_scores.assessment_count + 1),
-                score_100 = ROUND(((student_ability_scores.ability_score * student_ability_scores.assessment_count + EXCLUDED.ability_score)
-                                / (student_ability_scores.assessment_count + 1) * 100)::numeric, 1),
-                assessment_count = student_ability_scores.assessment_count + 1,
-                confidence = LEAST(1.0, 0.5 + student_ability_scores.assessment_count * 0.1),
-                last_session_id = EXCLUDED.last_session_id,
-                updated_at = NOW()
-            RETURNING *
-            """,
-            user_id, subject, topic, ability_score, score_100,
-            session_id,
-        )
-        return dict(row) if row else {}
-
-
 async def get_ability_scores(user_id: int, subject: str | None = None) -> list[dict]:
     """Get ability score snapshots for a user, optionally filtered by subject."""
     pool = await get_pool()
@@ -1771,26 +2152,6 @@ async def get_ability_scores(user_id: int, subject: str | None = None) -> list[d
         return [dict(r) for r in rows]
 
 
-async def insert_ability_history(
-    user_id: int, subject: str, topic: str | None,
-    ability_score: float, session_id: str | None = None,
-) -> dict:
-    """Append a point to the ability score time series."""
-    pool = await get_pool()
-    score_100 = round(ability_score * 100, 1)
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow(
-            """
-            INSERT INTO ability_score_history (user_id, subject, topic, ability_score, score_100, session_id)
-            VALUES ($1, $2, $3, $4, $5, $6)
-            RETURNING *
-            """,
-            user_id, subject, topic, ability_score, score_100,
-            session_id,
-        )
-        return dict(row) if row else {}
-
-
 async def get_ability_history(
     user_id: int, subject: str | None = None, limit: int = 50,
 ) -> list[dict]:
@@ -1990,6 +2351,7 @@ async def upsert_mistake_book_entry(
             answer_json, correct_json,
             explanation_zh, explanation_en, question_stem_zh, question_stem_en,
         )
+        await conn.execute(_MARK_PROFILE_DIRTY, user_id)
         return dict(row)
 
 
@@ -2015,15 +2377,16 @@ async def record_correct_after_wrong(user_id: int, question_id: int) -> dict | N
             """,
             user_id, question_id,
         )
+        if row:
+            await conn.execute(_MARK_PROFILE_DIRTY, user_id)
         return dict(row) if row else None
 
 
 async def get_mistake_book_entries(
     user_id: int, *, subject: str | None = None, status: str | None = None,
-    limit: int = 200,
+    limit: int = 200, conn: asyncpg.Connection | None = None,
 ) -> list[dict]:
     """Get mistake book entries for a user."""
-    pool = await get_pool()
     conditions = ["user_id = $1"]
     params: list[Any] = [user_id]
     idx = 2
@@ -2037,7 +2400,7 @@ async def get_mistake_book_entries(
         idx += 1
     where = " AND ".join(conditions)
     params.append(limit)
-    async with pool.acquire() as conn:
+    async with acquire(conn) as conn:
         rows = await conn.fetch(
             f"""SELECT * FROM mistake_book_entries
                 WHERE {where}
@@ -2058,10 +2421,9 @@ async def get_mistake_book_question_ids(user_id: int) -> set[int]:
         return {r["question_id"] for r in rows}
 
 
-async def get_mistake_book_summary(user_id: int) -> dict:
+async def get_mistake_book_summary(user_id: int, *, conn: asyncpg.Connection | None = None) -> dict:
     """Get summary stats of the mistake book."""
-    pool = await get_pool()
-    async with pool.acquire() as conn:
+    async with acquire(conn) as conn:
         total = await conn.fetchval(
             "SELECT COUNT(*) FROM mistake_book_entries WHERE user_id = $1", user_id,
         )
@@ -2102,25 +2464,80 @@ async def get_profile_cache(user_id: int) -> dict | None:
         return dict(row) if row else None
 
 
-async def upsert_profile_cache(
-    user_id: int, profile_data: dict, compute_time_ms: int | None = None,
-) -> None:
-    """Cache the computed academic profile."""
+async def get_profile_cache_state(user_id: int, max_age_sec: int) -> dict | None:
+    """Cached profile (JSON text) with its version and staleness.
+
+    Stale: marked dirty after it was computed, or older than max_age_sec.
+    """
+    return (await get_profile_cache_states([user_id], max_age_sec)).get(user_id)
+
+
+async def get_profile_cache_states(user_ids: list[int], max_age_sec: int) -> dict[int, dict]:
+    """Batch form of get_profile_cache_state in one query; users without a cache are absent."""
     pool = await get_pool()
     async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT p.user_id, p.profile_data, p.computed_at, p.version,
+                   (COALESCE(m.dirty_at > p.computed_at, FALSE)
+                    OR p.computed_at < NOW() - make_interval(secs => $2)) AS stale
+            FROM academic_profile_cache p
+            LEFT JOIN profile_refresh_marks m ON m.user_id = p.user_id
+            WHERE p.user_id = ANY($1::int[])
+            """,
+            user_ids, max_age_sec,
+        )
+        return {r["user_id"]: dict(r) for r in rows}
+
+
+async def get_profile_tallies(user_id: int, *, conn: asyncpg.Connection | None = None) -> dict:
+    """Running (subject, topic) tallies of the answers folded into the profile so far."""
+    async with acquire(conn) as conn:
+        tallies = await conn.fetchval(
+            "SELECT answer_tallies FROM academic_profile_cache WHERE user_id = $1", user_id,
+        )
+    return json.loads(tallies) if isinstance(tallies, str) else (tallies or {})
+
+
+async def upsert_profile_cache(
+    user_id: int, profile_data: dict, compute_time_ms: int | None = None, *,
+    answer_tallies: dict | None = None,
+    folded_answer_ids: list[int] | None = None,
+    computed_at: datetime | None = None,
+    conn: asyncpg.Connection | None = None,
+) -> None:
+    """Cache the computed academic profile.
+
+    With answer_tallies, the answers they now include are flagged profile_folded
+    in the same transaction. Counting each answer exactly once also needs the
+    mistake-book and topic-mastery writes of that fold to commit with it: pass
+    the connection of the caller's transaction (see academic_profile).
+
+    computed_at should be when the computation started reading: a dirty mark made
+    while it ran stays newer than the cache, so the result is still served as stale.
+    """
+    tallies_json = json.dumps(answer_tallies, ensure_ascii=False) if answer_tallies is not None else None
+    async with acquire(conn) as conn, conn.transaction():
         await conn.execute(
             """
-            INSERT INTO academic_profile_cache (user_id, profile_data, computed_at, compute_time_ms)
-            VALUES ($1, $2, NOW(), $3)
+            INSERT INTO academic_profile_cache
+                (user_id, profile_data, computed_at, compute_time_ms, answer_tallies)
+            VALUES ($1, $2, COALESCE($5, NOW()), $3, COALESCE($4::jsonb, '{}'::jsonb))
             ON CONFLICT (user_id) DO UPDATE SET
                 profile_data = EXCLUDED.profile_data,
-                computed_at = NOW(),
+                computed_at = EXCLUDED.computed_at,
                 version = academic_profile_cache.version + 1,
-                compute_time_ms = EXCLUDED.compute_time_ms
+                compute_time_ms = EXCLUDED.compute_time_ms,
+                answer_tallies = COALESCE($4::jsonb, academic_profile_cache.answer_tallies)
             """,
             user_id, json.dumps(profile_data, ensure_ascii=False, default=str),
-            compute_time_ms,
+            compute_time_ms, tallies_json, computed_at,
         )
+        if folded_answer_ids:
+            await conn.execute(
+                "UPDATE assessment_answers SET profile_folded = TRUE WHERE id = ANY($1::int[])",
+                folded_answer_ids,
+            )
 
 
 async def upsert_goal_snapshot(
@@ -2131,11 +2548,11 @@ async def upsert_goal_snapshot(
     gap_pct: float | None = None,
     status: str = "active",
     source: str = "mem0",
+    conn: asyncpg.Connection | None = None,
 ) -> dict:
     """UPSERT a goal snapshot."""
-    pool = await get_pool()
     meta_json = json.dumps(goal_metadata or {}, ensure_ascii=False)
-    async with pool.acquire() as conn:
+    async with acquire(conn) as conn:
         row = await conn.fetchrow(
             """
             INSERT INTO goal_snapshots
@@ -2157,10 +2574,11 @@ async def upsert_goal_snapshot(
         return dict(row)
 
 
-async def get_goal_snapshots(user_id: int, status: str = "active") -> list[dict]:
+async def get_goal_snapshots(
+    user_id: int, status: str = "active", *, conn: asyncpg.Connection | None = None,
+) -> list[dict]:
     """Get active goal snapshots for a user."""
-    pool = await get_pool()
-    async with pool.acquire() as conn:
+    async with acquire(conn) as conn:
         rows = await conn.fetch(
             "SELECT * FROM goal_snapshots WHERE user_id = $1 AND status = $2 ORDER BY extracted_at DESC",
             user_id, status,
@@ -2168,6 +2586,92 @@ async def get_goal_snapshots(user_id: int, status: str = "active") -> list[dict]
         return [dict(r) for r in rows]
 
 
+_MARK_PROFILE_DIRTY = """
+    INSERT INTO profile_refresh_marks (user_id, dirty_at) VALUES ($1, NOW())
+    ON CONFLICT (user_id) DO UPDATE SET dirty_at = NOW()
+"""
+
+
+async def mark_profile_dirty(user_id: int) -> None:
+    """Flag a user's academic profile as stale (next read / scheduled refresh recomputes it)."""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(_MARK_PROFILE_DIRTY, user_id)
+
+
+async def mark_profile_dirty_by_supabase_uid(
+    supabase_uid: str, *, conn: asyncpg.Connection | None = None,
+) -> None:
+    """按 Supabase uid 标脏学力档案（Agent 记忆工具只拿得到 Supabase uid）"""
+    async with acquire(conn) as conn:
+        await conn.execute(
+            """
+            INSERT INTO profile_refresh_marks (user_id, dirty_at)
+            SELECT id, NOW() FROM biz_users WHERE supabase_uid = $1
+            ON CONFLICT (user_id) DO UPDATE SET dirty_at = NOW()
+            """,
+            supabase_uid,
+        )
+
+
+async def get_profiles_to_refresh(shards: int = 1, shard: int = 0) -> list[int]:
+    """Users of one shard (user_id % shards) whose profile is stale.
+
+    Stale: a completed session, chat usage or refresh mark newer than the cached
+    profile, or a completed session but no cached profile yet. Marks already
+    covered by a newer profile are purged on the way.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """DELETE FROM profile_refresh_marks m USING academic_profile_cache p
+               WHERE p.user_id = m.user_id AND m.dirty_at <= p.computed_at
+                 AND m.user_id % $1 = $2""",
+            shards, shard,
+        )
+        rows = await conn.fetch(
+            """
+            WITH changes AS (
+                SELECT user_id, MAX(COALESCE(completed_at, created_at)) AS changed_at, TRUE AS assessed
+                FROM assessment_sessions
+                WHERE status = 'completed' AND user_id IS NOT NULL AND user_id % $1 = $2
+                GROUP BY user_id
+                UNION ALL
+                SELECT user_id, MAX(updated_at), FALSE FROM usage_logs
+                WHERE user_id % $1 = $2 GROUP BY user_id
+                UNION ALL
+                SELECT user_id, dirty_at, FALSE FROM profile_refresh_marks
+                WHERE user_id % $1 = $2
+            )
+            SELECT c.user_id
+            FROM changes c
+            LEFT JOIN academic_profile_cache p ON p.user_id = c.user_id
+            GROUP BY c.user_id, p.computed_at
+            HAVING (p.computed_at IS NULL AND bool_or(c.assessed))
+                OR MAX(c.changed_at) > p.computed_at
+            ORDER BY c.user_id
+            """,
+            shards, shard,
+        )
+        return [r["user_id"] for r in rows]
+
+
+@asynccontextmanager
+async def try_advisory_lock(namespace: int, key: int):
+    """Session-level ``pg_try_advisory_lock`` held on a dedicated connection.
+
+    Yields whether the lock was acquired; released on exit.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        acquired = await conn.fetchval("SELECT pg_try_advisory_lock($1, $2)", namespace, key)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.execute("SELECT pg_advisory_unlock($1, $2)", namespace, key)
+
+
 async def get_users_with_completed_sessions() -> list[int]:
     """Get all user_ids that have at least one completed assessment session."""
     pool = await get_pool()
@@ -2178,90 +2682,211 @@ async def get_users_with_completed_sessions() -> list[int]:
         return [r["user_id"] for r in rows]
 
 
-async def get_activity_heatmap(user_id: int, days: int = 90) -> dict:
-    """Get per-day activity data: questions answered + messages sent."""
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        # Questions per day from assessment_answers
-        q_rows = await conn.fetch(
+async def get_activity_heatmap(user_id: int, days: int = 90, *, conn: asyncpg.Connection | None = None) -> dict:
+    """Get per-day activity data: questions answered + messages sent (user_daily_activity range read)."""
+    async with acquire(conn) as conn:
+        rows = await conn.fetch(
             """
-            SELECT DATE(a.created_at) as day,
-                   COUNT(*) as questions,
-                   SUM(CASE WHEN a.is_correct THEN 1 ELSE 0 END) as correct
-            FROM assessment_answers a
-            JOIN assessment_sessions s ON s.id = a.session_id
-            WHERE s.user_id = $1 AND a.created_at >= NOW() - ($2 || ' days')::interval
-            GROUP BY DATE(a.created_at)
+            SELECT day, questions, correct, messages
+            FROM user_daily_activity
+            WHERE user_id = $1 AND day >= CURRENT_DATE - $2::int
             ORDER BY day
             """,
-            user_id, str(days),
+            user_id, days,
         )
-        # Messages per day from usage_logs
-        m_rows = await conn.fetch(
+        return {
+            r["day"].isoformat(): {"questions": r["questions"], "correct": r["correct"], "messages": r["messages"]}
+            for r in rows
+        }
+
+
+async def backfill_daily_activity(user_ids: list[int], since: date | None = None) -> int:
+    """Rebuild user_daily_activity for these users from assessment_answers + usage_logs.
+
+    Overwrites the affected (user, day) rows with recounted totals, so re-running is
+    idempotent. Increments landing on the same rows while the statement runs can be
+    overwritten — backfill right after deploying the rollup, or pass ``since``.
+    Returns the number of rows written.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        result = await conn.execute(
             """
-            SELECT usage_date as day, message_count as messages
-            FROM usage_logs
-            WHERE user_id = $1 AND usage_date >= CURRENT_DATE - $2
-            ORDER BY day
+            WITH q AS (
+                SELECT s.user_id, a.created_at::date AS day,
+                       COUNT(*) AS questions, COUNT(*) FILTER (WHERE a.is_correct) AS correct
+                FROM assessment_answers a
+                JOIN assessment_sessions s ON s.id = a.session_id
+                WHERE s.user_id = ANY($1::int[]) AND ($2::date IS NULL OR a.created_at >= $2::date)
+                GROUP BY s.user_id, a.created_at::date
+            ), m AS (
+                SELECT user_id, usage_date AS day, message_count AS messages
+                FROM usage_logs
+                WHERE user_id = ANY($1::int[]) AND ($2::date IS NULL OR usage_date >= $2::date)
+                  AND message_count > 0
+            )
+            INSERT INTO user_daily_activity (user_id, day, questions, correct, messages)
+            SELECT COALESCE(q.user_id, m.user_id), COALESCE(q.day, m.day),
+                   COALESCE(q.questions, 0), COALESCE(q.correct, 0), COALESCE(m.messages, 0)
+            FROM q FULL JOIN m ON m.user_id = q.user_id AND m.day = q.day
+            ON CONFLICT (user_id, day) DO UPDATE SET
+                questions = EXCLUDED.questions,
+                correct = EXCLUDED.correct,
+                messages = EXCLUDED.messages
             """,
-            user_id, days,
+            user_ids, since,
         )
-        result: dict[str, dict] = {}
-        for r in q_rows:
-            key = r["day"].isoformat()
-            result[key] = {"questions": r["questions"], "correct": r["correct"], "messages": 0}
-        for r in m_rows:
-            key = r["day"].isoformat()
-            if key in result:
-                result[key]["messages"] = r["messages"]
-            else:
-                result[key] = {"questions": 0, "correct": 0, "messages": r["messages"]}
-        return result
+        return int(result.split()[-1])
 
 
 async def backfill_ability_scores_for_user(user_id: int) -> int:
-    """Backfill ability scores from existing completed assessment sessions."""
+    """Backfill ability scores from existing completed assessment sessions.
+
+    Folds every completed session into the user's rolling averages in one
+    batch merge (see assessment.rescoring); returns the number of points written.
+    """
+    from .assessment import rescoring
+
+    return await rescoring.rescore_users([user_id], mode="backfill")
+
+
+# 批量合并的暂存表（事务结束即删除）
+_ABILITY_STAGE_DDL = """
+CREATE TEMP TABLE _ability_score_stage (
+    user_id INT, subject TEXT, topic TEXT, n INT, ability_sum DOUBLE PRECISION, last_session_id UUID
+) ON COMMIT DROP;
+CREATE TEMP TABLE _ability_history_stage (
+    user_id INT, subject TEXT, topic TEXT, ability_score REAL, score_100 REAL,
+    session_id UUID, recorded_at TIMESTAMPTZ
+) ON COMMIT DROP;
+"""
+
+_MERGE_ABILITY_SCORES = """
+INSERT INTO student_ability_scores AS s
+    (user_id, subject, topic, ability_score, score_100, confidence, assessment_count, last_session_id, updated_at)
+SELECT user_id, subject, topic, ability_sum / n, ROUND((ability_sum / n * 100)::numeric, 1),
+       LEAST(1.0, 0.5 + (n - 1) * 0.1), n, last_session_id, NOW()
+FROM _ability_score_stage
+ON CONFLICT (user_id, subject, (COALESCE(topic, ''))) DO UPDATE SET
+    {updates},
+    last_session_id = EXCLUDED.last_session_id,
+    updated_at = NOW()
+WHERE s.last_computed_at IS NULL
+"""
+
+# rescore: 删除本批用户中未出现在暂存表里的会话来源快照行（学力档案计算过的行除外）
+_DELETE_STALE_ABILITY = """
+DELETE FROM student_ability_scores s
+WHERE s.user_id = ANY($1::int[]) AND s.last_computed_at IS NULL
+  AND NOT EXISTS (
+      SELECT 1 FROM _ability_score_stage g
+      WHERE g.user_id = s.user_id AND g.subject = s.subject
+        AND COALESCE(g.topic, '') = COALESCE(s.topic, '')
+  )
+"""
+
+# rescore: 以本批重算结果覆盖
+_REPLACE_ABILITY = """
+    ability_score = EXCLUDED.ability_score,
+    score_100 = EXCLUDED.score_100,
+    confidence = EXCLUDED.confidence,
+    assessment_count = EXCLUDED.assessment_count"""
+
+# backfill: 逐会话滚动均值的批量合并
+_FOLD_ABILITY = """
+    ability_score = (s.ability_score * s.assessment_count + EXCLUDED.ability_score * EXCLUDED.assessment_count)
+                    / (s.assessment_count + EXCLUDED.assessment_count),
+    score_100 = ROUND(((s.ability_score * s.assessment_count + EXCLUDED.ability_score * EXCLUDED.assessment_count)
+                    / (s.assessment_count + EXCLUDED.assessment_count) * 100)::numeric, 1),
+    confidence = LEAST(1.0, 0.5 + (s.assessment_count + EXCLUDED.assessment_count - 1) * 0.1),
+    assessment_count = s.assessment_count + EXCLUDED.assessment_count"""
+
+
+async def merge_ability_batch(
+    scores: list[tuple],
+    history: list[tuple],
+    *,
+    user_ids: list[int],
+    replace: bool,
+    job: str | None = None,
+    sessions: int = 0,
+) -> int:
+    """COPY a batch of ability scores into staging tables and merge it in one transaction.
+
+    scores: (user_id, subject, topic, n, ability_sum, last_session_id) per key;
+    history: (user_id, subject, topic, ability_score, score_100, session_id, recorded_at).
+    replace=True makes the users' session-sourced snapshot rows and history exactly
+    match the batch (stale keys are deleted); otherwise the batch is folded into the
+    existing rolling averages. Snapshot rows already written by the academic profile
+    computation (``last_computed_at`` set) are owned by it and left untouched.
+    With ``job``, the checkpoint advances to max(user_ids) in the same transaction.
+    Returns the number of rows written.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn, conn.transaction():
+        await conn.execute(_ABILITY_STAGE_DDL)
+        written = 0
+        if scores:
+            await conn.copy_records_to_table(
+                "_ability_score_stage", records=scores,
+                columns=["user_id", "subject", "topic", "n", "ability_sum", "last_session_id"],
+            )
+            result = await conn.execute(
+                _MERGE_ABILITY_SCORES.format(updates=_REPLACE_ABILITY if replace else _FOLD_ABILITY)
+            )
+            written += int(result.split()[-1])
+        if replace:
+            await conn.execute(_DELETE_STALE_ABILITY, user_ids)
+            await conn.execute(
+                "DELETE FROM ability_score_history WHERE user_id = ANY($1::int[]) AND session_id IS NOT NULL",
+                user_ids,
+            )
+        if history:
+            await conn.copy_records_to_table(
+                "_ability_history_stage", records=history,
+                columns=["user_id", "subject", "topic", "ability_score", "score_100", "session_id", "recorded_at"],
+            )
+            result = await conn.execute(
+                """
+                INSERT INTO ability_score_history
+                    (user_id, subject, topic, ability_score, score_100, session_id, recorded_at)
+                SELECT user_id, subject, topic, ability_score, score_100, session_id, recorded_at
+                FROM _ability_history_stage
+                """
+            )
+            written += int(result.split()[-1])
+        if job:
+            await conn.execute(
+                """
+                UPDATE ability_rescore_jobs
+                SET last_user_id = $2, users = users + $3, sessions = sessions + $4,
+                    rows_written = rows_written + $5, updated_at = NOW()
+                WHERE job = $1
+                """,
+                job, max(user_ids), len(user_ids), sessions, written,
+            )
+    return written
+
+
+async def start_rescore_job(job: str, mode: str, *, restart: bool = False) -> dict:
+    """Create the checkpoint row of a rescore job (or reset it), returning its state."""
+    pool = await get_pool()
+    async with pool.acquire() as conn, conn.transaction():
+        if restart:
+            await conn.execute("DELETE FROM ability_rescore_jobs WHERE job = $1", job)
+        await conn.execute(
+            "INSERT INTO ability_rescore_jobs (job, mode) VALUES ($1, $2) ON CONFLICT (job) DO NOTHING",
+            job, mode,
+        )
+        return dict(await conn.fetchrow("SELECT * FROM ability_rescore_jobs WHERE job = $1", job))
+
+
+async def finish_rescore_job(job: str) -> None:
     pool = await get_pool()
-    count = 0
     async with pool.acquire() as conn:
-        sessions = await conn.fetch(
-            """SELECT s.id, s.subject, s.final_score, s.ability_level,
-                      r.report_data
-               FROM assessment_sessions s
-               LEFT JOIN assessment_reports r ON r.session_id = s.id
-               WHERE s.user_id = $1 AND s.status = 'completed'
-               ORDER BY s.completed_at ASC""",
-            user_id,
+        await conn.execute(
+            "UPDATE ability_rescore_jobs SET finished_at = NOW(), updated_at = NOW() WHERE job = $1", job,
         )
-        for sess in sessions:
-            if sess["final_score"] is None:
-                continue
-            ability = float(sess["ability_level"]) if sess["ability_level"] else float(sess["final_score"]) / 100.0
-            session_id_str = str(sess["id"])
-
-            # Subject-level score
-            await upsert_ability_score(user_id, sess["subject"], None, ability, session_id_str)
-            await insert_ability_history(user_id, sess["subject"], None, ability, session_id_str)
-            count += 1
-
-            # Topic-level from report_data
-            report_data = sess["report_data"] if sess["report_data"] else {}
-            if isinstance(report_data, str):
-                import json as _json
-                try:
-                    report_data = _json.loads(report_data)
-                except Exception:
-                    report_data = {}
-            topic_scores = report_data.get("topic_scores", {})
-            for topic_name, topic_data in topic_scores.items():
-                if isinstance(topic_data, dict):
-                    acc = topic_data.get("accuracy", 0)
-                    if isinstance(acc, (int, float)):
-                        topic_ability = acc / 100.0 if acc > 1 else acc
-                        await upsert_ability_score(user_id, sess["subject"], topic_name, topic_ability, session_id_str)
-                        await insert_ability_history(user_id, sess["subject"], topic_name, topic_ability, session_id_str)
-                        count += 1
-    return count
 
 
 # ---------------------------------------------------------------------------
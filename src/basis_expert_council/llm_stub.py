@@ -0,0 +1,400 @@
+"""
+BasisPilot (贝领) — 本地 OpenAI-compatible LLM 替身服务
+离线压测打标 (QuestionTagger)、主观题评分 (agent_scoring)、报告分析与视觉预处理，
+不依赖真实模型。
+
+- 延迟分布: fixed / uniform / normal / lognormal（首 token 延迟）+ 按 token 速率生成
+- 错误注入: 按比例返回 429/500/503、挂起超时；超过 max_concurrency 的请求直接 429
+- 确定性输出: 按请求类型返回固定结构的 JSON，取值由 prompt 哈希决定，同一请求结果相同
+
+接口:
+    POST /v1/chat/completions   (支持 stream=true)
+    GET  /v1/models
+    POST /runs                  LangGraph 报告分析 (report._generate_agent_analysis)
+    GET  /_stub/stats           请求数 / 状态码 / 并发峰值 / token
+    POST /_stub/config          运行时修改 StubConfig 字段
+    POST /_stub/reset           清空统计
+
+启动:
+    python -m src.basis_expert_council.llm_stub --port 8900 --latency-ms 400 --error-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 TAXONOMY_BASE_URL=http://127.0.0.1:8900/v1 \\
+        LANGGRAPH_URL=http://127.0.0.1:8900 uvicorn src.basis_expert_council.server:app
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from dataclasses import asdict, dataclass, fields
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+_BATCH_ITEM = re.compile(r"^## 第 \d+ 题", re.MULTILINE)
+_JSON_BLOCK = re.compile(r"```json\s*(.*?)```", re.DOTALL)
+_BLOOMS = ("remember", "understand", "apply", "analyze", "evaluate", "create")
+_CONTEXT_TYPES = ("abstract", "contextual", "real_world", "cross_disciplinary")
+
+
+@dataclass
+class StubConfig:
+    latency: str = "lognormal"       # 首 token 延迟分布
+    latency_ms: float = 300.0        # fixed 值 / uniform、normal 均值 / lognormal 中位数
+    latency_spread: float = 0.5      # uniform ±比例 / normal 标准差比例 / lognormal sigma
+    tokens_per_sec: float = 80.0     # 生成速率；0 = 瞬时
+    error_rate: float = 0.0          # 按比例返回 error_statuses 之一
+    error_statuses: tuple[int, ...] = (429, 500, 503)
+    timeout_rate: float = 0.0        # 按比例挂起 hang_sec（模拟上游超时）
+    hang_sec: float = 120.0
+    max_concurrency: int = 0         # >0 时超出的并发请求立即 429
+    retry_after: float | None = 1.0  # 429 的 Retry-After 秒数
+    seed: int = 0
+
+    def update(self, changes: dict) -> None:
+        known = {f.name for f in fields(self)}
+        unknown = set(changes) - known
+        if unknown:
+            raise ValueError(f"Unknown stub config fields: {sorted(unknown)}")
+        if changes.get("latency", self.latency) not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency must be one of {LATENCY_DISTRIBUTIONS}")
+        for name, value in changes.items():
+            setattr(self, name, tuple(value) if name == "error_statuses" else value)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text.encode("utf-8")) // 3)
+
+
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+# ---------------------------------------------------------------------------
+# Canned responses
+# ---------------------------------------------------------------------------
+
+
+def _text_of(content) -> str:
+    if isinstance(content, list):
+        return "\n".join(b.get("text", "") for b in content if isinstance(b, dict))
+    return str(content or "")
+
+
+def _has_image(messages: list[dict]) -> bool:
+    return any(
+        isinstance(m.get("content"), list)
+        and any(isinstance(b, dict) and b.get("type") == "image_url" for b in m["content"])
+        for m in messages
+    )
+
+
+def _verdict(seed: int) -> dict:
+    score = (seed % 11) / 10
+    return {
+        "score": score,
+        "is_correct": score >= 0.6,
+        "feedback_zh": f"（模拟评分）得分率 {score:.1f}，要点{'较完整' if score >= 0.6 else '有缺失'}，建议补充例证。",
+        "feedback_en": f"(stub) score {score:.1f}.",
+    }
+
+
+def _tags(seed: int) -> dict:
+    return {
+        "blooms": {"level": _BLOOMS[seed % len(_BLOOMS)], "rationale": "stub"},
+        "dok": {"level": seed % 4 + 1, "rationale": "stub"},
+        "rit_estimate": 180 + seed % 80,
+        "ccss_codes": [],
+        "cognitive_skills": {"primary": "reasoning", "secondary": []},
+        "misconceptions": {"detectable": [], "if_wrong_answer": {}},
+        "learning_objective": "stub learning objective",
+        "time_estimate_sec": 30 + seed % 90,
+        "context_type": _CONTEXT_TYPES[seed % len(_CONTEXT_TYPES)],
+        "test_alignment": ["MAP"],
+        "language_complexity": None,
+    }
+
+
+def _tag_count(prompt: str) -> int:
+    m = _JSON_BLOCK.search(prompt)
+    try:
+        items = json.loads(m.group(1)) if m else []
+    except json.JSONDecodeError:
+        items = []
+    return len(items) if isinstance(items, list) else 1
+
+
+def canned_completion(messages: list[dict]) -> tuple[str, str]:
+    """(kind, content) for a chat request; content depends only on the messages."""
+    prompt = "\n".join(_text_of(m.get("content")) for m in messages)
+    seed = _digest(prompt)
+    if _has_image(messages):
+        return "vision", "【图片识别（模拟）】图片中是一道数学题：已知 x + 3 = 7，求 x 的值。"
+    if '"tagged"' in prompt:
+        n = _tag_count(prompt)
+        return "tagging", json.dumps({"tagged": [_tags(seed + i) for i in range(n)]}, ensure_ascii=False)
+    n = len(_BATCH_ITEM.findall(prompt))
+    if n:
+        verdicts = [{"id": i, **_verdict(seed + i)} for i in range(1, n + 1)]
+        return "batch_scoring", "```json\n" + json.dumps(verdicts, ensure_ascii=False) + "\n```"
+    if '"score"' in prompt:
+        return "scoring", json.dumps(_verdict(seed), ensure_ascii=False)
+    return "chat", f"（模拟回复）已收到 {len(prompt)} 字的请求。"
+
+
+def canned_analysis(prompt: str) -> str:
+    return (
+        "## 总体评价（模拟）\n学生整体表现稳定，基础知识掌握较好。\n\n"
+        "## 薄弱环节\n- 综合应用题失分较多\n\n"
+        f"## 学习建议\n- 每周针对性练习 3 次（prompt {len(prompt)} 字）"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Stub
+# ---------------------------------------------------------------------------
+
+
+class LLMStub:
+    def __init__(self, config: StubConfig | None = None) -> None:
+        self.config = config or StubConfig()
+        self.reset()
+
+    def reset(self) -> None:
+        self.rng = random.Random(self.config.seed)
+        self.in_flight = 0
+        self.stats: dict = {
+            "requests": 0, "peak_in_flight": 0, "by_kind": {}, "by_status": {},
+            "prompt_tokens": 0, "completion_tokens": 0, "started_at": time.time(),
+        }
+
+    def _count(self, group: str, key) -> None:
+        bucket = self.stats[group]
+        bucket[str(key)] = bucket.get(str(key), 0) + 1
+
+    def sample_latency(self) -> float:
+        """首 token 延迟（秒）。"""
+        c = self.config
+        base = c.latency_ms / 1000
+        if c.latency == "uniform":
+            value = self.rng.uniform(base * (1 - c.latency_spread), base * (1 + c.latency_spread))
+        elif c.latency == "normal":
+            value = self.rng.gauss(base, base * c.latency_spread)
+        elif c.latency == "lognormal":
+            value = base * self.rng.lognormvariate(0, c.latency_spread)
+        else:
+            value = base
+        return max(0.0, value)
+
+    def generation_time(self, completion_tokens: int) -> float:
+        rate = self.config.tokens_per_sec
+        return completion_tokens / rate if rate > 0 else 0.0
+
+    def inject_fault(self) -> str | int | None:
+        """None / "hang" / an HTTP status to fail with."""
+        c = self.config
+        r = self.rng.random()
+        if r < c.timeout_rate:
+            return "hang"
+        if r < c.timeout_rate + c.error_rate and c.error_statuses:
+            return self.rng.choice(c.error_statuses)
+        return None
+
+    def error_response(self, status: int) -> JSONResponse:
+        self._count("by_status", status)
+        headers = {}
+        if status == 429 and self.config.retry_after is not None:
+            headers["Retry-After"] = str(self.config.retry_after)
+        return JSONResponse(
+            {"error": {"message": f"stub injected error {status}", "type": "stub_error", "code": status}},
+            status_code=status,
+            headers=headers,
+        )
+
+    async def chat(self, body: dict):
+        self.stats["requests"] += 1
+        c = self.config
+        if c.max_concurrency and self.in_flight >= c.max_concurrency:
+            self._count("by_kind", "rejected")
+            return self.error_response(429)
+
+        self.in_flight += 1
+        self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.in_flight)
+        try:
+            messages = body.get("messages") or []
+            kind, content = canned_completion(messages)
+            self._count("by_kind", kind)
+            ttft = self.sample_latency()
+            fault = self.inject_fault()
+            if fault == "hang":
+                await asyncio.sleep(c.hang_sec)
+                return self.error_response(504)
+            if fault is not None:
+                await asyncio.sleep(ttft)
+                return self.error_response(fault)
+
+            prompt_tokens = sum(estimate_tokens(_text_of(m.get("content"))) for m in messages)
+            completion_tokens = estimate_tokens(content)
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+            model = body.get("model", "stub")
+            if body.get("stream"):
+                self._count("by_status", 200)
+                include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+                return StreamingResponse(
+                    self._stream(model, content, ttft, usage if include_usage else None),
+                    media_type="text/event-stream",
+                )
+
+            await asyncio.sleep(ttft + self.generation_time(completion_tokens))
+            self._count("by_status", 200)
+            return JSONResponse({
+                "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+        finally:
+            self.in_flight -= 1
+
+    async def _stream(self, model: str, content: str, ttft: float, usage: dict | None):
+        """SSE chunks: first after ttft, the rest paced at tokens_per_sec."""
+        self.in_flight += 1
+        try:
+            chunk_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            pieces = [content[i:i + 12] for i in range(0, len(content), 12)] or [""]
+            await asyncio.sleep(ttft)
+            for i, piece in enumerate(pieces):
+                if i:
+                    await asyncio.sleep(self.generation_time(estimate_tokens(piece)))
+                delta = {"content": piece} if i else {"role": "assistant", "content": piece}
+                yield _sse(chunk_id, model, {"index": 0, "delta": delta, "finish_reason": None})
+            yield _sse(chunk_id, model, {"index": 0, "delta": {}, "finish_reason": "stop"})
+            if usage is not None:
+                yield "data: " + json.dumps({
+                    "id": chunk_id, "object": "chat.completion.chunk", "model": model,
+                    "choices": [], "usage": usage,
+                }) + "\n\n"
+            yield "data: [DONE]\n\n"
+        finally:
+            self.in_flight -= 1
+
+
+def _sse(chunk_id: str, model: str, choice: dict) -> str:
+    return "data: " + json.dumps({
+        "id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+        "model": model, "choices": [choice],
+    }, ensure_ascii=False) + "\n\n"
+
+
+# ---------------------------------------------------------------------------
+# App
+# ---------------------------------------------------------------------------
+
+
+def create_app(config: StubConfig | None = None) -> FastAPI:
+    stub = LLMStub(config)
+    app = FastAPI(title="BasisPilot LLM stub")
+    app.state.stub = stub
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        return await stub.chat(await request.json())
+
+    @app.get("/v1/models")
+    @app.get("/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "basis"}]}
+
+    @app.post("/runs")
+    async def langgraph_run(request: Request):
+        body = await request.json()
+        messages = (body.get("input") or {}).get("messages") or []
+        result = await stub.chat({"messages": messages})
+        if result.status_code != 200:
+            return result
+        prompt = "\n".join(_text_of(m.get("content")) for m in messages)
+        return {"output": {"messages": [*messages, {"role": "assistant", "content": canned_analysis(prompt)}]}}
+
+    @app.get("/_stub/stats")
+    async def stats():
+        return {**stub.stats, "in_flight": stub.in_flight, "config": asdict(stub.config)}
+
+    @app.post("/_stub/config")
+    async def update_config(request: Request):
+        try:
+            stub.config.update(await request.json())
+        except ValueError as e:
+            return JSONResponse({"detail": str(e)}, status_code=400)
+        return asdict(stub.config)
+
+    @app.post("/_stub/reset")
+    async def reset():
+        stub.reset()
+        return {"ok": True}
+
+    return app
+
+
+app = create_app()
+
+
+# ---------------------------------------------------------------------------
+# CLI entry
+# ---------------------------------------------------------------------------
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="llm_stub", description="本地 OpenAI-compatible LLM 替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--latency-spread", type=float, default=0.5)
+    parser.add_argument("--tokens-per-sec", type=float, default=80.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-statuses", default="429,500,503", help="逗号分隔")
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--hang-sec", type=float, default=120.0)
+    parser.add_argument("--max-concurrency", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+def config_from_args(args: argparse.Namespace) -> StubConfig:
+    return StubConfig(
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        latency_spread=args.latency_spread,
+        tokens_per_sec=args.tokens_per_sec,
+        error_rate=args.error_rate,
+        error_statuses=tuple(int(s) for s in args.error_statuses.split(",") if s),
+        timeout_rate=args.timeout_rate,
+        hang_sec=args.hang_sec,
+        max_concurrency=args.max_concurrency,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    cli_args = build_parser().parse_args()
+    uvicorn.run(create_app(config_from_args(cli_args)), host=cli_args.host, port=cli_args.port)
@@ -0,0 +1,66 @@
+"""
+BasisPilot (贝领) — 运维命令
+
+用法:
+  python -m src.basis_expert_council.maintenance backfill-activity [--since 2025-09-01] [--batch 500]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import date
+
+from . import db
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="maintenance", description="BasisPilot 运维命令")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    # backfill-activity
+    p_act = sub.add_parser("backfill-activity", help="从答题记录与用量日志回填 user_daily_activity")
+    p_act.add_argument("--since", type=date.fromisoformat, default=None, help="只回填该日期（含）之后")
+    p_act.add_argument("--batch", type=int, default=500, help="每条语句处理的用户数")
+
+    return parser
+
+
+async def backfill_activity(since: date | None, batch: int) -> dict:
+    """按用户 id 分批回填（keyset 分页），每批一条语句，打印进度。"""
+    await db.init_schema()
+    pool = await db.get_pool()
+    users = rows = 0
+    last_id = 0
+    t0 = time.monotonic()
+    while True:
+        async with pool.acquire() as conn:
+            ids = [r["id"] for r in await conn.fetch(
+                "SELECT id FROM biz_users WHERE id > $1 ORDER BY id LIMIT $2", last_id, batch,
+            )]
+        if not ids:
+            break
+        rows += await db.backfill_daily_activity(ids, since)
+        users += len(ids)
+        last_id = ids[-1]
+        elapsed = time.monotonic() - t0
+        print(f"  users {users}  rows {rows}  ({users / elapsed:.0f} users/s)", file=sys.stderr)
+    return {"users": users, "rows": rows, "elapsed_s": round(time.monotonic() - t0, 2)}
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = build_parser().parse_args(argv)
+
+    async def run():
+        try:
+            if args.command == "backfill-activity":
+                stats = await backfill_activity(args.since, args.batch)
+                print(f"回填完成: {stats['users']} 用户, {stats['rows']} 行, {stats['elapsed_s']}s")
+        finally:
+            await db.close_pool()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
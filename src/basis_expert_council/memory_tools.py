@@ -3,6 +3,7 @@ BasisPilot (贝领) 记忆工具 — 7 个 LangGraph Tool
 通过 RunnableConfig 自动注入 user_id，Agent 自主决定何时存储/召回
 """
 
+import asyncio
 import concurrent.futures
 import logging
 from datetime import datetime, timedelta, timezone
@@ -26,6 +27,29 @@ def _extract_user_id(config: RunnableConfig) -> str | None:
     return str(user_id)
 
 
+def _mark_profile_dirty(user_id: str) -> None:
+    """新记忆（含 extract_goals_from_mem0 读取的目标）写入后标脏学力档案。
+
+    工具是同步函数、运行在 LangGraph 进程里（没有 server 的连接池），
+    在 Mem0 线程池中用一次性连接写标记；失败只记日志，不影响记忆写入结果。
+    """
+    import asyncpg
+
+    from . import db
+
+    async def mark() -> None:
+        conn = await asyncpg.connect(db.DATABASE_URL)
+        try:
+            await db.mark_profile_dirty_by_supabase_uid(user_id, conn=conn)
+        finally:
+            await conn.close()
+
+    try:
+        run_with_timeout(asyncio.run, mark())
+    except Exception as e:
+        logger.warning(f"mark_profile_dirty failed for user {user_id}: {e}")
+
+
 @tool
 def remember_fact(
     content: str,
@@ -75,6 +99,8 @@ def remember_fact(
         )
         added = result.get("results", []) if isinstance(result, dict) else result
         count = len(added) if added else 0
+        if count:
+            _mark_profile_dirty(user_id)
         return f"已记住 {count} 条信息（类别: {category}, 学科: {subject}）"
     except concurrent.futures.TimeoutError:
         return "记忆存储超时，请稍后再试。本次对话中的信息不会丢失。"
@@ -287,6 +313,8 @@ def batch_remember(
             logger.warning(f"batch_remember item failed for user {user_id}: {e}")
             failed += 1
 
+    if saved:
+        _mark_profile_dirty(user_id)
     result = f"批量存储完成：成功 {saved} 条"
     if failed:
         result += f"，失败 {failed} 条"
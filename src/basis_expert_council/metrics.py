@@ -0,0 +1,95 @@
+"""
+BasisPilot (贝领) — 进程内运行指标
+计数器 / 仪表 / 耗时分布，供 /api/admin/metrics 查看
+
+用法:
+    from . import metrics
+    metrics.incr("prefetch.hit")
+    metrics.gauge("usage_buffer.pending", 12)
+    metrics.observe("scoring.latency_ms", 350.0)
+"""
+
+import time
+from collections import deque
+
+# 每个分布保留的最近样本数（用于 p50/p95/p99）
+_SAMPLE_SIZE = 1024
+
+_counters: dict[str, float] = {}
+_gauges: dict[str, float] = {}
+_observations: dict[str, "_Distribution"] = {}
+_started_at = time.time()
+
+
+class _Distribution:
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: deque[float] = deque(maxlen=_SAMPLE_SIZE)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def summary(self) -> dict:
+        ordered = sorted(self.samples)
+
+        def q(p: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3) if ordered else 0.0
+
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+            "p50": q(0.50),
+            "p95": q(0.95),
+            "p99": q(0.99),
+        }
+
+
+def _key(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "}"
+
+
+def incr(name: str, value: float = 1, **labels) -> None:
+    key = _key(name, labels)
+    _counters[key] = _counters.get(key, 0) + value
+
+
+def gauge(name: str, value: float, **labels) -> None:
+    _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    key = _key(name, labels)
+    dist = _observations.get(key)
+    if dist is None:
+        dist = _observations[key] = _Distribution()
+    dist.add(value)
+
+
+def counter_value(name: str, **labels) -> float:
+    return _counters.get(_key(name, labels), 0)
+
+
+def snapshot() -> dict:
+    """All metrics as a JSON-serializable dict."""
+    return {
+        "uptime_sec": round(time.time() - _started_at, 1),
+        "counters": dict(sorted(_counters.items())),
+        "gauges": dict(sorted(_gauges.items())),
+        "timings": {k: d.summary() for k, d in sorted(_observations.items())},
+    }
+
+
+def reset() -> None:
+    _counters.clear()
+    _gauges.clear()
+    _observations.clear()
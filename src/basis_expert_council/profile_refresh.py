@@ -0,0 +1,120 @@
+"""
+BasisPilot (贝领) — 学力档案定时刷新调度
+
+每晚只重算有变化的用户（``db.get_profiles_to_refresh``: 新完成的测评、对话用量、
+``db.mark_profile_dirty`` 标记的记忆变更），用有界并发执行
+``compute_academic_profile``（与交卷、读路径、家长批量共享进程级计算名额
+``academic_profile.compute_slots``）。
+
+多副本部署时用户按 ``user_id % BASIS_PROFILE_REFRESH_SHARDS`` 分片，每个分片由
+``pg_try_advisory_lock`` 认领：各副本从不同分片开始轮询，拿不到锁的分片跳过，
+认领后再查询该分片的待刷新用户，已被其他副本刷新过的用户不会重复计算。
+
+指标: profile_refresh.users / .failed / .shards_skipped (计数),
+profile_refresh.user_ms (耗时分布), profile_refresh.pending / .users_per_sec (仪表)
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+
+from . import db, metrics
+
+logger = logging.getLogger("basis.profile_refresh")
+
+# 0 = 与进程级计算名额一致（academic_profile.PROFILE_COMPUTE_CONCURRENCY）；
+# 无论取值，实际并发都受该共享名额限制
+PROFILE_REFRESH_CONCURRENCY = int(os.getenv("BASIS_PROFILE_REFRESH_CONCURRENCY", "0"))
+PROFILE_REFRESH_SHARDS = int(os.getenv("BASIS_PROFILE_REFRESH_SHARDS", "16"))
+# 进度日志间隔（秒）
+PROFILE_REFRESH_PROGRESS_SEC = float(os.getenv("BASIS_PROFILE_REFRESH_PROGRESS_SEC", "30"))
+
+# pg_advisory_lock(namespace, shard) 的命名空间，与其他咨询锁区分
+_LOCK_NAMESPACE = 0x5052  # "PR"
+
+
+class ProfileRefreshScheduler:
+    def __init__(self, concurrency: int = PROFILE_REFRESH_CONCURRENCY, shards: int = PROFILE_REFRESH_SHARDS) -> None:
+        self.concurrency = concurrency
+        self.shards = max(1, shards)
+        self.running = False
+
+    async def run(self) -> dict:
+        """刷新一轮：认领空闲分片，刷新其中有变化的用户，返回本轮统计。"""
+        if self.running:
+            logger.info("Profile refresh already running, skipped")
+            return {"skipped": True}
+        self.running = True
+        try:
+            return await self._run()
+        finally:
+            self.running = False
+
+    async def _run(self) -> dict:
+        from .academic_profile import PROFILE_COMPUTE_CONCURRENCY
+
+        concurrency = self.concurrency or PROFILE_COMPUTE_CONCURRENCY
+        stats = {"shards": 0, "shards_skipped": 0, "users": 0, "failed": 0}
+        t0 = time.monotonic()
+        last_log = t0
+
+        # 各副本从随机分片开始，减少锁竞争
+        start = random.randrange(self.shards)
+        for shard in [(start + i) % self.shards for i in range(self.shards)]:
+            async with db.try_advisory_lock(_LOCK_NAMESPACE, shard) as acquired:
+                if not acquired:
+                    stats["shards_skipped"] += 1
+                    metrics.incr("profile_refresh.shards_skipped")
+                    continue
+                users = await db.get_profiles_to_refresh(self.shards, shard)
+                stats["shards"] += 1
+                metrics.gauge("profile_refresh.pending", len(users))
+                await self._refresh_users(users, concurrency, stats)
+
+            now = time.monotonic()
+            done = stats["users"] + stats["failed"]
+            metrics.gauge("profile_refresh.users_per_sec", done / (now - t0) if now > t0 else 0.0)
+            if now - last_log >= PROFILE_REFRESH_PROGRESS_SEC:
+                last_log = now
+                logger.info(
+                    f"Profile refresh progress: shard {stats['shards'] + stats['shards_skipped']}/{self.shards}, "
+                    f"{done} users, {done / (now - t0):.1f} users/s"
+                )
+
+        stats["elapsed_s"] = round(time.monotonic() - t0, 3)
+        done = stats["users"] + stats["failed"]
+        stats["users_per_sec"] = round(done / stats["elapsed_s"], 2) if stats["elapsed_s"] else 0.0
+        metrics.gauge("profile_refresh.pending", 0)
+        logger.info(
+            f"Profile refresh done: {stats['users']} users ({stats['failed']} failed) in {stats['elapsed_s']}s, "
+            f"{stats['shards']} shards claimed, {stats['shards_skipped']} held by other replicas"
+        )
+        return stats
+
+    async def _refresh_users(self, users: list[int], concurrency: int, stats: dict) -> None:
+        from .academic_profile import compute_academic_profile
+
+        queue = list(reversed(users))
+
+        async def worker() -> None:
+            while queue:
+                uid = queue.pop()
+                t0 = time.monotonic()
+                try:
+                    await compute_academic_profile(uid)
+                    stats["users"] += 1
+                    metrics.incr("profile_refresh.users")
+                except Exception as e:
+                    stats["failed"] += 1
+                    metrics.incr("profile_refresh.failed")
+                    logger.warning(f"Profile refresh failed for user {uid}: {e}")
+                metrics.observe("profile_refresh.user_ms", (time.monotonic() - t0) * 1000)
+                metrics.gauge("profile_refresh.pending", len(queue))
+
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, len(users)))))
+
+
+# 进程级单例
+profile_refresher = ProfileRefreshScheduler()
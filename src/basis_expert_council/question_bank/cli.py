@@ -12,6 +12,9 @@
   python -m src.basis_expert_council.question_bank taxonomy [--validate]
   python -m src.basis_expert_council.question_bank tag [--dry-run] [--limit N] [--subject S] [--grade G]
   python -m src.basis_expert_council.question_bank tag-stats
+  python -m src.basis_expert_council.question_bank calibrate [--subject S] [--workers N] [--dry-run]
+  python -m src.basis_expert_council.question_bank rescore-abilities [--mode rescore|backfill] [--job NAME] [--restart]
+  python -m src.basis_expert_council.question_bank simulate [--bank PATH | --synthetic N] [--examinees N]
 """
 
 import argparse
@@ -95,6 +98,35 @@ def build_parser() -> argparse.ArgumentParser:
     # tag-stats — 标签分布统计
     sub.add_parser("tag-stats", help="标签分布统计")
 
+    # calibrate — IRT 题目参数标定
+    p_cal = sub.add_parser("calibrate", help="基于作答记录标定题目难度/区分度 (IRT 2PL)")
+    p_cal.add_argument("--subject", action="append", default=None, help="仅标定指定学科 (可重复)")
+    p_cal.add_argument("--workers", type=int, default=1, help="按学科并行的进程数")
+    p_cal.add_argument("--min-responses", type=int, default=30, help="参与标定的最少作答数")
+    p_cal.add_argument("--max-iter", type=int, default=50, help="EM 最大迭代次数")
+    p_cal.add_argument("--dry-run", action="store_true", help="只输出报告，不写回数据库")
+
+    # rescore-abilities — 全量回填/重算能力分
+    p_res = sub.add_parser("rescore-abilities", help="全量回填/重算学生能力分 (IRT + 报告知识点，可断点续跑)")
+    p_res.add_argument("--mode", choices=["rescore", "backfill"], default="rescore",
+                       help="rescore: 重建快照与会话历史 (幂等); backfill: 累加进现有滚动均值")
+    p_res.add_argument("--job", default=None, help="断点任务名 (默认同 --mode)")
+    p_res.add_argument("--batch-users", type=int, default=200, help="每批 (一个事务) 处理的用户数")
+    p_res.add_argument("--restart", action="store_true", help="丢弃已有断点，从头开始")
+
+    # simulate — CAT 离线模拟（不连数据库）
+    p_sim = sub.add_parser("simulate", help="CAT 选题/估分策略离线模拟对比 (无需数据库)")
+    p_sim.add_argument("--bank", default=None, help="题库 JSON 文件或目录 (如 data/question_banks)")
+    p_sim.add_argument("--synthetic", type=int, default=300, help="未指定 --bank 时生成的合成题目数")
+    p_sim.add_argument("--examinees", type=int, default=1000, help="模拟考生数")
+    p_sim.add_argument("--strategy", default="staircase,max_info,cat_engine",
+                       help="逗号分隔: staircase / max_info / cat_engine")
+    p_sim.add_argument("--subject", default="math")
+    p_sim.add_argument("--grade", default="G7")
+    p_sim.add_argument("--type", dest="assessment_type", default="pre_admission", help="测评类型 (决定题数与结束规则)")
+    p_sim.add_argument("--seed", type=int, default=0)
+    p_sim.add_argument("--json", action="store_true", help="以 JSON 输出汇总")
+
     return parser
 
 
@@ -259,8 +291,8 @@ async def cmd_map_transform(args):
 
 
 async def cmd_map_import(args):
-    from .map_transformer import transform_batch
     from .importer import import_questions
+    from .map_transformer import transform_batch
 
     with open(args.path, "r", encoding="utf-8") as f:
         data = json.load(f)
@@ -350,6 +382,73 @@ async def cmd_tag_stats(_args):
     print(report)
 
 
+async def cmd_calibrate(args):
+    from ..assessment.calibration import calibrate
+
+    report = await calibrate(
+        subjects=args.subject,
+        workers=args.workers,
+        min_responses=args.min_responses,
+        max_iterations=args.max_iter,
+        dry_run=args.dry_run,
+    )
+    print(report.format())
+
+
+async def cmd_rescore_abilities(args):
+    from ..assessment.rescoring import rescore_abilities
+
+    def on_progress(report):
+        print(f"  进度: {report.users} 用户 / {report.sessions} 会话 / {report.rows} 行 "
+              f"({report.rows_per_sec:.0f} rows/s)")
+
+    report = await rescore_abilities(
+        mode=args.mode,
+        job=args.job,
+        batch_users=args.batch_users,
+        restart=args.restart,
+        on_progress=on_progress,
+    )
+    print(report.format())
+
+
+async def cmd_simulate(args):
+    from ..assessment.simulation import (
+        STRATEGIES,
+        format_report,
+        load_bank,
+        simulate,
+        synthetic_bank,
+    )
+
+    if args.bank:
+        bank = load_bank(args.bank)
+        print(f"读取题库 {len(bank)} 题 ← {args.bank}")
+    else:
+        bank = synthetic_bank(args.synthetic, subject=args.subject, grade_level=args.grade, seed=args.seed)
+        print(f"合成题库 {len(bank)} 题")
+
+    strategies = [s.strip() for s in args.strategy.split(",") if s.strip()]
+    unknown = [s for s in strategies if s not in STRATEGIES]
+    if unknown:
+        print(f"未知策略: {', '.join(unknown)} (可选: {', '.join(STRATEGIES)})")
+        sys.exit(1)
+
+    results = simulate(
+        bank,
+        strategies=strategies,
+        examinees=args.examinees,
+        subject=args.subject,
+        grade_level=args.grade,
+        assessment_type=args.assessment_type,
+        seed=args.seed,
+    )
+    if args.json:
+        print(json.dumps([r.summary() for r in results], indent=2, ensure_ascii=False))
+    else:
+        print(format_report(results))
+
+
 async def main_async():
     parser = build_parser()
     args = parser.parse_args()
@@ -361,6 +460,9 @@ async def main_async():
     if args.command == "taxonomy":
         await cmd_taxonomy(args)
         return
+    if args.command == "simulate":
+        await cmd_simulate(args)
+        return
 
     # Ensure DB pool is ready
     from .. import db
@@ -377,6 +479,8 @@ async def main_async():
         "map-import": cmd_map_import,
         "tag": cmd_tag,
         "tag-stats": cmd_tag_stats,
+        "calibrate": cmd_calibrate,
+        "rescore-abilities": cmd_rescore_abilities,
     }
     handler = handlers.get(args.command)
     if handler:
@@ -18,11 +18,15 @@ import httpx
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 load_dotenv()
 
-from . import db
+from . import db, metrics
+from .assessment.deferred_scoring import DEFERRED_SCORING, deferred_scorer
+from .assessment.llm_client import scoring_client
+from .assessment.scoring_cache import scoring_cache
+from .assessment.usage_buffer import usage_buffer
 from .assessment_engine import (
     ASSESSMENT_TYPES,
     QUESTION_COUNT,
@@ -38,6 +42,7 @@ from .auth import (
     sync_supabase_user,
     wechat_login,
 )
+from .profile_refresh import profile_refresher
 from .sms import RateLimitError, SmsError, send_code, verify_code
 
 logger = logging.getLogger("basis.server")
@@ -52,7 +57,7 @@ LANGGRAPH_URL = os.getenv("LANGGRAPH_URL", "http://localhost:5095")
 
 
 async def _daily_refresh_loop():
-    """每天 3:00 AM 自动刷新所有活跃用户的学力档案。"""
+    """每天 3:00 AM 刷新有变化用户的学力档案（见 profile_refresh）。"""
     while True:
         try:
             now = datetime.now()
@@ -63,15 +68,7 @@ async def _daily_refresh_loop():
             logger.info(f"Daily profile refresh scheduled in {wait_sec:.0f}s")
             await asyncio.sleep(wait_sec)
 
-            from .academic_profile import compute_academic_profile
-            users = await db.get_users_with_completed_sessions()
-            logger.info(f"Daily refresh: {len(users)} users")
-            for uid in users:
-                try:
-                    await compute_academic_profile(uid)
-                except Exception as e:
-                    logger.warning(f"Daily refresh failed for user {uid}: {e}")
-                await asyncio.sleep(0.2)
+            await profile_refresher.run()
         except asyncio.CancelledError:
             break
         except Exception as e:
@@ -80,7 +77,7 @@ async def _daily_refresh_loop():
 
 
 async def _memory_cleanup_loop():
-    """每天 4:00 AM 清理过期记忆。"""
+    """每天 4:00 AM 清理过期记忆与过期评分缓存。"""
     while True:
         try:
             now = datetime.now()
@@ -94,6 +91,9 @@ async def _memory_cleanup_loop():
             from .memory import cleanup_expired_memories
             total = await cleanup_expired_memories()
             logger.info(f"Memory cleanup: {total} expired memories deleted")
+
+            evicted = await scoring_cache.evict_expired()
+            logger.info(f"Scoring cache cleanup: {evicted} expired entries deleted")
         except asyncio.CancelledError:
             break
         except Exception as e:
@@ -103,7 +103,9 @@ async def _memory_cleanup_loop():
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Startup: init DB schema + seed questions + daily refresh + memory cleanup. Shutdown: close pool."""
+    """Startup: init DB schema + seed questions + daily refresh + memory cleanup + usage flusher
+    (+ deferred scoring workers).
+    Shutdown: stop scoring workers, flush usage counters, close scoring client and pool."""
     refresh_task = None
     memory_cleanup_task = None
     try:
@@ -117,6 +119,11 @@ async def lifespan(app: FastAPI):
         refresh_task = asyncio.create_task(_daily_refresh_loop())
         # Start daily memory cleanup loop
         memory_cleanup_task = asyncio.create_task(_memory_cleanup_loop())
+        # Start question usage write-behind flusher
+        usage_buffer.start()
+        # Start deferred subjective scoring workers (opt-in)
+        if DEFERRED_SCORING:
+            deferred_scorer.start()
     except Exception as e:
         logger.warning(f"Schema/seed init: {e}")
     yield
@@ -124,6 +131,12 @@ async def lifespan(app: FastAPI):
         refresh_task.cancel()
     if memory_cleanup_task:
         memory_cleanup_task.cancel()
+    await deferred_scorer.stop()
+    try:
+        await usage_buffer.stop()
+    except Exception as e:
+        logger.warning(f"Usage buffer final flush failed: {e}")
+    await scoring_client.aclose()
     await db.close_pool()
 
 
@@ -921,9 +934,19 @@ async def get_assessment_history(request: Request):
     }
 
 
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match 弱比较（忽略 W/ 前缀，支持逗号分隔列表与 *）。"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
 @app.get("/api/academic/profile")
 async def get_academic_profile(request: Request):
-    """获取学力档案数据 v2（需登录）— 优先返回缓存，24h 过期"""
+    """获取学力档案数据 v2（需登录）— 返回缓存，支持 ETag / If-None-Match 304"""
     auth_info = await authenticate_request(dict(request.headers))
     if not auth_info:
         return JSONResponse(status_code=401, content={"error": "未登录"})
@@ -940,33 +963,61 @@ async def get_academic_profile(request: Request):
                 return JSONResponse(status_code=403, content={"error": "无权查看"})
             target_user_id = int(student_id)
 
-    # Check cache first (24h TTL)
-    from datetime import datetime, timedelta, timezone
-    cached = await db.get_profile_cache(target_user_id)
-    if cached and cached.get("computed_at"):
-        age = datetime.now(timezone.utc) - cached["computed_at"].replace(tzinfo=timezone.utc)
-        if age < timedelta(hours=24):
-            profile_data = cached["profile_data"]
-            if isinstance(profile_data, str):
-                import json as _json
-                profile_data = _json.loads(profile_data)
-            return profile_data
-
-    # Cache miss or expired → compute
+    # 缓存优先，从不等待计算：过期 / 被标脏时返回旧数据（meta.stale）并后台刷新
     try:
-        from .academic_profile import compute_academic_profile
-        data = await compute_academic_profile(target_user_id)
-        return data
+        from .academic_profile import read_profile
+        result = await read_profile(target_user_id)
     except Exception as e:
-        logger.error(f"academic profile compute error: {e}")
+        logger.error(f"academic profile read error: {e}")
         # Fallback to old v1 data
         data = await db.get_academic_profile_data(target_user_id)
         return data
 
+    headers = {"Cache-Control": "private, no-cache"}
+    if result["etag"]:
+        headers["ETag"] = result["etag"]
+        if _etag_matches(request.headers.get("if-none-match"), result["etag"]):
+            return Response(status_code=304, headers=headers)
+    return Response(content=result["body"], media_type="application/json", headers=headers)
+
+
+@app.get("/api/academic/profiles")
+async def get_linked_academic_profiles(request: Request):
+    """家长批量获取所有绑定学生的学力档案（需登录），NDJSON 流式返回，每个学生一行
+
+    可选 ?student_ids=1,2 只取其中部分学生（必须已绑定）。
+    """
+    auth_info = await authenticate_request(dict(request.headers))
+    if not auth_info:
+        return JSONResponse(status_code=401, content={"error": "未登录"})
+
+    user = await db.get_user_by_id(auth_info["user_id"])
+    if not user or user.get("role") != "parent":
+        return JSONResponse(status_code=403, content={"error": "仅家长账号可用"})
+    linked_ids = [s["id"] for s in await db.get_linked_students(auth_info["user_id"])]
+
+    requested = request.query_params.get("student_ids")
+    if requested:
+        try:
+            student_ids = [int(x) for x in requested.split(",") if x.strip()]
+        except ValueError:
+            return JSONResponse(status_code=400, content={"error": "student_ids 格式错误"})
+        if not set(student_ids) <= set(linked_ids):
+            return JSONResponse(status_code=403, content={"error": "无权查看"})
+    else:
+        student_ids = linked_ids
+
+    from .academic_profile import stream_profiles
+    return StreamingResponse(
+        stream_profiles(list(dict.fromkeys(student_ids))),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "private, no-cache"},
+    )
+
 
 @app.post("/api/academic/profile/refresh")
 async def refresh_academic_profile(request: Request):
-    """手动刷新学力档案（需登录）"""
+    """手动刷新学力档案（需登录）— 202，后台计算"""
     auth_info = await authenticate_request(dict(request.headers))
     if not auth_info:
         return JSONResponse(status_code=401, content={"error": "未登录"})
@@ -982,13 +1033,15 @@ async def refresh_academic_profile(request: Request):
                 return JSONResponse(status_code=403, content={"error": "无权查看"})
             target_user_id = int(student_id)
 
+    # 标脏后后台计算；客户端轮询 GET，直到 meta.stale 消失
     try:
-        from .academic_profile import compute_academic_profile
-        profile = await compute_academic_profile(target_user_id)
-        return {"status": "ok", "computed_at": profile.get("meta", {}).get("computed_at"), "profile": profile}
+        from .academic_profile import refresh_in_background
+        await db.mark_profile_dirty(target_user_id)
+        refresh_in_background(target_user_id)
     except Exception as e:
         logger.error(f"academic profile refresh error: {e}")
         return JSONResponse(status_code=500, content={"error": "刷新失败"})
+    return JSONResponse(status_code=202, content={"status": "refreshing"})
 
 
 async def _do_resume(session_id: str):
@@ -999,28 +1052,21 @@ async def _do_resume(session_id: str):
     if session["status"] != "in_progress":
         return JSONResponse(status_code=400, content={"error": "Session is not in progress"})
 
-    answers = await db.get_session_answers(session_id)
     max_q = QUESTION_COUNT.get(session["assessment_type"], 15)
 
-    # Rebuild CAT state
-    from .assessment_engine import _rebuild_cat_state, _format_question
-    state = _rebuild_cat_state(session, answers, max_q)
+    # 读取会话行上持久化的 CAT 状态（旧会话回放答题记录）
+    from .assessment.prefetch import prefetch_cache
+    from .assessment.selection import select_next_question
+    from .assessment_engine import _format_question, load_cat_state
+    state = await load_cat_state(session, max_q)
 
-    # Select next question
-    next_q = await db.find_next_question(
-        subject=session["subject"],
-        grade_level=session["grade_level"],
-        target_difficulty=state.current_difficulty,
-        exclude_ids=state.answered_question_ids,
-    )
-    if not next_q:
-        next_q = await db.find_next_question(
-            subject=session["subject"],
-            grade_level=session["grade_level"],
-            target_difficulty=state.current_difficulty,
-            exclude_ids=state.answered_question_ids,
-            tolerance=0.3,
-        )
+    # Select next question (none once the stopping policy ended the session)
+    next_q = None
+    if not state.is_complete:
+        next_q = await select_next_question(session, state)
+        if not next_q:
+            next_q = await select_next_question(session, state, tolerance=0.3)
+        prefetch_cache.schedule(session, state, next_q)
 
     a_type = session.get("assessment_type", "quick")
     time_limit_sec = ASSESSMENT_TYPES.get(a_type, {}).get("estimated_minutes", 15) * 60
@@ -1031,10 +1077,11 @@ async def _do_resume(session_id: str):
         "subject": session["subject"],
         "grade_level": session["grade_level"],
         "questions_answered": state.question_count,
-        "total_questions": max_q,
+        "total_questions": state.total_questions,
         "current_question": _format_question(next_q) if next_q else None,
         "next_question": _format_question(next_q) if next_q else None,
-        "progress": {"current": state.question_count + 1, "total": max_q},
+        "progress": {"current": state.question_count + 1, "total": state.total_questions},
+        "stop_reason": state.stop_reason,
         "time_limit_sec": time_limit_sec,
     }
 
@@ -1191,6 +1238,42 @@ async def admin_list_questions(request: Request):
     return result
 
 
+@app.get("/api/admin/metrics")
+async def admin_metrics(request: Request):
+    """进程内运行指标（预取命中率、缓冲区、评分延迟等）"""
+    if not await _check_admin(request):
+        return JSONResponse(status_code=403, content={"error": "需要管理员权限"})
+    return metrics.snapshot()
+
+
+def _purge_question_ids(body: dict) -> list[int] | None:
+    """解析清缓存请求体：缺少 question_ids 为全部（None）；空列表或非整数列表抛 ValueError。"""
+    if "question_ids" not in body:
+        return None
+    question_ids = body["question_ids"]
+    if not isinstance(question_ids, list) or not question_ids:
+        raise ValueError("question_ids 须为非空的题目 id 列表（清除全部请省略该字段）")
+    return [int(q) for q in question_ids]
+
+
+@app.post("/api/admin/scoring-cache/purge")
+async def admin_purge_scoring_cache(request: Request):
+    """清除主观题评分缓存（body: {"question_ids": [...]}，省略该字段为全部）"""
+    if not await _check_admin(request):
+        return JSONResponse(status_code=403, content={"error": "需要管理员权限"})
+    try:
+        body = await request.json() if await request.body() else {}
+        question_ids = _purge_question_ids(body)
+    except (ValueError, TypeError, AttributeError) as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    try:
+        deleted = await scoring_cache.purge(question_ids)
+        return {"success": True, "deleted": deleted}
+    except Exception as e:
+        logger.error(f"admin/purge_scoring_cache error: {e}")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
 @app.get("/api/admin/questions/stats")
 async def admin_question_stats(request: Request):
     """题库统计概览"""
@@ -1429,6 +1512,7 @@ async def update_memory_endpoint(memory_id: str, request: Request):
 
     try:
         run_with_timeout(mem.update, memory_id=memory_id, data=new_content)
+        await db.mark_profile_dirty(user["id"])
         return {"success": True, "memory_id": memory_id}
     except Exception as e:
         logger.warning(f"update_memory failed: {e}")
@@ -1453,6 +1537,7 @@ async def delete_all_memories(request: Request):
 
     try:
         run_with_timeout(mem.delete_all, user_id=mem0_uid, timeout_sec=30)
+        await db.mark_profile_dirty(user["id"])
         return {"success": True}
     except Exception as e:
         logger.warning(f"delete_all_memories failed: {e}")
@@ -1487,6 +1572,8 @@ async def batch_delete_memories(request: Request):
             deleted += 1
         except Exception:
             failed += 1
+    if deleted:
+        await db.mark_profile_dirty(user["id"])
 
     return {"deleted": deleted, "failed": failed}
 
@@ -1522,6 +1609,7 @@ async def delete_memory_endpoint(memory_id: str, request: Request):
 
     try:
         run_with_timeout(mem.delete, memory_id=memory_id)
+        await db.mark_profile_dirty(user["id"])
         return {"success": True, "memory_id": memory_id}
     except Exception as e:
         logger.warning(f"delete_memory failed: {e}")
@@ -0,0 +1,574 @@
+"""
+学力档案增量计算 (academic_profile) 单元测试
+"""
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from basis_expert_council import academic_profile as ap
+from basis_expert_council import db, metrics
+
+
+def _row(answer_id, is_correct, *, question_id=None, topic="algebra", tags=("bloom:apply",), completed_ago=7200):
+    at = datetime.now(timezone.utc) - timedelta(seconds=completed_ago)
+    return {
+        "id": answer_id, "question_id": question_id or answer_id, "is_correct": is_correct,
+        "subject": "math", "topic": topic, "subtopic": None, "difficulty": 0.5, "tags": list(tags),
+        "user_answer": '{"selected": "B"}', "created_at": at, "completed_at": at,
+        "content_zh": '{"stem": "1+1=?", "answer": "A"}', "content_en": {},
+        "explanation_zh": None, "explanation_en": None,
+    }
+
+
+class FakeConn:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    async def fetch(self, sql, *args):
+        self.calls.append(args)
+        return self.rows
+
+    async def execute(self, sql, *args):
+        self.calls.append(args)
+        return "INSERT 0 1"
+
+
+class LockConn:
+    """Connection stand-in for the per-user advisory lock."""
+
+    def __init__(self, free: bool, fresh=None):
+        self.free = free
+        self.fresh = fresh
+        self.sql = []
+
+    async def fetchval(self, sql, *args):
+        self.sql.append(sql)
+        if "pg_try_advisory_lock" in sql:
+            return self.free
+        if "clock_timestamp" in sql:
+            return datetime.now(timezone.utc)
+        if "MAX(version)" in sql:
+            return 0
+        return self.fresh
+
+    async def execute(self, sql, *args):
+        self.sql.append(sql)
+
+
+class LockPool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+class BoundedPool:
+    """Pool stand-in with asyncpg's semantics: acquire() waits (no timeout) once max_size are checked out."""
+
+    def __init__(self, max_size: int):
+        self.slots = asyncio.Semaphore(max_size)
+        self.in_use = 0
+        self.peak = 0
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self.slots:
+            self.in_use += 1
+            self.peak = max(self.peak, self.in_use)
+            try:
+                yield PoolConn()
+            finally:
+                self.in_use -= 1
+
+
+class PoolConn(LockConn):
+    def __init__(self):
+        super().__init__(free=True)
+
+    async def fetchrow(self, sql, *args):
+        return None
+
+    async def fetch(self, sql, *args):
+        await asyncio.sleep(0.005)
+        return []
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+
+# ===========================================================================
+# Single flight
+# ===========================================================================
+
+
+class TestSingleFlight:
+    def test_concurrent_callers_share_one_computation(self, monkeypatch):
+        calls = []
+
+        async def compute(user_id):
+            calls.append(user_id)
+            await asyncio.sleep(0.01)
+            return {"user": user_id}
+
+        monkeypatch.setattr(ap, "_compute_single_flight", compute)
+        metrics.reset()
+
+        async def scenario():
+            results = await asyncio.gather(*(ap.compute_academic_profile(1) for _ in range(3)),
+                                           ap.compute_academic_profile(2))
+            again = await ap.compute_academic_profile(1)
+            return results, again
+
+        results, again = asyncio.run(scenario())
+        assert calls == [1, 2, 1]
+        assert results[0] is results[1] is results[2]
+        assert again == {"user": 1}
+        assert metrics.counter_value("academic_profile.joined") == 2
+        assert ap._inflight == {}
+
+    def test_cancelled_caller_does_not_cancel_the_computation(self, monkeypatch):
+        async def compute(user_id):
+            await asyncio.sleep(0.02)
+            return {"user": user_id}
+
+        monkeypatch.setattr(ap, "_compute_single_flight", compute)
+
+        async def scenario():
+            first = asyncio.ensure_future(ap.compute_academic_profile(1))
+            second = asyncio.ensure_future(ap.compute_academic_profile(1))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(scenario()) == {"user": 1}
+
+    def test_waiting_replica_reuses_fresh_cache(self, monkeypatch):
+        conn = LockConn(free=False, fresh='{"meta": {"version": 3}}')
+
+        async def pool():
+            return LockPool(conn)
+
+        async def must_not_compute(user_id, conn):
+            raise AssertionError("recomputed")
+
+        monkeypatch.setattr(db, "get_pool", pool)
+        monkeypatch.setattr(ap, "_compute_academic_profile", must_not_compute)
+        assert asyncio.run(ap._compute_single_flight(5)) == {"meta": {"version": 3}}
+        assert any("pg_advisory_unlock" in sql for sql in conn.sql)
+
+    def test_lock_is_released_when_computation_fails(self, monkeypatch):
+        conn = LockConn(free=True)
+
+        async def pool():
+            return LockPool(conn)
+
+        async def boom(user_id, conn):
+            raise RuntimeError("db down")
+
+        monkeypatch.setattr(db, "get_pool", pool)
+        monkeypatch.setattr(ap, "_compute_academic_profile", boom)
+        with pytest.raises(RuntimeError):
+            asyncio.run(ap._compute_single_flight(5))
+        assert "pg_advisory_unlock" in conn.sql[-1]
+
+    def test_refresh_during_computation_reruns_once(self, monkeypatch):
+        calls = []
+
+        async def compute(user_id):
+            calls.append(user_id)
+            await asyncio.sleep(0.01)
+            return {"user": user_id}
+
+        monkeypatch.setattr(ap, "_compute_single_flight", compute)
+
+        async def scenario():
+            first = asyncio.ensure_future(ap.compute_academic_profile(1))
+            await asyncio.sleep(0)
+            # 交卷标脏后触发的刷新落在进行中的计算上：只补算一轮
+            for _ in range(3):
+                ap.refresh_in_background(1)
+            await first
+            while ap._background or ap._inflight:
+                await asyncio.sleep(0.005)
+
+        asyncio.run(scenario())
+        assert calls == [1, 1]
+        assert ap._rerun == set()
+
+    def test_cache_is_stamped_with_computation_start(self, monkeypatch):
+        started = datetime(2026, 5, 1, tzinfo=timezone.utc)
+        written = {}
+
+        class Conn(PoolConn):
+            async def fetchval(self, sql, *args):
+                return started if "clock_timestamp" in sql else await super().fetchval(sql, *args)
+
+        async def noop(*args, **kwargs):
+            return 0
+
+        async def build(user_id, activity, conn=None):
+            return {"meta": {}}
+
+        async def upsert(user_id, payload, elapsed_ms, **kwargs):
+            written.update(kwargs)
+
+        for name in ("scan_and_update_mistake_book", "compute_topic_mastery",
+                     "extract_goals_from_mem0", "compute_goal_gaps"):
+            monkeypatch.setattr(ap, name, noop)
+        monkeypatch.setattr(ap, "_build_payload", build)
+        monkeypatch.setattr(db, "upsert_profile_cache", upsert)
+        conn = Conn()
+        asyncio.run(ap._compute_academic_profile(1, conn))
+        assert written["computed_at"] == started and written["conn"] is conn
+        assert written["folded_answer_ids"] == [] and written["answer_tallies"] is None
+
+    def test_more_users_than_pool_connections_do_not_deadlock(self, monkeypatch):
+        pool = BoundedPool(max_size=10)
+
+        async def get_pool():
+            return pool
+
+        async def noop(*args, **kwargs):
+            return 0
+
+        async def build(user_id, activity, conn=None):
+            # 与真实实现一致：经 db.acquire(conn) 取连接
+            async with db.acquire(conn) as c:
+                await c.fetch("SELECT 1")
+            return {"meta": {}}
+
+        monkeypatch.setattr(db, "get_pool", get_pool)
+        for name in ("scan_and_update_mistake_book", "compute_topic_mastery",
+                     "extract_goals_from_mem0", "compute_goal_gaps"):
+            monkeypatch.setattr(ap, name, noop)
+        monkeypatch.setattr(ap, "_build_payload", build)
+
+        async def scenario():
+            users = range(1, 26)
+            await asyncio.wait_for(
+                asyncio.gather(*(ap.compute_academic_profile(u) for u in users)), timeout=5,
+            )
+
+        asyncio.run(scenario())
+        assert pool.peak <= ap.PROFILE_COMPUTE_CONCURRENCY
+
+
+# ===========================================================================
+# Atomic fold
+# ===========================================================================
+
+
+class TxConn(PoolConn):
+    """Journals writes; those made inside a transaction are dropped when it raises."""
+
+    def __init__(self):
+        super().__init__()
+        self.committed = []
+        self.pending = None
+
+    @asynccontextmanager
+    async def transaction(self):
+        if self.pending is not None:  # savepoint
+            yield
+            return
+        self.pending = []
+        try:
+            yield
+            self.committed += self.pending
+        finally:
+            self.pending = None
+
+    def write(self, *effect):
+        (self.pending if self.pending is not None else self.committed).append(effect)
+
+    def folded(self):
+        return {i for kind, ids in self.committed if kind == "folded" for i in ids}
+
+
+class TestAtomicFold:
+    @pytest.mark.parametrize(
+        "failing", ["compute_topic_mastery", "compute_goal_gaps", "_build_payload", "upsert_profile_cache"],
+    )
+    def test_failed_step_does_not_double_count(self, monkeypatch, failing):
+        rows = [_row(1, False), _row(2, True, question_id=1), _row(3, False)]
+        fail = {"left": 1}
+
+        def step(kind, result=None):
+            async def run(user_id, *args, conn=None, **kwargs):
+                if kind == failing and fail["left"]:
+                    fail["left"] -= 1
+                    raise RuntimeError(f"{kind} failed")
+                c = conn or args[0]
+                if kind == "scan_and_update_mistake_book":
+                    c.write("mistake", [r["id"] for r in args[1]])
+                elif kind == "compute_topic_mastery":
+                    c.write("mastery", sorted(args[2]))
+                elif kind == "upsert_profile_cache":
+                    c.write("folded", kwargs["folded_answer_ids"])
+                return result
+            return run
+
+        async def tallies(user_id, *, conn):
+            return {}
+
+        async def fetch_new(user_id, conn):
+            return [r for r in rows if r["id"] not in conn.folded()]
+
+        monkeypatch.setattr(db, "get_profile_tallies", tallies)
+        monkeypatch.setattr(db, "get_activity_heatmap", step("get_activity_heatmap", {}))
+        monkeypatch.setattr(db, "upsert_profile_cache", step("upsert_profile_cache"))
+        monkeypatch.setattr(ap, "_fetch_new_answers", fetch_new)
+        for name in ("scan_and_update_mistake_book", "compute_topic_mastery",
+                     "extract_goals_from_mem0", "compute_goal_gaps"):
+            monkeypatch.setattr(ap, name, step(name))
+        monkeypatch.setattr(ap, "_build_payload", step("_build_payload", {"meta": {}}))
+
+        conn = TxConn()
+        with pytest.raises(RuntimeError):
+            asyncio.run(ap._compute_academic_profile(1, conn))
+        assert conn.committed == []
+
+        payload = asyncio.run(ap._compute_academic_profile(1, conn))
+        assert payload["meta"]["new_answers"] == 3
+        assert conn.committed == [
+            ("mistake", [1, 2, 3]), ("mastery", [("math", "algebra")]), ("folded", [1, 2, 3]),
+        ]
+        assert asyncio.run(ap._compute_academic_profile(1, conn))["meta"]["new_answers"] == 0
+        # 每个答案只进入错题本一次
+        assert [i for kind, ids in conn.committed if kind == "mistake" for i in ids] == [1, 2, 3]
+
+
+# ===========================================================================
+# Read path (stale-while-revalidate)
+# ===========================================================================
+
+
+class TestReadProfile:
+    @pytest.fixture
+    def refreshed(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(ap, "refresh_in_background", calls.append)
+        return calls
+
+    def _state(self, monkeypatch, state):
+        async def get_state(user_id, max_age_sec):
+            return state
+
+        monkeypatch.setattr(db, "get_profile_cache_state", get_state)
+
+    def test_fresh_cache_is_returned_verbatim(self, monkeypatch, refreshed):
+        body = '{"meta": {"version": 2}, "kpi": {}}'
+        self._state(monkeypatch, {"profile_data": body, "version": 7, "stale": False})
+        result = asyncio.run(ap.read_profile(3))
+        assert result == {"body": body, "etag": 'W/"3-7"', "stale": False}
+        assert refreshed == []
+
+    def test_stale_cache_is_served_and_refreshed(self, monkeypatch, refreshed):
+        self._state(monkeypatch, {"profile_data": '{"meta": {"version": 2}}', "version": 7, "stale": True})
+        result = asyncio.run(ap.read_profile(3))
+        assert json.loads(result["body"])["meta"] == {"version": 2, "stale": True}
+        assert result["etag"] == 'W/"3-7-stale"'
+        assert refreshed == [3]
+
+    def test_cold_read_assembles_without_computing(self, monkeypatch, refreshed):
+        self._state(monkeypatch, None)
+
+        async def heatmap(user_id):
+            return {}
+
+        async def build(user_id, activity):
+            return {"meta": {"version": 2}, "kpi": {"total_assessments": 0}}
+
+        monkeypatch.setattr(db, "get_activity_heatmap", heatmap)
+        monkeypatch.setattr(ap, "_build_payload", build)
+        result = asyncio.run(ap.read_profile(3))
+        assert result["etag"] is None and json.loads(result["body"])["meta"]["stale"] is True
+        assert refreshed == [3]
+
+    def test_etag_matching(self):
+        from basis_expert_council.server import _etag_matches
+
+        assert _etag_matches('W/"3-7"', 'W/"3-7"')
+        assert _etag_matches('"1-1", "3-7"', 'W/"3-7"')
+        assert _etag_matches("*", 'W/"3-7"')
+        assert not _etag_matches('W/"3-7"', 'W/"3-7-stale"')
+        assert not _etag_matches(None, 'W/"3-7"')
+
+
+# ===========================================================================
+# Batch (parents)
+# ===========================================================================
+
+
+class TestStreamProfiles:
+    def test_fresh_first_then_computed_within_shared_limit(self, monkeypatch):
+        states = {
+            1: {"profile_data": '{"meta": {"v": 1}}', "stale": False},
+            2: {"profile_data": '{"meta": {"v": 2}}', "stale": True},
+            4: {"profile_data": '{"meta": {"v": 4}}', "stale": True},
+        }
+        peak = {"now": 0, "max": 0}
+
+        async def get_states(user_ids, max_age_sec):
+            return {u: states[u] for u in user_ids if u in states}
+
+        async def compute(user_id, conn):
+            peak["now"] += 1
+            peak["max"] = max(peak["max"], peak["now"])
+            await asyncio.sleep(0.01)
+            peak["now"] -= 1
+            if user_id == 4:
+                raise RuntimeError("boom")
+            return {"meta": {"v": user_id * 10}}
+
+        async def pool():
+            return LockPool(LockConn(free=True))
+
+        monkeypatch.setattr(db, "get_profile_cache_states", get_states)
+        monkeypatch.setattr(db, "get_pool", pool)
+        monkeypatch.setattr(ap, "_compute_academic_profile", compute)
+        monkeypatch.setattr(ap, "PROFILE_COMPUTE_CONCURRENCY", 2)
+
+        async def collect():
+            # 同时进行的后台刷新与批量请求共享同一进程级名额
+            for uid in (7, 8, 9):
+                ap.refresh_in_background(uid)
+            lines = [json.loads(line) async for line in ap.stream_profiles([1, 2, 3, 4])]
+            await asyncio.gather(*ap._background)
+            return lines
+
+        lines = asyncio.run(collect())
+        assert lines[0] == {"student_id": 1, "status": "fresh", "profile": {"meta": {"v": 1}}}
+        by_id = {line["student_id"]: line for line in lines}
+        assert by_id[2]["status"] == "computed" and by_id[2]["profile"]["meta"]["v"] == 20
+        assert by_id[3]["status"] == "computed"
+        assert by_id[4]["status"] == "stale" and by_id[4]["profile"]["meta"] == {"v": 4, "stale": True}
+        assert peak["max"] == 2
+
+
+# ===========================================================================
+# Tallies
+# ===========================================================================
+
+
+class TestFoldTallies:
+    def test_counts_and_bloom(self):
+        tallies: dict = {}
+        touched = ap.fold_answer_tallies(tallies, [
+            _row(1, True), _row(2, False), _row(3, True, topic="geometry", tags=()), _row(4, None),
+        ])
+        assert touched == {("math", "algebra"), ("math", "geometry")}
+        algebra = tallies["math"]["algebra"]
+        assert (algebra["total"], algebra["correct"], algebra["wrong"]) == (2, 1, 1)
+        assert algebra["bloom"] == {"apply": [1, 2]}
+
+    def test_folding_accumulates(self):
+        tallies: dict = {}
+        ap.fold_answer_tallies(tallies, [_row(1, True)])
+        touched = ap.fold_answer_tallies(tallies, [_row(2, True)])
+        assert tallies["math"]["algebra"]["total"] == 2
+        assert ap._bloom_rates(tallies["math"]["algebra"]["bloom"]) == {"apply": 1.0}
+        assert touched == {("math", "algebra")}
+
+    def test_untouched_refresh_writes_nothing(self):
+        conn = FakeConn([])
+        asyncio.run(ap.compute_topic_mastery(1, conn, {}, set()))
+        assert conn.calls == []
+
+
+# ===========================================================================
+# Topic / subject scores
+# ===========================================================================
+
+
+class TestTopicMastery:
+    def test_rows_for_touched_topics_and_subject(self):
+        tallies: dict = {}
+        ap.fold_answer_tallies(tallies, [
+            _row(1, True), _row(2, False), _row(3, True, topic="geometry", tags=("bloom:apply",)),
+        ])
+        mistakes = {("math", "algebra"): {"mastered": 0, "active": 1}, ("math", None): {"mastered": 2, "active": 1}}
+        rows = ap.build_mastery_rows(tallies, {("math", "algebra")}, mistakes)
+        assert [(r["subject"], r["topic"]) for r in rows] == [("math", "algebra"), ("math", None)]
+        algebra, subject = rows
+        assert (algebra["score_100"], algebra["active"], algebra["confidence"]) == (50.0, 1, 0.6)
+        assert (subject["total"], subject["correct"], subject["mastered"]) == (3, 2, 2)
+        assert subject["bloom"] == '{"apply": 0.75}'
+
+    def test_constant_statements_per_refresh(self):
+        tallies: dict = {}
+        rows = [_row(i, i % 2 == 0, topic=f"t{i % 7}") for i in range(40)]
+        touched = ap.fold_answer_tallies(tallies, rows)
+        conn = FakeConn([])
+        history = asyncio.run(ap.compute_topic_mastery(1, conn, tallies, touched))
+        assert history == 1
+        assert len(conn.calls) == 2
+        subjects, topics = conn.calls[1][1], conn.calls[1][2]
+        assert len(topics) == 8 and topics[-1] is None and set(subjects) == {"math"}
+
+
+# ===========================================================================
+# Incremental fold
+# ===========================================================================
+
+
+class TestFetchNewAnswers:
+    def test_reads_unfolded_answers(self):
+        conn = FakeConn([_row(5, True)])
+        rows = asyncio.run(ap._fetch_new_answers(7, conn))
+        assert [r["id"] for r in rows] == [5]
+        assert conn.calls == [(7, ap.SCORE_PENDING_GRACE_SEC)]
+
+    def test_recent_unscored_answer_holds_later_answers(self):
+        conn = FakeConn([_row(1, True), _row(2, None, completed_ago=10), _row(3, True)])
+        rows = asyncio.run(ap._fetch_new_answers(7, conn))
+        assert [r["id"] for r in rows] == [1]
+
+    def test_stale_unscored_answer_is_left_unfolded(self):
+        # 不折叠也不标记：评分落库后下次刷新再折叠
+        conn = FakeConn([_row(1, True), _row(2, None), _row(3, True)])
+        rows = asyncio.run(ap._fetch_new_answers(7, conn))
+        assert [r["id"] for r in rows] == [1, 3]
+
+
+# ===========================================================================
+# Mistake book fold
+# ===========================================================================
+
+
+class TestFoldMistakeBook:
+    NOW = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+    def test_new_entry_then_mastered(self):
+        rows = [_row(1, False, question_id=9), _row(2, True, question_id=9), _row(3, True, question_id=9)]
+        entry = ap.fold_mistake_book({}, rows, self.NOW)[9]
+        assert (entry["wrong_count"], entry["correct_after_wrong"]) == (1, 2)
+        assert entry["mastery_status"] == "mastered" and entry["mastered_at"] == self.NOW
+        assert entry["correct_answer"] == "A" and entry["question_stem_zh"] == "1+1=?"
+        assert entry["last_wrong_answer"] == {"selected": "B"}
+        assert entry["bloom_level"] == "apply"
+
+    def test_status_transitions(self):
+        rows = [_row(1, False, question_id=9), _row(2, False, question_id=9)]
+        assert ap.fold_mistake_book({}, rows, self.NOW)[9]["mastery_status"] == "new"
+
+        existing = {9: {
+            "question_id": 9, "wrong_count": 1, "correct_after_wrong": 2, "mastery_status": "mastered",
+            "mastered_at": self.NOW, "last_wrong_at": self.NOW, "last_wrong_answer": '{"selected": "C"}',
+            "bloom_level": "remember", "misconception_ids": ["mc1"], "skill_tags": None,
+        }}
+        entry = ap.fold_mistake_book(existing, [_row(3, False, question_id=9, tags=())], self.NOW)[9]
+        assert entry["mastery_status"] == "regressed" and entry["mastered_at"] is None
+        assert entry["wrong_count"] == 2
+        assert entry["bloom_level"] == "remember" and entry["misconception_ids"] == ["mc1"]
+
+    def test_correct_answers_outside_the_book_are_ignored(self):
+        assert ap.fold_mistake_book({}, [_row(1, True), _row(2, None)], self.NOW) == {}
@@ -0,0 +1,173 @@
+"""
+主观题批量评分 (agent_scoring.score_subjective_batch) 单元测试
+"""
+
+import asyncio
+import json
+import re
+
+import pytest
+
+from basis_expert_council import db, metrics
+from basis_expert_council.assessment import agent_scoring, deferred_scoring, item_pool, usage_buffer
+from basis_expert_council.assessment.deferred_scoring import DeferredScorer
+from basis_expert_council.assessment.scoring_cache import ScoringCache
+
+
+def _question(qid):
+    return {"id": qid, "question_type": "essay", "content_zh": {"stem": f"第 {qid} 题题干"}}
+
+
+def _verdict(item_no, score=0.8):
+    return {"id": item_no, "score": score, "is_correct": score >= 0.6, "feedback_zh": f"评语{item_no}"}
+
+
+class FakeClient:
+    """Answers batch prompts with a JSON array; `drop` item numbers are omitted."""
+
+    def __init__(self, drop=(), fail_batch=False):
+        self.drop = set(drop)
+        self.fail_batch = fail_batch
+        self.batch_sizes: list[int] = []
+        self.single_calls = 0
+
+    async def chat(self, messages, **kwargs):
+        prompt = messages[0]["content"]
+        n = len(re.findall(r"^## 第 \d+ 题", prompt, re.MULTILINE))
+        if n:
+            self.batch_sizes.append(n)
+            if self.fail_batch:
+                raise agent_scoring.ScoringUnavailable("batch down")
+            payload = [_verdict(i) for i in range(1, n + 1) if i not in self.drop]
+            return f"```json\n{json.dumps(payload, ensure_ascii=False)}\n```"
+        self.single_calls += 1
+        return json.dumps({"score": 0.4, "is_correct": False, "feedback_zh": "单题"})
+
+
+@pytest.fixture(autouse=True)
+def _isolated(monkeypatch):
+    async def miss(*key):
+        return None
+
+    async def noop(*key, **kwargs):
+        return None
+
+    monkeypatch.setattr(db, "get_cached_score", miss)
+    monkeypatch.setattr(db, "put_cached_score", noop)
+    monkeypatch.setattr(agent_scoring, "scoring_cache", ScoringCache())
+    metrics.reset()
+
+
+def _use(monkeypatch, client):
+    monkeypatch.setattr(agent_scoring, "scoring_client", client)
+    return client
+
+
+# ===========================================================================
+# Parsing
+# ===========================================================================
+
+
+class TestParseBatch:
+    def test_fenced_array(self):
+        text = "结果如下\n```json\n" + json.dumps([_verdict(1), _verdict(2)]) + "\n```"
+        assert sorted(agent_scoring._parse_batch_response(text, 2)) == [1, 2]
+
+    def test_invalid_entries_are_dropped(self):
+        text = json.dumps([_verdict(1), {"id": 2}, _verdict(9), _verdict(1, 0.1), "x"])
+        parsed = agent_scoring._parse_batch_response(text, 3)
+        assert list(parsed) == [1]
+        assert parsed[1]["score"] == 0.8
+
+    def test_garbage(self):
+        assert agent_scoring._parse_batch_response("no json here", 2) == {}
+
+
+# ===========================================================================
+# Batch scoring
+# ===========================================================================
+
+
+class TestScoreBatch:
+    def test_one_request_for_all_items(self, monkeypatch):
+        client = _use(monkeypatch, FakeClient())
+        items = [(_question(i), f"answer {i}") for i in range(1, 5)]
+        results = asyncio.run(agent_scoring.score_subjective_batch(items))
+        assert client.batch_sizes == [4]
+        assert client.single_calls == 0
+        assert [r[2] for r in results] == ["评语1", "评语2", "评语3", "评语4"]
+
+    def test_missing_items_are_retried_individually(self, monkeypatch):
+        client = _use(monkeypatch, FakeClient(drop={2}))
+        items = [(_question(i), f"answer {i}") for i in range(1, 4)]
+        results = asyncio.run(agent_scoring.score_subjective_batch(items))
+        assert client.single_calls == 1
+        assert results[1] == (False, 0.4, "单题")
+        assert results[0][1] == results[2][1] == 0.8
+        assert metrics.counter_value("scoring.batch_retry_items") == 1
+
+    def test_failed_batch_falls_back_per_item(self, monkeypatch):
+        client = _use(monkeypatch, FakeClient(fail_batch=True))
+        items = [(_question(i), f"answer {i}") for i in range(1, 3)]
+        results = asyncio.run(agent_scoring.score_subjective_batch(items))
+        assert client.single_calls == 2
+        assert all(r == (False, 0.4, "单题") for r in results)
+
+    def test_empty_and_cached_answers_skip_the_model(self, monkeypatch):
+        client = _use(monkeypatch, FakeClient())
+        cache = agent_scoring.scoring_cache
+        key = cache.key(1, "cached answer", agent_scoring.SCORING_MODEL, agent_scoring.SCORING_PROMPT_VERSION)
+        asyncio.run(cache.put(key, True, 1.0, "cached"))
+
+        items = [(_question(1), "cached answer"), (_question(2), "  "), (_question(3), "a"), (_question(4), "b")]
+        results = asyncio.run(agent_scoring.score_subjective_batch(items))
+        assert results[0] == (True, 1.0, "cached")
+        assert results[1] == agent_scoring._NO_ANSWER
+        assert client.batch_sizes == [2]
+
+    def test_chunks_by_batch_size(self, monkeypatch):
+        monkeypatch.setattr(agent_scoring, "SCORING_BATCH_SIZE", 3)
+        client = _use(monkeypatch, FakeClient())
+        items = [(_question(i), f"answer {i}") for i in range(1, 8)]
+        asyncio.run(agent_scoring.score_subjective_batch(items))
+        assert client.batch_sizes == [3, 3]
+        assert client.single_calls == 1
+
+
+# ===========================================================================
+# Settle in batch mode
+# ===========================================================================
+
+
+class TestSettleBatch:
+    def test_settle_scores_session_in_one_request(self, monkeypatch):
+        client = _use(monkeypatch, FakeClient())
+        monkeypatch.setattr(deferred_scoring, "BATCH_SCORING", True)
+        answers = {
+            i: {"id": i, "session_id": "s-1", "question_id": i, "question_type": "essay",
+                "user_answer": json.dumps({"text": f"answer {i}"}), "score": None}
+            for i in range(1, 4)
+        }
+
+        async def get_session_answers(session_id):
+            return [dict(a) for a in answers.values()]
+
+        async def update_answer_score(answer_id, *, is_correct, score, agent_feedback=None):
+            answers[answer_id].update(is_correct=is_correct, score=score, agent_feedback=agent_feedback)
+            return True
+
+        async def get_question(qid):
+            return _question(qid)
+
+        monkeypatch.setattr(db, "get_session_answers", get_session_answers)
+        monkeypatch.setattr(db, "update_answer_score", update_answer_score)
+        monkeypatch.setattr(item_pool, "get_question", get_question)
+        monkeypatch.setattr(usage_buffer.usage_buffer, "add", lambda qid, ok: None)
+
+        scorer = DeferredScorer()
+        scorer.enqueue("s-1", 1, _question(1), "answer 1")  # 批量模式下不入队
+        assert scorer.pending_count() == 0
+        assert asyncio.run(scorer.settle("s-1")) == 3
+        assert client.batch_sizes == [3]
+        assert all(a["score"] == 0.8 for a in answers.values())
+
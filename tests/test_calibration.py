@@ -0,0 +1,61 @@
+"""
+IRT 题目标定 (assessment.calibration) 单元测试 — 合成作答数据，无需数据库
+"""
+
+import numpy as np
+
+from basis_expert_council.assessment import irt
+from basis_expert_council.assessment.calibration import SubjectResponses, fit_subject
+
+
+def _synthetic(n_persons=1500, n_items=20, per_person=12, seed=0):
+    rng = np.random.default_rng(seed)
+    theta = rng.normal(0, 1, n_persons)
+    a_true = rng.uniform(0.6, 2.0, n_items)
+    b_true = rng.uniform(-1.5, 1.5, n_items)
+    person = np.repeat(np.arange(n_persons), per_person).astype(np.int32)
+    item = np.concatenate([
+        rng.choice(n_items, per_person, replace=False) for _ in range(n_persons)
+    ]).astype(np.int32)
+    p = irt.probability(theta[person], a_true[item], b_true[item])
+    u = (rng.random(len(p)) < p).astype(np.float32)
+    data = SubjectResponses(
+        subject="math",
+        person=person,
+        item=item,
+        u=u,
+        item_ids=np.arange(100, 100 + n_items, dtype=np.int64),
+        n_persons=n_persons,
+        prior_difficulty=np.full(n_items, 0.5),
+        prior_discrimination=np.ones(n_items),
+    )
+    return data, a_true, b_true
+
+
+# ===========================================================================
+# EM fit
+# ===========================================================================
+
+
+class TestFitSubject:
+    def test_recovers_item_parameters(self):
+        data, a_true, b_true = _synthetic()
+        result = fit_subject(data)
+        b_hat = irt.difficulty_to_b(result.difficulty)
+        assert result.calibrated.all()
+        assert np.corrcoef(b_hat, b_true)[0, 1] > 0.95
+        assert np.corrcoef(result.discrimination, a_true)[0, 1] > 0.7
+        assert np.mean(np.abs(b_hat - b_true)) < 0.25
+
+    def test_sparse_items_keep_prior(self):
+        data, _, _ = _synthetic(n_persons=40, n_items=20, per_person=5)
+        result = fit_subject(data, min_responses=30)
+        assert not result.calibrated.any()
+        assert np.array_equal(result.difficulty, data.prior_difficulty)
+        assert np.array_equal(result.discrimination, data.prior_discrimination)
+
+    def test_log_likelihood_is_finite_and_converges(self):
+        data, _, _ = _synthetic(n_persons=800)
+        result = fit_subject(data, max_iterations=200)
+        assert result.converged
+        assert np.isfinite(result.log_likelihood)
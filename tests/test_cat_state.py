@@ -0,0 +1,83 @@
+"""
+CATState 持久化 (assessment_sessions.cat_state) 单元测试
+"""
+
+import json
+
+from basis_expert_council.assessment_engine import (
+    CATState,
+    _advance_cat_state,
+    _rebuild_cat_state,
+    compute_next_difficulty,
+)
+
+SESSION = {"subject": "math", "grade_level": "G7", "assessment_type": "quick"}
+
+
+def _answer(state: CATState, qid: int, difficulty: float, correct: bool) -> None:
+    state.answered_question_ids.append(qid)
+    state.difficulty_history.append(difficulty)
+    state.correct_history.append(correct)
+    state.question_count += 1
+    state.current_difficulty = compute_next_difficulty(state, correct)
+
+
+# ===========================================================================
+# Serialization
+# ===========================================================================
+
+
+class TestCATStateSerialization:
+    def test_round_trip(self):
+        state = CATState(max_questions=8, **SESSION)
+        for qid, d, c in [(11, 0.5, True), (12, 0.65, True), (13, 0.9, False)]:
+            _answer(state, qid, d, c)
+
+        data = json.loads(json.dumps(state.to_dict()))
+        restored = CATState.from_dict(SESSION, data, 8)
+        assert restored == state
+
+    def test_empty_state(self):
+        restored = CATState.from_dict(SESSION, CATState(**SESSION).to_dict(), 15)
+        assert restored.question_count == 0
+        assert restored.current_difficulty == 0.5
+        assert restored.answered_question_ids == []
+
+    def test_matches_history_replay(self):
+        state = CATState(max_questions=8, **SESSION)
+        answers = []
+        for qid, c in [(1, True), (2, False), (3, False), (4, True)]:
+            answers.append({"question_id": qid, "difficulty_at": state.current_difficulty, "is_correct": c})
+            _answer(state, qid, state.current_difficulty, c)
+
+        replayed = _rebuild_cat_state(SESSION, answers, 8)
+        restored = CATState.from_dict(SESSION, state.to_dict(), 8)
+        assert restored.current_difficulty == replayed.current_difficulty
+        assert restored.answered_question_ids == replayed.answered_question_ids
+        assert restored.consecutive_correct == replayed.consecutive_correct
+
+
+# ===========================================================================
+# Submit pipeline helpers
+# ===========================================================================
+
+
+class TestAdvanceCATState:
+    def test_does_not_mutate_input(self):
+        state = CATState(max_questions=3, **SESSION)
+        new_state, is_last = _advance_cat_state(state, {"id": 5, "difficulty": 0.5}, True)
+        assert state.question_count == 0 and state.answered_question_ids == []
+        assert new_state.question_count == 1 and new_state.answered_question_ids == [5]
+        assert new_state.current_difficulty > 0.5
+        assert not is_last
+
+    def test_last_question_keeps_difficulty(self):
+        state = CATState(max_questions=1, **SESSION)
+        new_state, is_last = _advance_cat_state(state, {"id": 5, "difficulty": 0.5}, False)
+        assert is_last
+        assert new_state.current_difficulty == 0.5
+
+    def test_agent_scored_counts_as_correct(self):
+        state = CATState(max_questions=3, **SESSION)
+        new_state, _ = _advance_cat_state(state, {"id": 5, "difficulty": 0.5}, None)
+        assert new_state.correct_history == [True]
@@ -0,0 +1,70 @@
+"""
+匿名会话认领 (db.claim_anonymous_sessions) 单元测试
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from basis_expert_council import db
+
+
+class FakeConn:
+    def __init__(self, claimed):
+        self.claimed = claimed
+        self.executed = []
+        self.in_tx = False
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.in_tx = True
+        yield
+        self.in_tx = False
+
+    async def fetch(self, sql, *args):
+        assert self.in_tx
+        return [{"id": sid} for sid in self.claimed]
+
+    async def execute(self, sql, *args):
+        self.executed.append((sql, args, self.in_tx))
+        return "UPDATE 0"
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+def _claim(monkeypatch, claimed):
+    conn = FakeConn(claimed)
+
+    async def pool():
+        return FakePool(conn)
+
+    monkeypatch.setattr(db, "get_pool", pool)
+    count = asyncio.run(db.claim_anonymous_sessions(7, "anon-1"))
+    return count, conn.executed
+
+
+# ===========================================================================
+# Claim rollup
+# ===========================================================================
+
+
+class TestClaimAnonymousSessions:
+    def test_claimed_answers_roll_up_and_mark_dirty(self, monkeypatch):
+        count, executed = _claim(monkeypatch, ["s-1", "s-2"])
+        assert count == 2
+        assert all(in_tx for _, _, in_tx in executed)
+        rollup = [args for sql, args, _ in executed if "user_daily_activity" in sql]
+        assert rollup == [(["s-1", "s-2"],)]
+        assert (db._MARK_PROFILE_DIRTY, (7,), True) in executed
+
+    def test_nothing_claimed_skips_rollup(self, monkeypatch):
+        count, executed = _claim(monkeypatch, [])
+        assert count == 0
+        assert not any("user_daily_activity" in sql for sql, _, _ in executed)
+        assert not any(sql == db._MARK_PROFILE_DIRTY for sql, _, _ in executed)
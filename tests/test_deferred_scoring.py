@@ -0,0 +1,137 @@
+"""
+主观题延迟评分 (assessment.deferred_scoring) 单元测试
+"""
+
+import asyncio
+
+import pytest
+
+from basis_expert_council import assessment_engine, db, metrics
+from basis_expert_council.assessment import deferred_scoring, item_pool, usage_buffer
+from basis_expert_council.assessment.deferred_scoring import DeferredScorer
+
+ESSAY = {"id": 5, "question_type": "essay", "difficulty": 0.5}
+
+
+@pytest.fixture()
+def fake_db(monkeypatch):
+    """Answers table in memory; scoring is a stub with a controllable delay."""
+    answers: dict[int, dict] = {}
+    scored: list[int] = []
+    usage: list[tuple] = []
+    delay = {"sec": 0.0}
+
+    async def fake_score(question, user_answer):
+        # 只有第一次调用（后台 worker）变慢
+        first = not delay.get("started")
+        delay["started"] = True
+        await asyncio.sleep(delay["sec"] if first else 0)
+        scored.append(question["id"])
+        return True, 0.8, "ok"
+
+    async def update_answer_score(answer_id, *, is_correct, score, agent_feedback=None):
+        row = answers[answer_id]
+        if row["score"] is not None:
+            return False
+        row.update(is_correct=is_correct, score=score, agent_feedback=agent_feedback)
+        return True
+
+    async def get_session_answers(session_id):
+        return [dict(a) for a in answers.values() if a["session_id"] == session_id]
+
+    async def get_question(qid):
+        return {**ESSAY, "id": qid}
+
+    monkeypatch.setattr(assessment_engine, "score_question_async", fake_score)
+    monkeypatch.setattr(db, "update_answer_score", update_answer_score)
+    monkeypatch.setattr(db, "get_session_answers", get_session_answers)
+    monkeypatch.setattr(item_pool, "get_question", get_question)
+    monkeypatch.setattr(usage_buffer.usage_buffer, "add", lambda qid, ok: usage.append((qid, ok)))
+    metrics.reset()
+
+    def add_answer(answer_id, session_id="s-1", question_id=5, score=None):
+        answers[answer_id] = {
+            "id": answer_id, "session_id": session_id, "question_id": question_id,
+            "question_type": "essay", "user_answer": '{"text": "..."}',
+            "is_correct": None, "score": score,
+        }
+
+    return answers, scored, usage, delay, add_answer
+
+
+# ===========================================================================
+# Opt-in flag
+# ===========================================================================
+
+
+class TestDeferrable:
+    def test_only_subjective_types_when_enabled(self, monkeypatch):
+        monkeypatch.setattr(deferred_scoring, "DEFERRED_SCORING", False)
+        assert not deferred_scoring.is_deferrable(ESSAY)
+        monkeypatch.setattr(deferred_scoring, "DEFERRED_SCORING", True)
+        assert deferred_scoring.is_deferrable(ESSAY)
+        assert not deferred_scoring.is_deferrable({"question_type": "mcq"})
+
+
+# ===========================================================================
+# Workers & settle
+# ===========================================================================
+
+
+class TestDeferredScorer:
+    def test_workers_patch_answers(self, fake_db):
+        answers, scored, usage, _, add_answer = fake_db
+        scorer = DeferredScorer(workers=2)
+
+        async def scenario():
+            for aid in (1, 2, 3):
+                add_answer(aid)
+                scorer.enqueue("s-1", aid, {**ESSAY, "id": 10 + aid}, "text")
+            assert scorer.pending_count("s-1") == 3
+            assert await scorer.settle("s-1") == 0
+            await scorer.stop()
+
+        asyncio.run(scenario())
+        assert all(a["score"] == 0.8 for a in answers.values())
+        assert sorted(scored) == [11, 12, 13]
+        assert sorted(usage) == [(11, True), (12, True), (13, True)]
+        assert scorer.pending_count() == 0
+
+    def test_settle_scores_orphans_inline(self, fake_db):
+        answers, scored, _, _, add_answer = fake_db
+        add_answer(1)
+        add_answer(2, score=0.4)
+        add_answer(3, session_id="other")
+        scorer = DeferredScorer()
+
+        assert scorer.needs_settle("s-1", asyncio.run(db.get_session_answers("s-1")))
+        assert asyncio.run(scorer.settle("s-1")) == 1
+        assert answers[1]["score"] == 0.8
+        assert answers[2]["score"] == 0.4
+        assert answers[3]["score"] is None
+        assert metrics.counter_value("deferred_scoring.reconciled") == 1
+
+    def test_settle_timeout_reconciles_without_double_patch(self, fake_db):
+        answers, scored, usage, delay, add_answer = fake_db
+        delay["sec"] = 0.05
+        scorer = DeferredScorer(workers=1)
+
+        async def scenario():
+            add_answer(1)
+            scorer.enqueue("s-1", 1, ESSAY, "text")
+            await asyncio.sleep(0)
+            reconciled = await scorer.settle("s-1", timeout=0.001)
+            await asyncio.sleep(0.1)  # 后台 worker 晚到
+            await scorer.stop()
+            return reconciled
+
+        assert asyncio.run(scenario()) == 1
+        assert metrics.counter_value("deferred_scoring.settle_timeout") == 1
+        assert answers[1]["score"] == 0.8
+        assert usage == [(5, True)]  # 只有先写入者计入使用统计
+
+    def test_nothing_to_settle(self, fake_db):
+        _, _, _, _, add_answer = fake_db
+        add_answer(1, score=1.0)
+        scorer = DeferredScorer()
+        assert not scorer.needs_settle("s-1", asyncio.run(db.get_session_answers("s-1")))
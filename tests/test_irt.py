@@ -0,0 +1,89 @@
+"""
+IRT 能力估计 (assessment.irt) 单元测试
+"""
+
+import numpy as np
+import pytest
+
+from basis_expert_council.assessment import irt
+
+
+def _simulate(theta: float, n_items: int, rng: np.random.Generator, a: float = 1.2) -> list[dict]:
+    difficulties = rng.uniform(0.05, 0.95, n_items)
+    p = irt.probability(theta, a, irt.difficulty_to_b(difficulties))
+    correct = rng.random(n_items) < p
+    return [
+        {"difficulty": float(d), "discrimination": a, "is_correct": bool(c)}
+        for d, c in zip(difficulties, correct)
+    ]
+
+
+# ===========================================================================
+# Scale mapping
+# ===========================================================================
+
+
+class TestScale:
+    def test_round_trip(self):
+        for ability in (0.0, 0.25, 0.5, 0.9):
+            assert irt.theta_to_ability(irt.ability_to_theta(ability)) == pytest.approx(ability)
+
+    def test_difficulty_matches_ability_scale(self):
+        # 能力等于题目难度时答对概率为 50%（2PL）
+        b = irt.difficulty_to_b(0.7)
+        assert irt.probability(irt.ability_to_theta(0.7), 1.0, b) == pytest.approx(0.5)
+
+
+# ===========================================================================
+# Estimation
+# ===========================================================================
+
+
+class TestEstimation:
+    def test_more_correct_means_higher_ability(self):
+        items = [{"difficulty": 0.5}] * 6
+        low = irt.estimate([{**q, "is_correct": i < 2} for i, q in enumerate(items)])
+        high = irt.estimate([{**q, "is_correct": i < 5} for i, q in enumerate(items)])
+        assert high.ability > 0.5 > low.ability
+
+    def test_unscored_answers_are_ignored(self):
+        est = irt.estimate([{"difficulty": 0.5, "is_correct": None}])
+        assert est.n_items == 0
+        assert est.theta == pytest.approx(0.0, abs=1e-9)
+
+    def test_partial_credit_from_score(self):
+        est = irt.estimate([{"difficulty": 0.5, "is_correct": None, "score": 0.5}])
+        assert est.n_items == 1
+        assert est.theta == pytest.approx(0.0, abs=1e-6)
+
+    def test_batch_matches_single(self):
+        rng = np.random.default_rng(3)
+        sessions = [_simulate(t, n, rng) for t, n in [(-1.0, 5), (0.5, 12), (2.0, 20)]]
+        batch = irt.estimate_batch(sessions)
+        for answers, est in zip(sessions, batch):
+            assert irt.estimate(answers).theta == pytest.approx(est.theta)
+
+    @pytest.mark.parametrize("method", ["eap", "mle"])
+    def test_recovers_theta(self, method):
+        rng = np.random.default_rng(11)
+        true = np.linspace(-2, 2, 40)
+        sessions = [_simulate(t, 60, rng) for t in true]
+        est = np.array([e.theta for e in irt.estimate_batch(sessions, method=method)])
+        assert np.corrcoef(true, est)[0, 1] > 0.9
+        assert np.mean(np.abs(est - true)) < 0.5
+
+    def test_se_shrinks_with_more_items(self):
+        rng = np.random.default_rng(5)
+        short = irt.estimate(_simulate(0.0, 5, rng))
+        long = irt.estimate(_simulate(0.0, 40, rng))
+        assert long.se < short.se
+
+    def test_mle_all_correct_hits_bound(self):
+        est = irt.estimate([{"difficulty": 0.5, "is_correct": True}] * 4, method="mle")
+        assert est.theta == irt.THETA_MAX
+
+    def test_3pl_guessing_lowers_credit_for_correct_mcq(self):
+        answers = [{"difficulty": 0.5, "is_correct": True, "question_type": "mcq"}] * 3
+        two_pl = irt.estimate(answers)
+        three_pl = irt.estimate(answers, model="3pl")
+        assert three_pl.theta < two_pl.theta
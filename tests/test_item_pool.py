@@ -0,0 +1,115 @@
+"""
+进程内题库索引 (assessment.item_pool) 单元测试
+验证内存 fallback 级联与 db.find_next_question 的 SQL 语义一致，无需数据库。
+"""
+
+import random
+
+import pytest
+
+from basis_expert_council.assessment.item_pool import ItemPoolIndex
+
+
+def _q(qid, difficulty, *, subject="math", grade="G7", status="approved", topic="algebra"):
+    return {
+        "id": qid,
+        "subject": subject,
+        "grade_level": grade,
+        "difficulty": difficulty,
+        "review_status": status,
+        "topic": topic,
+        "question_type": "mcq",
+    }
+
+
+@pytest.fixture()
+def pool():
+    index = ItemPoolIndex(ttl=0, rng=random.Random(7))
+    index.load([
+        _q(1, 0.10),
+        _q(2, 0.45),
+        _q(3, 0.50),
+        _q(4, 0.55),
+        _q(5, 0.90),
+        _q(6, 0.50, status="archived"),
+        _q(7, 0.50, status=None),
+        _q(8, 0.40, grade="G6"),
+        _q(9, 0.70, grade="G8"),
+        _q(10, 0.20, grade="G3", status="reviewed"),
+        _q(11, 0.50, subject="english"),
+    ])
+    return index
+
+
+# ===========================================================================
+# Selection cascade
+# ===========================================================================
+
+
+class TestSelectionCascade:
+    def test_level1_window(self, pool: ItemPoolIndex):
+        for _ in range(20):
+            q = pool.select("math", "G7", 0.5, [], tolerance=0.1)
+            assert q["id"] in {2, 3, 4, 7}
+
+    def test_exclude_ids(self, pool: ItemPoolIndex):
+        for _ in range(20):
+            q = pool.select("math", "G7", 0.5, [2, 3, 7], tolerance=0.1)
+            assert q["id"] == 4
+
+    def test_archived_never_selected_in_grade(self, pool: ItemPoolIndex):
+        seen = {pool.select("math", "G7", 0.5, [], tolerance=0.1)["id"] for _ in range(50)}
+        assert 6 not in seen
+
+    def test_level2_widened_window(self, pool: ItemPoolIndex):
+        for _ in range(20):
+            q = pool.select("math", "G7", 0.5, [3, 7], tolerance=0.01)
+            assert q["id"] in {2, 4}
+
+    def test_level3_any_difficulty(self, pool: ItemPoolIndex):
+        # 0.10 / 0.90 both fall outside ±0.35 of 0.5
+        q = pool.select("math", "G7", 0.5, [2, 3, 4, 7], tolerance=0.1)
+        assert q["id"] in {1, 5}
+
+    def test_level4_adjacent_grade_nearest(self, pool: ItemPoolIndex):
+        q = pool.select("math", "G7", 0.45, [1, 2, 3, 4, 5, 7])
+        assert q["id"] == 8
+
+    def test_level5_subject_wide_any_status(self, pool: ItemPoolIndex):
+        exclude = [1, 2, 3, 4, 5, 7, 8, 9]
+        q = pool.select("math", "G7", 0.5, exclude)
+        assert q["id"] == 6
+
+    def test_exhausted_subject(self, pool: ItemPoolIndex):
+        assert pool.select("english", "G7", 0.5, [11]) is None
+        assert pool.select("physics", "G7", 0.5, []) is None
+
+
+# ===========================================================================
+# Refresh hooks
+# ===========================================================================
+
+
+class TestRefresh:
+    def test_upsert_moves_question(self, pool: ItemPoolIndex):
+        version = pool.version
+        pool.upsert(_q(3, 0.95))
+        assert pool.version > version
+        assert pool.get(3)["difficulty"] == 0.95
+        q = pool.select("math", "G7", 0.95, [5], tolerance=0.01)
+        assert q["id"] == 3
+
+    def test_upsert_archive_removes_from_grade_bucket(self, pool: ItemPoolIndex):
+        pool.upsert(_q(4, 0.55, status="archived"))
+        seen = {pool.select("math", "G7", 0.55, [], tolerance=0.05)["id"] for _ in range(30)}
+        assert 4 not in seen
+
+    def test_remove(self, pool: ItemPoolIndex):
+        pool.remove(11)
+        assert pool.get(11) is None
+        assert pool.select("english", "G7", 0.5, []) is None
+
+    def test_invalidate_marks_stale(self, pool: ItemPoolIndex):
+        assert pool.is_fresh
+        pool.invalidate()
+        assert not pool.is_fresh
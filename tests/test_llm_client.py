@@ -0,0 +1,224 @@
+"""
+主观题评分 LLM 客户端 (assessment.llm_client) 单元测试
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from basis_expert_council import db, metrics
+from basis_expert_council.assessment import agent_scoring, llm_client
+from basis_expert_council.assessment.llm_client import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ScoringClient,
+    ScoringUnavailable,
+)
+from basis_expert_council.assessment.scoring_cache import ScoringCache
+
+QUESTION = {"id": 1, "question_type": "short_answer", "content_zh": {"stem": "为什么天空是蓝色的？"}}
+ANSWER = "因为瑞利散射使短波长的蓝光散射更强，所以天空呈现蓝色。" * 2
+
+
+def _ok(content='{"score": 0.8, "is_correct": true, "feedback_zh": "好", "feedback_en": "Good"}'):
+    return httpx.Response(200, json={
+        "choices": [{"message": {"content": content}}],
+        "usage": {"prompt_tokens": 120, "completion_tokens": 30},
+    })
+
+
+@pytest.fixture(autouse=True)
+def _no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_client, "_backoff", lambda attempt, retry_after=None: 0)
+    metrics.reset()
+
+
+@pytest.fixture(autouse=True)
+def _empty_scoring_cache(monkeypatch):
+    async def miss(*key):
+        return None
+
+    async def noop(*key, **kwargs):
+        return None
+
+    monkeypatch.setattr(db, "get_cached_score", miss)
+    monkeypatch.setattr(db, "put_cached_score", noop)
+    monkeypatch.setattr(agent_scoring, "scoring_cache", ScoringCache())
+
+
+def _client(handler, **kwargs) -> ScoringClient:
+    return ScoringClient(base_url="http://llm.test/v1", transport=httpx.MockTransport(handler), **kwargs)
+
+
+# ===========================================================================
+# Circuit breaker
+# ===========================================================================
+
+
+class TestCircuitBreaker:
+    def test_opens_after_threshold_and_probes_once(self, monkeypatch):
+        b = CircuitBreaker(threshold=2, reset_after=10)
+        b.record_failure()
+        assert b.allow()
+        b.record_failure()
+        assert b.state == "open" and not b.allow()
+
+        b.opened_at -= 10
+        assert b.state == "half_open"
+        assert b.allow()
+        assert not b.allow()  # 只放行一个探测
+        b.record_failure()
+        assert b.state == "open"
+
+        b.opened_at -= 10
+        assert b.allow()
+        b.record_success()
+        assert b.state == "closed" and b.allow()
+
+
+# ===========================================================================
+# Client
+# ===========================================================================
+
+
+class TestScoringClient:
+    def test_reuses_connection_pool_and_records_tokens(self):
+        seen = []
+
+        def handler(request):
+            seen.append(json.loads(request.content))
+            return _ok("hello")
+
+        client = _client(handler)
+
+        async def scenario():
+            first = await client.chat([{"role": "user", "content": "a"}], model="m")
+            pooled = client._client
+            second = await client.chat([{"role": "user", "content": "b"}], model="m")
+            assert client._client is pooled
+            await client.aclose()
+            return first, second
+
+        assert asyncio.run(scenario()) == ("hello", "hello")
+        assert [p["model"] for p in seen] == ["m", "m"]
+        assert metrics.counter_value("scoring.tokens", kind="prompt") == 240
+        assert metrics.counter_value("scoring.requests", status="ok") == 2
+
+    def test_retries_transient_errors(self):
+        statuses = iter([503, 429, 200])
+
+        def handler(request):
+            status = next(statuses)
+            return _ok("done") if status == 200 else httpx.Response(status)
+
+        client = _client(handler, retries=2)
+        assert asyncio.run(client.chat([], model="m")) == "done"
+        assert metrics.counter_value("scoring.retries", model="m") == 2
+
+    def test_retries_stop_at_overall_deadline(self, monkeypatch):
+        calls, timeouts = [], []
+
+        async def slow_fail(request):
+            calls.append(1)
+            timeouts.append(request.extensions["timeout"]["read"])
+            await asyncio.sleep(0.15)
+            return httpx.Response(503)
+
+        monkeypatch.setattr(llm_client, "_backoff", lambda attempt, retry_after=None: 0.05)
+        client = _client(slow_fail, retries=5, timeout=10, deadline=0.4)
+
+        async def scenario():
+            t0 = asyncio.get_running_loop().time()
+            with pytest.raises(ScoringUnavailable):
+                await client.chat([], model="m")
+            return asyncio.get_running_loop().time() - t0
+
+        assert asyncio.run(scenario()) < 0.5
+        assert len(calls) == 2
+        # 每次请求的超时不超过剩余时限
+        assert timeouts[0] <= 0.4 and timeouts[1] < timeouts[0]
+
+    def test_client_error_is_not_retried(self):
+        calls = []
+
+        def handler(request):
+            calls.append(1)
+            return httpx.Response(400, text="bad request")
+
+        client = _client(handler, retries=3)
+        with pytest.raises(ScoringUnavailable):
+            asyncio.run(client.chat([], model="m"))
+        assert len(calls) == 1
+        assert client.breaker("m").failures == 0
+
+    def test_breaker_short_circuits_after_failures(self):
+        calls = []
+
+        def handler(request):
+            calls.append(1)
+            raise httpx.ConnectError("refused")
+
+        client = _client(handler, retries=0)
+        client.breakers["m"] = CircuitBreaker(threshold=2, reset_after=60)
+
+        async def scenario():
+            for _ in range(2):
+                with pytest.raises(ScoringUnavailable):
+                    await client.chat([], model="m")
+            with pytest.raises(CircuitOpenError):
+                await client.chat([], model="m")
+
+        asyncio.run(scenario())
+        assert len(calls) == 2
+        assert metrics.counter_value("scoring.circuit_open", model="m") == 1
+
+    def test_concurrency_is_capped(self):
+        in_flight = 0
+        peak = 0
+
+        async def handler(request):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return _ok("x")
+
+        client = _client(handler, max_concurrency=8, model_concurrency=3)
+
+        async def scenario():
+            await asyncio.gather(*(client.chat([], model="m") for _ in range(12)))
+
+        asyncio.run(scenario())
+        assert peak == 3
+
+    def test_rebinds_across_event_loops(self):
+        client = _client(lambda request: _ok("x"))
+        assert asyncio.run(client.chat([], model="m")) == "x"
+        assert asyncio.run(client.chat([], model="m")) == "x"
+
+
+# ===========================================================================
+# score_subjective_question
+# ===========================================================================
+
+
+class TestScoreSubjective:
+    def test_scores_through_shared_client(self, monkeypatch):
+        monkeypatch.setattr(agent_scoring, "scoring_client", _client(lambda request: _ok()))
+        is_correct, score, feedback = asyncio.run(agent_scoring.score_subjective_question(QUESTION, ANSWER))
+        assert is_correct and score == 0.8
+        assert "Good" in feedback
+
+    def test_falls_back_when_unavailable(self, monkeypatch):
+        client = _client(lambda request: httpx.Response(500), retries=0)
+        client.breakers[agent_scoring.SCORING_MODEL] = CircuitBreaker(threshold=1, reset_after=60)
+        monkeypatch.setattr(agent_scoring, "scoring_client", client)
+
+        expected = agent_scoring._fallback_score(QUESTION, ANSWER)
+        assert asyncio.run(agent_scoring.score_subjective_question(QUESTION, ANSWER)) == expected
+        assert asyncio.run(agent_scoring.score_subjective_question(QUESTION, ANSWER)) == expected
+        assert metrics.counter_value("scoring.circuit_open", model=agent_scoring.SCORING_MODEL) == 1
+        assert metrics.counter_value("scoring.fallback", reason="unavailable") == 2
@@ -0,0 +1,155 @@
+"""
+本地 LLM 替身服务 (llm_stub) 单元测试
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from basis_expert_council import db, metrics
+from basis_expert_council.assessment import agent_scoring, llm_client
+from basis_expert_council.assessment.llm_client import ScoringClient, ScoringUnavailable
+from basis_expert_council.assessment.scoring_cache import ScoringCache
+from basis_expert_council.llm_stub import StubConfig, canned_completion, create_app
+
+QUESTION = {"id": 1, "question_type": "essay", "content_zh": {"stem": "为什么天空是蓝色的？"}}
+
+
+def _fast(**overrides) -> StubConfig:
+    return StubConfig(latency="fixed", latency_ms=0, tokens_per_sec=0, **overrides)
+
+
+def _http(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://stub")
+
+
+@pytest.fixture(autouse=True)
+def _isolated(monkeypatch):
+    async def miss(*key):
+        return None
+
+    async def noop(*key, **kwargs):
+        return None
+
+    monkeypatch.setattr(db, "get_cached_score", miss)
+    monkeypatch.setattr(db, "put_cached_score", noop)
+    monkeypatch.setattr(agent_scoring, "scoring_cache", ScoringCache())
+    monkeypatch.setattr(llm_client, "_backoff", lambda attempt, retry_after=None: 0)
+    metrics.reset()
+
+
+def _use_stub(monkeypatch, app, **kwargs) -> ScoringClient:
+    client = ScoringClient(base_url="http://stub/v1", transport=httpx.ASGITransport(app=app), **kwargs)
+    monkeypatch.setattr(agent_scoring, "scoring_client", client)
+    return client
+
+
+# ===========================================================================
+# Canned responses
+# ===========================================================================
+
+
+class TestCannedCompletion:
+    def test_scoring_prompt_is_deterministic(self):
+        messages = [{"role": "user", "content": agent_scoring._build_scoring_prompt(QUESTION, "瑞利散射")}]
+        kind, content = canned_completion(messages)
+        assert kind == "scoring"
+        assert canned_completion(messages)[1] == content
+        assert 0.0 <= json.loads(content)["score"] <= 1.0
+
+    def test_request_kinds(self):
+        batch = agent_scoring._build_batch_scoring_prompt([(QUESTION, "a"), (QUESTION, "b")])
+        assert canned_completion([{"role": "user", "content": batch}])[0] == "batch_scoring"
+        image = [{"role": "user", "content": [{"type": "image_url", "image_url": {"url": "data:,"}}]}]
+        assert canned_completion(image)[0] == "vision"
+        assert canned_completion([{"role": "user", "content": "hi"}])[0] == "chat"
+
+    def test_tagging_returns_one_entry_per_question(self):
+        prompt = 'Return "tagged".\n```json\n[{"index": 0}, {"index": 1}, {"index": 2}]\n```'
+        kind, content = canned_completion([{"role": "user", "content": prompt}])
+        assert kind == "tagging"
+        assert len(json.loads(content)["tagged"]) == 3
+
+
+# ===========================================================================
+# Through the real clients
+# ===========================================================================
+
+
+class TestScoringAgainstStub:
+    def test_single_and_batch(self, monkeypatch):
+        app = create_app(_fast())
+        _use_stub(monkeypatch, app)
+
+        async def scenario():
+            single = await agent_scoring.score_subjective_question(QUESTION, "瑞利散射")
+            batch = await agent_scoring.score_subjective_batch([(QUESTION, f"答案 {i}") for i in range(3)])
+            return single, batch
+
+        single, batch = asyncio.run(scenario())
+        assert single[2].startswith("（模拟评分）")
+        assert len(batch) == 3
+        assert app.state.stub.stats["by_kind"] == {"scoring": 1, "batch_scoring": 1}
+        assert metrics.counter_value("scoring.batch_retry_items") == 0
+
+    def test_injected_errors_are_retried_then_surface(self, monkeypatch):
+        app = create_app(_fast(error_rate=1.0, error_statuses=(500,)))
+        client = _use_stub(monkeypatch, app, retries=2)
+        messages = [{"role": "user", "content": "hi"}]
+        with pytest.raises(ScoringUnavailable):
+            asyncio.run(client.chat(messages))
+        assert app.state.stub.stats["by_status"] == {"500": 3}
+
+    def test_over_concurrency_limit_is_rejected(self):
+        app = create_app(StubConfig(latency="fixed", latency_ms=50, tokens_per_sec=0, max_concurrency=2))
+
+        async def scenario():
+            async with _http(app) as http:
+                body = {"messages": [{"role": "user", "content": "hi"}]}
+                return await asyncio.gather(*(http.post("/v1/chat/completions", json=body) for _ in range(4)))
+
+        statuses = sorted(r.status_code for r in asyncio.run(scenario()))
+        assert statuses == [200, 200, 429, 429]
+        assert app.state.stub.stats["peak_in_flight"] == 2
+
+
+# ===========================================================================
+# HTTP surface
+# ===========================================================================
+
+
+class TestStubEndpoints:
+    def test_stream(self):
+        app = create_app(_fast())
+
+        async def scenario():
+            async with _http(app) as http:
+                body = {"messages": [{"role": "user", "content": "hi"}], "stream": True,
+                        "stream_options": {"include_usage": True}}
+                resp = await http.post("/v1/chat/completions", json=body)
+                return [line[6:] for line in resp.text.splitlines() if line.startswith("data: ")]
+
+        events = asyncio.run(scenario())
+        assert events[-1] == "[DONE]"
+        chunks = [json.loads(e) for e in events[:-1]]
+        text = "".join(c["choices"][0]["delta"].get("content", "") for c in chunks if c["choices"])
+        assert text == canned_completion([{"role": "user", "content": "hi"}])[1]
+        assert chunks[-1]["usage"]["completion_tokens"] > 0
+
+    def test_config_and_langgraph_runs(self):
+        app = create_app(_fast())
+
+        async def scenario():
+            async with _http(app) as http:
+                bad = await http.post("/_stub/config", json={"nope": 1})
+                ok = await http.post("/_stub/config", json={"latency": "uniform", "error_statuses": [503]})
+                run = await http.post("/runs", json={"input": {"messages": [{"role": "user", "content": "分析"}]}})
+                return bad, ok, run
+
+        bad, ok, run = asyncio.run(scenario())
+        assert bad.status_code == 400
+        assert ok.json()["latency"] == "uniform"
+        assert app.state.stub.config.error_statuses == (503,)
+        assert run.json()["output"]["messages"][-1]["role"] == "assistant"
@@ -0,0 +1,58 @@
+"""
+运维命令 (maintenance) 单元测试
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date
+
+from basis_expert_council import db, maintenance
+
+
+class FakeConn:
+    def __init__(self, user_ids):
+        self.user_ids = user_ids
+
+    async def fetch(self, sql, last_id, limit):
+        return [{"id": u} for u in self.user_ids if u > last_id][:limit]
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+# ===========================================================================
+# backfill-activity
+# ===========================================================================
+
+
+class TestBackfillActivity:
+    def test_keyset_batches(self, monkeypatch):
+        batches = []
+
+        async def noop():
+            return None
+
+        async def pool():
+            return FakePool(FakeConn([2, 3, 5, 8, 13]))
+
+        async def backfill(user_ids, since):
+            batches.append((user_ids, since))
+            return len(user_ids) * 2
+
+        monkeypatch.setattr(db, "init_schema", noop)
+        monkeypatch.setattr(db, "get_pool", pool)
+        monkeypatch.setattr(db, "backfill_daily_activity", backfill)
+        stats = asyncio.run(maintenance.backfill_activity(date(2026, 1, 1), batch=2))
+        assert [ids for ids, _ in batches] == [[2, 3], [5, 8], [13]]
+        assert batches[0][1] == date(2026, 1, 1)
+        assert (stats["users"], stats["rows"]) == (5, 10)
+
+    def test_parser(self):
+        args = maintenance.build_parser().parse_args(["backfill-activity", "--since", "2026-03-01"])
+        assert (args.since, args.batch) == (date(2026, 3, 1), 500)
@@ -0,0 +1,144 @@
+"""
+客观题答案匹配器 (assessment.matchers) 单元测试
+"""
+
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from basis_expert_council import assessment_engine as eng
+from basis_expert_council.assessment.matchers import (
+    FillInMatcher,
+    MatcherCache,
+    McqMatcher,
+    parse_number,
+)
+
+MCQ_CONTENT = {"options": ["A. 3", "B. 6", "C. 7", "D. 8", "E. 9"], "answer": "E"}
+
+
+# ===========================================================================
+# parse_number
+# ===========================================================================
+
+
+class TestParseNumber:
+    @pytest.mark.parametrize("text, expected", [
+        ("42", (42.0, "")),
+        ("-3.5", (-3.5, "")),
+        ("1,250", (1250.0, "")),
+        ("3/4", (0.75, "")),
+        ("1 1/2", (1.5, "")),
+        (" 12 CM ", (12.0, "cm")),
+        ("5米", (5.0, "米")),
+    ])
+    def test_numbers(self, text, expected):
+        assert parse_number(text) == expected
+
+    @pytest.mark.parametrize("text", ["abc", "", "1/0", "x2"])
+    def test_not_numeric(self, text):
+        assert parse_number(text) is None
+
+
+# ===========================================================================
+# McqMatcher
+# ===========================================================================
+
+
+class TestMcqMatcher:
+    @pytest.mark.parametrize("answer", ["E", "e", "E.", "(E)", "（E）", {"selected": "e"}, '{"selected": "E"}'])
+    def test_key_variants(self, answer):
+        assert McqMatcher(MCQ_CONTENT).match(answer)
+
+    def test_index_and_option_text(self):
+        m = McqMatcher(MCQ_CONTENT)
+        assert m.match({"selected": 4})
+        assert not m.match({"selected": 5})
+        assert m.match("9")
+        assert not m.match("8")
+
+    def test_wrong_key(self):
+        assert not McqMatcher(MCQ_CONTENT).match("B")
+
+    def test_duplicate_option_text_is_not_matched(self):
+        m = McqMatcher({"options": ["A. yes", "B. yes", "C. no"], "answer": "A"})
+        assert not m.match("yes")
+
+
+# ===========================================================================
+# FillInMatcher
+# ===========================================================================
+
+
+class TestFillInMatcher:
+    def test_alternatives(self):
+        m = FillInMatcher({"answer": "Paris|paris  city"})
+        assert m.match({"text": "  PARIS "})
+        assert m.match("Paris City")
+        assert not m.match("London")
+
+    def test_numeric_equivalents(self):
+        m = FillInMatcher({"answer": "0.75"})
+        assert m.match("3/4")
+        assert m.match(".75")
+        assert not m.match("0.76")
+        assert FillInMatcher({"answer": "1250"}).match("1,250")
+
+    def test_tolerance(self):
+        m = FillInMatcher({"answer": "3.14", "tolerance": 0.01})
+        assert m.match("3.1416")
+        assert not m.match("3.2")
+
+    def test_units(self):
+        m = FillInMatcher({"answer": "12 cm"})
+        assert m.match("12cm")
+        assert m.match("12")
+        assert not m.match("12 m")
+
+    def test_algebraic_answers_stay_textual(self):
+        m = FillInMatcher({"answer": "2x"})
+        assert m.match("2X")
+        assert not m.match("2")
+
+
+# ===========================================================================
+# MatcherCache / score_question
+# ===========================================================================
+
+
+def _row(answer, updated_at):
+    return {"id": 7, "question_type": "fill_in", "content_en": json.dumps({"answer": answer}),
+            "updated_at": updated_at, "version": 1}
+
+
+class TestMatcherCache:
+    def test_recompiles_when_question_changes(self):
+        cache = MatcherCache()
+        t1 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        assert cache.get(_row("4", t1)).match("4")
+        assert len(cache) == 1
+        # 同一 id、旧版本号命中缓存；更新后按新内容判分
+        assert cache.get(_row("5", t1)).match("4")
+        assert cache.get(_row("5", datetime(2026, 2, 1, tzinfo=timezone.utc))).match("5")
+
+    def test_rows_without_version_are_not_cached(self):
+        cache = MatcherCache()
+        cache.get({"id": 1, "question_type": "mcq", "content_en": MCQ_CONTENT})
+        assert len(cache) == 0
+
+    def test_lru_bound(self):
+        cache = MatcherCache(maxsize=2)
+        for qid in range(3):
+            cache.compile({"id": qid, "question_type": "mcq", "content_en": MCQ_CONTENT, "version": 1})
+        assert len(cache) == 2
+
+
+class TestScoreQuestion:
+    def test_rule_types(self):
+        mcq = {"id": 101, "question_type": "mcq", "content_en": json.dumps(MCQ_CONTENT), "version": 1}
+        fill = {"id": 102, "question_type": "fill_in", "content_zh": {"answer": "3/4"}, "version": 1}
+        assert eng.score_question(mcq, {"selected": "E"}) == (True, 1.0)
+        assert eng.score_question(mcq, {"selected": "A"}) == (False, 0.0)
+        assert eng.score_question(fill, {"text": "0.75"}) == (True, 1.0)
+        assert eng.score_question(fill, None) == (False, 0.0)
@@ -0,0 +1,70 @@
+"""
+记忆工具 (memory_tools) 单元测试 — 写入成功后标脏学力档案
+"""
+
+import pytest
+
+from basis_expert_council import memory_tools
+
+CONFIG = {"configurable": {"user_id": "uid-1"}}
+
+
+class FakeMemory:
+    def __init__(self, fail_on=()):
+        self.fail_on = set(fail_on)
+        self.added = []
+
+    def add(self, messages, user_id, metadata):
+        if messages in self.fail_on:
+            raise RuntimeError("mem0 down")
+        self.added.append(messages)
+        return {"results": [{"id": str(len(self.added)), "memory": messages}]}
+
+
+@pytest.fixture()
+def marks(monkeypatch):
+    marked = []
+    monkeypatch.setattr(memory_tools, "_mark_profile_dirty", marked.append)
+    return marked
+
+
+# ===========================================================================
+# Profile dirty marks
+# ===========================================================================
+
+
+class TestMarkProfileDirty:
+    def test_remember_fact_marks_dirty(self, monkeypatch, marks):
+        monkeypatch.setattr(memory_tools, "get_memory", lambda: FakeMemory())
+        out = memory_tools.remember_fact.func(
+            content="目标 AP Calc 5 分", category="goal", config=CONFIG,
+        )
+        assert "已记住 1 条" in out
+        assert marks == ["uid-1"]
+
+    def test_failed_add_does_not_mark(self, monkeypatch, marks):
+        monkeypatch.setattr(memory_tools, "get_memory", lambda: FakeMemory(fail_on={"x"}))
+        memory_tools.remember_fact.func(content="x", category="goal", config=CONFIG)
+        assert marks == []
+
+    def test_batch_marks_once(self, monkeypatch, marks):
+        monkeypatch.setattr(memory_tools, "get_memory", lambda: FakeMemory(fail_on={"b"}))
+        items = [{"content": c, "category": "grade"} for c in ("a", "b", "c")]
+        out = memory_tools.batch_remember.func(items=items, config=CONFIG)
+        assert "成功 2 条" in out and "失败 1 条" in out
+        assert marks == ["uid-1"]
+
+    def test_batch_all_failed_does_not_mark(self, monkeypatch, marks):
+        monkeypatch.setattr(memory_tools, "get_memory", lambda: FakeMemory(fail_on={"a"}))
+        items = [{"content": "a", "category": "grade"}]
+        memory_tools.batch_remember.func(items=items, config=CONFIG)
+        assert marks == []
+
+    def test_mark_failure_is_logged_not_raised(self, monkeypatch):
+        import asyncpg
+
+        async def refuse(*args, **kwargs):
+            raise OSError("connection refused")
+
+        monkeypatch.setattr(asyncpg, "connect", refuse)
+        memory_tools._mark_profile_dirty("uid-1")
@@ -0,0 +1,120 @@
+"""
+预取 (assessment.prefetch) 与进程内指标 (metrics) 单元测试
+"""
+
+import asyncio
+import random
+
+import pytest
+
+from basis_expert_council import metrics
+from basis_expert_council.assessment import item_pool as item_pool_module
+from basis_expert_council.assessment import prefetch, selection
+from basis_expert_council.assessment.item_pool import ItemPoolIndex
+from basis_expert_council.assessment.prefetch import PrefetchCache
+from basis_expert_council.assessment_engine import CATState, _advance_cat_state
+
+SESSION = {"id": "s-1", "subject": "math", "grade_level": "G7"}
+
+
+def _q(qid, difficulty):
+    return {
+        "id": qid, "subject": "math", "grade_level": "G7", "difficulty": difficulty,
+        "discrimination": 1.0, "review_status": "approved", "topic": "algebra",
+        "question_type": "mcq",
+    }
+
+
+@pytest.fixture()
+def pool(monkeypatch):
+    index = ItemPoolIndex(ttl=0, rng=random.Random(1))
+    index.load([_q(i, d) for i, d in enumerate([0.1, 0.3, 0.5, 0.7, 0.9], start=1)])
+    for module in (item_pool_module, selection, prefetch):
+        monkeypatch.setattr(module, "item_pool", index)
+    metrics.reset()
+    return index
+
+
+def _state():
+    return CATState(subject="math", grade_level="G7", assessment_type="pre_admission", max_questions=20)
+
+
+# ===========================================================================
+# Prefetch cache
+# ===========================================================================
+
+
+class TestPrefetchCache:
+    def test_hit_matches_direct_advance(self, pool):
+        cache = PrefetchCache()
+        state, question = _state(), pool.get(3)
+        asyncio.run(cache.prefetch(SESSION, state, question))
+
+        new_state, next_q, is_last = cache.take("s-1", 3, 0, False)
+        expected, _ = _advance_cat_state(state, question, False)
+        assert new_state == expected
+        assert next_q["difficulty"] < 0.5
+        assert not is_last
+        assert metrics.counter_value("prefetch.hit") == 1
+
+    def test_entry_is_single_use(self, pool):
+        cache = PrefetchCache()
+        asyncio.run(cache.prefetch(SESSION, _state(), pool.get(3)))
+        assert cache.take("s-1", 3, 0, True) is not None
+        assert cache.take("s-1", 3, 0, True) is None
+        assert metrics.counter_value("prefetch.miss", reason="absent") == 1
+
+    def test_pool_change_invalidates(self, pool):
+        cache = PrefetchCache()
+        asyncio.run(cache.prefetch(SESSION, _state(), pool.get(3)))
+        pool.upsert(_q(4, 0.95))
+        assert cache.take("s-1", 3, 0, True) is None
+        assert metrics.counter_value("prefetch.miss", reason="pool_changed") == 1
+
+    def test_different_question_misses(self, pool):
+        cache = PrefetchCache()
+        asyncio.run(cache.prefetch(SESSION, _state(), pool.get(3)))
+        assert cache.take("s-1", 2, 0, True) is None
+        assert metrics.counter_value("prefetch.miss", reason="mismatch") == 1
+
+    def test_lru_bound(self, pool):
+        cache = PrefetchCache(maxsize=2)
+        for sid in ("a", "b", "c"):
+            asyncio.run(cache.prefetch({**SESSION, "id": sid}, _state(), pool.get(3)))
+        assert len(cache) == 2
+        assert cache.take("a", 3, 0, True) is None
+
+    def test_scheduled_task_is_held_until_done(self, pool):
+        cache = PrefetchCache()
+
+        async def run():
+            cache.schedule(SESSION, _state(), pool.get(3))
+            assert len(prefetch._background) == 1
+            await asyncio.gather(*prefetch._background)
+            await asyncio.sleep(0)
+
+        asyncio.run(run())
+        assert not prefetch._background
+        assert cache.take("s-1", 3, 0, True) is not None
+
+
+# ===========================================================================
+# Metrics registry
+# ===========================================================================
+
+
+class TestMetrics:
+    def test_snapshot(self):
+        metrics.reset()
+        metrics.incr("x")
+        metrics.incr("x", 2)
+        metrics.incr("y", kind="a")
+        metrics.gauge("g", 5)
+        for v in range(1, 101):
+            metrics.observe("t", v)
+        snap = metrics.snapshot()
+        assert snap["counters"] == {"x": 3, "y{kind=a}": 1}
+        assert snap["gauges"] == {"g": 5}
+        assert snap["timings"]["t"]["count"] == 100
+        assert snap["timings"]["t"]["p50"] == 51
+        assert snap["timings"]["t"]["max"] == 100
@@ -0,0 +1,77 @@
+"""
+学力档案定时刷新调度 (profile_refresh) 单元测试
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from basis_expert_council import academic_profile, db, metrics
+from basis_expert_council.profile_refresh import ProfileRefreshScheduler
+
+
+class FakeDb:
+    def __init__(self, dirty: list[int], held: set[int] = frozenset()):
+        self.dirty = dirty
+        self.held = held
+        self.computed: list[int] = []
+        self.in_flight = 0
+        self.peak = 0
+
+    @asynccontextmanager
+    async def try_advisory_lock(self, namespace, shard):
+        yield shard not in self.held
+
+    async def get_profiles_to_refresh(self, shards, shard):
+        return [u for u in self.dirty if u % shards == shard and u not in self.computed]
+
+    async def compute(self, user_id):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        if user_id == 13:
+            raise RuntimeError("boom")
+        self.computed.append(user_id)
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeDb(dirty=list(range(1, 21)))
+    monkeypatch.setattr(db, "try_advisory_lock", fake.try_advisory_lock)
+    monkeypatch.setattr(db, "get_profiles_to_refresh", fake.get_profiles_to_refresh)
+    monkeypatch.setattr(academic_profile, "compute_academic_profile", fake.compute)
+    metrics.reset()
+    return fake
+
+
+# ===========================================================================
+# Scheduling
+# ===========================================================================
+
+
+class TestProfileRefresh:
+    def test_refreshes_dirty_users_with_bounded_concurrency(self, fake):
+        stats = asyncio.run(ProfileRefreshScheduler(concurrency=3, shards=2).run())
+        assert sorted(fake.computed) == [u for u in range(1, 21) if u != 13]
+        assert fake.peak == 3
+        assert (stats["users"], stats["failed"], stats["shards"]) == (19, 1, 2)
+        assert metrics.counter_value("profile_refresh.users") == 19
+        assert metrics.counter_value("profile_refresh.failed") == 1
+
+    def test_shards_held_by_other_replicas_are_skipped(self, fake):
+        fake.held = {0}
+        stats = asyncio.run(ProfileRefreshScheduler(concurrency=4, shards=2).run())
+        assert all(u % 2 == 1 for u in fake.computed)
+        assert stats["shards_skipped"] == 1
+        assert metrics.counter_value("profile_refresh.shards_skipped") == 1
+
+    def test_overlapping_run_is_skipped(self, fake):
+        scheduler = ProfileRefreshScheduler(concurrency=2, shards=1)
+
+        async def scenario():
+            return await asyncio.gather(scheduler.run(), scheduler.run())
+
+        first, second = asyncio.run(scenario())
+        assert first["users"] == 19 and second == {"skipped": True}
@@ -0,0 +1,198 @@
+"""
+能力分批量回填/重算 (assessment.rescoring) 单元测试
+"""
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import pytest
+
+from basis_expert_council import db, metrics
+from basis_expert_council.assessment import rescoring
+from basis_expert_council.question_bank.cli import build_parser
+
+T0 = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+def _session(sid, user_id, *, final_score=70.0, ability_level=None, topics=None, subject="math"):
+    report = json.dumps({"topic_scores": topics}) if topics is not None else None
+    return {
+        "id": sid, "user_id": user_id, "subject": subject, "final_score": final_score,
+        "ability_level": ability_level, "completed_at": T0, "report_data": report,
+    }
+
+
+# ===========================================================================
+# score_sessions
+# ===========================================================================
+
+
+class TestScoreSessions:
+    def test_rolling_average_per_key(self):
+        sessions = [
+            _session("s1", 1, topics={"algebra": {"accuracy": 80}, "geometry": {"accuracy": 0.5}}),
+            _session("s2", 1, topics={"algebra": {"accuracy": 40}}),
+            _session("s3", 2, final_score=90.0),
+        ]
+        batch = rescoring.score_sessions(sessions, {})
+        scores = {(u, s, t): (n, round(total, 6), last) for u, s, t, n, total, last in batch.scores}
+        # 无作答时回退到 final_score / 100
+        assert scores[(1, "math", None)] == (2, 1.4, "s2")
+        assert scores[(1, "math", "algebra")] == (2, 1.2, "s2")
+        assert scores[(1, "math", "geometry")] == (1, 0.5, "s1")
+        assert scores[(2, "math", None)] == (1, 0.9, "s3")
+        assert len(batch.history) == 6
+        assert batch.history[1] == (1, "math", "algebra", 0.8, 80.0, "s1", T0)
+
+    def test_irt_estimate_preferred_over_stored_level(self):
+        answers = {"s1": [
+            {"is_correct": True, "score": None, "difficulty_at": 0.5, "difficulty": 0.5,
+             "discrimination": 1.0, "question_type": "mcq"},
+        ]}
+        sessions = [_session("s1", 1, ability_level=0.1), _session("s2", 1, ability_level=0.3)]
+        batch = rescoring.score_sessions(sessions, answers)
+        first, second = (h[3] for h in batch.history)
+        assert first > 0.5
+        assert second == pytest.approx(0.3)
+
+    def test_unscored_sessions_and_bad_topics_skipped(self):
+        sessions = [
+            _session("s1", 1, final_score=None, topics={"algebra": {"accuracy": 80}}),
+            _session("s2", 1, topics={"": {"accuracy": 50}, "x": {"accuracy": "n/a"}, "y": 3}),
+        ]
+        batch = rescoring.score_sessions(sessions, {})
+        assert [(h[2], h[5]) for h in batch.history] == [(None, "s2")]
+        assert rescoring.score_sessions([], {}).scores == []
+
+
+# ===========================================================================
+# rescore_abilities — 批次切分与断点
+# ===========================================================================
+
+
+class FakeConn:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def transaction(self, **kwargs):
+        @asynccontextmanager
+        async def tx():
+            yield
+        return tx()
+
+    async def cursor(self, sql, last_user_id, user_ids, prefetch):
+        for row in self.rows:
+            if row["user_id"] > last_user_id:
+                yield row
+
+    async def fetch(self, sql, session_ids):
+        return []
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    rows = [_session(f"s{u}-{i}", u) for u in (3, 5, 8, 13, 21) for i in range(u % 3 + 1)]
+    state = {"mode": "rescore", "last_user_id": 0, "finished_at": None}
+    merges = []
+
+    async def get_pool():
+        return FakePool(FakeConn(rows))
+
+    async def start_rescore_job(job, mode, restart=False):
+        return dict(state)
+
+    async def merge_ability_batch(scores, history, *, user_ids, replace, job=None, sessions=0):
+        merges.append((user_ids, replace, job, sessions))
+        return len(scores) + len(history)
+
+    async def finish_rescore_job(job):
+        state["finished"] = job
+
+    monkeypatch.setattr(db, "get_pool", get_pool)
+    monkeypatch.setattr(db, "start_rescore_job", start_rescore_job)
+    monkeypatch.setattr(db, "merge_ability_batch", merge_ability_batch)
+    monkeypatch.setattr(db, "finish_rescore_job", finish_rescore_job)
+    metrics.reset()
+    return state, merges
+
+
+class RecordingConn(FakeConn):
+    def __init__(self):
+        super().__init__([])
+        self.sql = []
+
+    async def execute(self, sql, *args):
+        self.sql.append(" ".join(sql.split()))
+        return "INSERT 0 1"
+
+    async def copy_records_to_table(self, table, records, columns):
+        pass
+
+
+class TestMergeAbilityBatch:
+    def _merge(self, monkeypatch, replace):
+        conn = RecordingConn()
+
+        async def get_pool():
+            return FakePool(conn)
+
+        monkeypatch.setattr(db, "get_pool", get_pool)
+        scores = [(1, "math", None, 1, 0.5, "s1")]
+        asyncio.run(db.merge_ability_batch(scores, [], user_ids=[1], replace=replace))
+        return conn.sql
+
+    def test_rescore_deletes_stale_session_rows(self, monkeypatch):
+        sql = self._merge(monkeypatch, replace=True)
+        stale = [q for q in sql if q.startswith("DELETE FROM student_ability_scores")]
+        assert len(stale) == 1 and "last_computed_at IS NULL" in stale[0]
+        assert any(q.startswith("DELETE FROM ability_score_history") for q in sql)
+
+    def test_profile_rows_are_never_overwritten(self, monkeypatch):
+        for replace in (True, False):
+            merge = [q for q in self._merge(monkeypatch, replace) if "ON CONFLICT" in q]
+            assert merge[0].endswith("WHERE s.last_computed_at IS NULL")
+        assert not any(q.startswith("DELETE") for q in self._merge(monkeypatch, replace=False))
+
+
+class TestRescoreAbilities:
+    def test_batches_cut_at_user_boundaries(self, fake_db):
+        state, merges = fake_db
+        progress = []
+        report = asyncio.run(rescoring.rescore_abilities(batch_users=2, on_progress=lambda r: progress.append(r.users)))
+        assert [m[0] for m in merges] == [[3, 5], [8, 13], [21]]
+        assert [m[3] for m in merges] == [4, 5, 1]
+        assert all(replace and job == "rescore" for _, replace, job, _ in merges)
+        assert progress == [2, 4, 5]
+        assert (report.users, report.sessions, report.batches) == (5, 10, 3)
+        assert report.rows == metrics.counter_value("ability_rescore.rows") > 0
+        assert state["finished"] == "rescore"
+
+    def test_resumes_after_checkpoint(self, fake_db):
+        state, merges = fake_db
+        state["last_user_id"] = 8
+        report = asyncio.run(rescoring.rescore_abilities(batch_users=10))
+        assert [m[0] for m in merges] == [[13, 21]]
+        assert report.resumed_from == 8
+
+    def test_finished_job_and_mode_mismatch(self, fake_db):
+        state, merges = fake_db
+        state["finished_at"] = T0
+        assert asyncio.run(rescoring.rescore_abilities()).already_finished
+        with pytest.raises(ValueError):
+            asyncio.run(rescoring.rescore_abilities(mode="backfill", job="rescore"))
+        assert merges == []
+
+    def test_cli_parser(self):
+        args = build_parser().parse_args(["rescore-abilities", "--mode", "backfill", "--restart"])
+        assert (args.mode, args.job, args.batch_users, args.restart) == ("backfill", None, 200, True)
@@ -0,0 +1,162 @@
+"""
+主观题评分缓存 (assessment.scoring_cache) 单元测试
+"""
+
+import asyncio
+
+import pytest
+
+from basis_expert_council import db, metrics
+from basis_expert_council.assessment import agent_scoring
+from basis_expert_council.assessment import scoring_cache as scoring_cache_module
+from basis_expert_council.assessment.scoring_cache import (
+    ScoringCache,
+    answer_hash,
+    normalize_answer,
+)
+
+QUESTION = {"id": 9, "question_type": "short_answer", "content_zh": {"stem": "光合作用的产物是什么？"}}
+
+
+@pytest.fixture()
+def table(monkeypatch):
+    """scoring_cache table in memory."""
+    rows: dict[tuple, dict] = {}
+
+    async def get_cached_score(question_id, answer_hash, model, prompt_version):
+        return rows.get((question_id, answer_hash, model, prompt_version))
+
+    async def put_cached_score(question_id, answer_hash, model, prompt_version, *, is_correct, score, feedback, ttl_sec):
+        rows[(question_id, answer_hash, model, prompt_version)] = {
+            "is_correct": is_correct, "score": score, "feedback": feedback,
+        }
+
+    async def purge_scoring_cache(question_ids=None):
+        doomed = [k for k in rows if question_ids is None or k[0] in question_ids]
+        for k in doomed:
+            del rows[k]
+        return len(doomed)
+
+    monkeypatch.setattr(db, "get_cached_score", get_cached_score)
+    monkeypatch.setattr(db, "put_cached_score", put_cached_score)
+    monkeypatch.setattr(db, "purge_scoring_cache", purge_scoring_cache)
+    metrics.reset()
+    return rows
+
+
+# ===========================================================================
+# Keys
+# ===========================================================================
+
+
+class TestNormalization:
+    def test_trivial_differences_share_a_hash(self):
+        assert normalize_answer("  Glucose   and\nOxygen。 ") == "glucose and oxygen"
+        assert answer_hash("葡萄糖和氧气") == answer_hash("葡萄糖和氧气。")
+        assert answer_hash("ＡＢＣ") == answer_hash("abc")  # NFKC 全角
+
+    def test_content_differences_do_not(self):
+        assert answer_hash("glucose and oxygen") != answer_hash("glucose or oxygen")
+
+
+# ===========================================================================
+# Tiers
+# ===========================================================================
+
+
+class TestScoringCache:
+    def test_memory_then_db_tier(self, table, monkeypatch):
+        cache = ScoringCache()
+        key = cache.key(1, "Answer", "m", "v1")
+
+        async def scenario():
+            assert await cache.get(key) is None
+            await cache.put(key, True, 0.9, "good")
+            assert await cache.get(key) == (True, 0.9, "good")
+            # 本地条目过期后回源数据库
+            monkeypatch.setattr(scoring_cache_module, "SCORING_CACHE_LOCAL_TTL", 0)
+            assert await cache.get(key) == (True, 0.9, "good")
+
+        asyncio.run(scenario())
+        assert metrics.counter_value("scoring_cache.miss") == 1
+        assert metrics.counter_value("scoring_cache.hit", tier="memory") == 1
+        assert metrics.counter_value("scoring_cache.hit", tier="db") == 1
+
+    def test_lru_eviction(self, table):
+        cache = ScoringCache(maxsize=2)
+
+        async def scenario():
+            for i in range(3):
+                await cache.put(cache.key(i, "a", "m", "v1"), True, 1.0, None)
+
+        asyncio.run(scenario())
+        assert len(cache) == 2
+        assert len(table) == 3
+
+    def test_purge_by_question(self, table):
+        cache = ScoringCache()
+
+        async def scenario():
+            await cache.put(cache.key(1, "a", "m", "v1"), True, 1.0, None)
+            await cache.put(cache.key(2, "a", "m", "v1"), True, 1.0, None)
+            assert await cache.purge([1]) == 1
+            assert await cache.get(cache.key(1, "a", "m", "v1")) is None
+            assert await cache.get(cache.key(2, "a", "m", "v1")) is not None
+
+        asyncio.run(scenario())
+
+    def test_admin_purge_body(self):
+        from basis_expert_council.server import _purge_question_ids
+
+        assert _purge_question_ids({}) is None
+        assert _purge_question_ids({"question_ids": [3, "4"]}) == [3, 4]
+        # 空列表不能被当成“全部”
+        for bad in ([], None, "3", ["x"]):
+            with pytest.raises(ValueError):
+                _purge_question_ids({"question_ids": bad})
+
+
+# ===========================================================================
+# score_subjective_question
+# ===========================================================================
+
+
+class TestCachedScoring:
+    @pytest.fixture()
+    def llm(self, table, monkeypatch):
+        calls = []
+        replies = {"content": '{"score": 0.7, "is_correct": true, "feedback_zh": "不错"}'}
+
+        class FakeClient:
+            async def chat(self, messages, **kwargs):
+                calls.append(messages)
+                return replies["content"]
+
+        monkeypatch.setattr(agent_scoring, "scoring_client", FakeClient())
+        monkeypatch.setattr(agent_scoring, "scoring_cache", ScoringCache())
+        return calls, replies
+
+    def test_identical_answers_hit_cache(self, llm):
+        calls, _ = llm
+        first = asyncio.run(agent_scoring.score_subjective_question(QUESTION, "葡萄糖和氧气"))
+        second = asyncio.run(agent_scoring.score_subjective_question(QUESTION, {"text": " 葡萄糖和氧气。"}))
+        assert first == second == (True, 0.7, "不错")
+        assert len(calls) == 1
+
+    def test_unparsed_response_is_not_cached(self, llm):
+        calls, replies = llm
+        replies["content"] = "I cannot score this."
+        asyncio.run(agent_scoring.score_subjective_question(QUESTION, "葡萄糖"))
+        asyncio.run(agent_scoring.score_subjective_question(QUESTION, "葡萄糖"))
+        assert len(calls) == 2
+
+    def test_fallback_is_not_cached(self, llm, monkeypatch):
+        calls, _ = llm
+
+        class DownClient:
+            async def chat(self, messages, **kwargs):
+                raise agent_scoring.ScoringUnavailable("down")
+
+        monkeypatch.setattr(agent_scoring, "scoring_client", DownClient())
+        asyncio.run(agent_scoring.score_subjective_question(QUESTION, "葡萄糖和氧气"))
+        assert len(agent_scoring.scoring_cache) == 0
@@ -0,0 +1,120 @@
+"""
+CAT 选题策略 (assessment.selection) 单元测试
+"""
+
+import asyncio
+import random
+
+import pytest
+
+from basis_expert_council.assessment import item_pool as item_pool_module
+from basis_expert_council.assessment import selection
+from basis_expert_council.assessment.item_pool import ItemPoolIndex
+from basis_expert_council.assessment.selection import InformationTable
+from basis_expert_council.assessment_engine import CATState
+
+
+def _q(qid, difficulty, *, discrimination=1.0, topic="algebra", grade="G7"):
+    return {
+        "id": qid,
+        "subject": "math",
+        "grade_level": grade,
+        "difficulty": difficulty,
+        "discrimination": discrimination,
+        "review_status": "approved",
+        "topic": topic,
+        "question_type": "mcq",
+    }
+
+
+# ===========================================================================
+# Information table
+# ===========================================================================
+
+
+class TestInformationTable:
+    def test_picks_item_closest_to_theta(self):
+        table = InformationTable([_q(1, 0.2), _q(2, 0.5), _q(3, 0.8)])
+        assert table.best(0.0, []) == 2
+        assert table.best(1.8, []) == 3
+        assert table.best(-1.8, []) == 1
+
+    def test_prefers_higher_discrimination(self):
+        table = InformationTable([_q(1, 0.5, discrimination=0.8), _q(2, 0.5, discrimination=2.0)])
+        assert table.best(0.0, []) == 2
+
+    def test_excludes_answered(self):
+        table = InformationTable([_q(1, 0.5), _q(2, 0.55)])
+        assert table.best(0.0, {1}) == 2
+        assert table.best(0.0, {1, 2}) is None
+
+    def test_topic_balancing(self):
+        table = InformationTable([
+            _q(1, 0.50, topic="algebra"),
+            _q(2, 0.60, topic="geometry"),
+        ])
+        assert table.best(0.0, []) == 1
+        assert table.best(0.0, [], {"algebra": 2}) == 2
+
+    def test_randomesque_draws_from_top_k(self):
+        table = InformationTable([_q(i, d) for i, d in enumerate([0.1, 0.45, 0.5, 0.55, 0.9], start=1)])
+        rng = random.Random(0)
+        picks = {table.best(0.0, [], top_k=3, rng=rng) for _ in range(200)}
+        assert picks == {2, 3, 4}
+        assert table.best(0.0, {2, 3, 4}, top_k=3, rng=rng) in {1, 5}
+        assert table.best(0.0, {1, 2, 3, 4, 5}, top_k=3, rng=rng) is None
+
+
+# ===========================================================================
+# Strategy dispatch
+# ===========================================================================
+
+
+@pytest.fixture()
+def pool(monkeypatch):
+    index = ItemPoolIndex(ttl=0, rng=random.Random(1))
+    index.load([_q(1, 0.2), _q(2, 0.5, topic="geometry"), _q(3, 0.8), _q(4, 0.5, grade="G8")])
+    monkeypatch.setattr(item_pool_module, "item_pool", index)
+    monkeypatch.setattr(selection, "item_pool", index)
+    # 分派测试按纯 argmax 断言
+    monkeypatch.setattr(selection, "CAT_RANDOMESQUE", 1)
+    return index
+
+
+class TestSelectNextQuestion:
+    SESSION = {"subject": "math", "grade_level": "G7"}
+
+    def _state(self, **kw):
+        return CATState(subject="math", grade_level="G7", assessment_type="quick", **kw)
+
+    def test_max_info_uses_theta(self, pool):
+        state = self._state(theta=2.0, current_difficulty=0.2)
+        q = asyncio.run(selection.select_next_question(self.SESSION, state, "max_info"))
+        assert q["id"] == 3
+
+    def test_max_info_randomesque(self, pool, monkeypatch):
+        monkeypatch.setattr(selection, "CAT_RANDOMESQUE", 2)
+        monkeypatch.setattr(selection, "_rng", random.Random(0))
+        state = self._state(theta=0.0)
+        picks = {
+            asyncio.run(selection.select_next_question(self.SESSION, state, "max_info"))["id"]
+            for _ in range(50)
+        }
+        assert len(picks) == 2
+
+    def test_staircase_uses_current_difficulty(self, pool):
+        state = self._state(theta=2.0, current_difficulty=0.2)
+        q = asyncio.run(selection.select_next_question(self.SESSION, state, "staircase"))
+        assert q["id"] == 1
+
+    def test_max_info_falls_back_to_cascade(self, pool):
+        state = self._state(answered_question_ids=[1, 2, 3])
+        q = asyncio.run(selection.select_next_question(self.SESSION, state, "max_info"))
+        assert q["id"] == 4
+
+    def test_tables_rebuilt_after_pool_change(self, pool):
+        state = self._state(theta=0.0)
+        assert asyncio.run(selection.select_next_question(self.SESSION, state, "max_info"))["id"] == 2
+        pool.remove(2)
+        q = asyncio.run(selection.select_next_question(self.SESSION, state, "max_info"))
+        assert q["id"] in {1, 3}
@@ -0,0 +1,82 @@
+"""
+CAT 离线模拟 (assessment.simulation) 单元测试
+"""
+
+from pathlib import Path
+
+from basis_expert_council.assessment import selection
+from basis_expert_council.assessment.simulation import (
+    STRATEGIES,
+    format_report,
+    load_bank,
+    simulate,
+    synthetic_bank,
+)
+
+BANK_DIR = Path(__file__).resolve().parent.parent / "data" / "question_banks"
+
+
+# ===========================================================================
+# Banks
+# ===========================================================================
+
+
+class TestBanks:
+    def test_synthetic_bank(self):
+        bank = synthetic_bank(50, seed=1)
+        assert len(bank) == 50
+        assert len({q["id"] for q in bank}) == 50
+        assert all(0 < q["difficulty"] < 1 and q["discrimination"] > 0 for q in bank)
+        assert bank == synthetic_bank(50, seed=1)
+
+    def test_load_bank_directory(self):
+        bank = load_bank(BANK_DIR)
+        assert bank
+        assert len({q["id"] for q in bank}) == len(bank)
+        stems = [
+            (q["subject"], q.get("grade_level"), (q.get("content_en") or q.get("content_zh") or {}).get("stem"))
+            for q in bank
+        ]
+        assert len(set(stems)) == len(stems)
+
+
+# ===========================================================================
+# Simulation
+# ===========================================================================
+
+
+class TestSimulate:
+    def test_all_strategies_report(self):
+        results = simulate(synthetic_bank(120, seed=2), examinees=20, seed=2)
+        assert [r.strategy for r in results] == list(STRATEGIES)
+        for r in results:
+            s = r.summary()
+            assert s["examinees"] == 20
+            assert sum(s["stop_reasons"].values()) == 20
+            assert s["items_mean"] > 0
+        assert "max_info" in format_report(results)
+
+    def test_respects_max_questions(self):
+        results = simulate(
+            synthetic_bank(120, seed=3), strategies=["staircase", "max_info"],
+            examinees=15, assessment_type="quick", seed=3,
+        )
+        for r in results:
+            assert r.items_used.max() <= 8
+
+    def test_max_info_estimates_track_true_theta(self):
+        (result,) = simulate(synthetic_bank(200, seed=4), strategies=["max_info"], examinees=60, seed=4)
+        assert result.summary()["corr"] > 0.7
+
+    def test_randomesque_limits_exposure(self, monkeypatch):
+        bank = synthetic_bank(200, seed=5)
+        monkeypatch.setattr(selection, "CAT_RANDOMESQUE", 1)
+        (argmax,) = simulate(bank, strategies=["max_info"], examinees=60, seed=5)
+        monkeypatch.setattr(selection, "CAT_RANDOMESQUE", 5)
+        (randomesque,) = simulate(bank, strategies=["max_info"], examinees=60, seed=5)
+        # 纯 argmax：θ=0 起步的每个考生第一题相同
+        assert argmax.summary()["exposure_max"] == 1.0
+        s = randomesque.summary()
+        assert s["exposure_max"] < 0.9
+        assert s["unused_items"] < argmax.summary()["unused_items"]
+        assert s["corr"] > 0.7
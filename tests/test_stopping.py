@@ -0,0 +1,111 @@
+"""
+CAT 结束规则 (assessment.stopping) 单元测试
+"""
+
+import pytest
+
+from basis_expert_council.assessment import stopping
+from basis_expert_council.assessment.simulation import simulate, synthetic_bank
+from basis_expert_council.assessment.stopping import StoppingPolicy, policy_for
+from basis_expert_council.assessment_engine import CATState, _advance_cat_state
+
+
+def _state(n, *, se=1.0, difficulties=None, max_q=20, atype="pre_admission"):
+    return CATState(
+        subject="math",
+        grade_level="G7",
+        assessment_type=atype,
+        question_count=n,
+        max_questions=max_q,
+        theta_se=se,
+        difficulty_history=difficulties if difficulties is not None else [0.1 * (i % 9) for i in range(n)],
+    )
+
+
+# ===========================================================================
+# Policy rules
+# ===========================================================================
+
+
+class TestStoppingPolicy:
+    policy = StoppingPolicy(min_items=5, se_threshold=0.3)
+
+    def test_max_items_defaults_to_question_count(self):
+        assert self.policy.stop_reason(_state(20)) == stopping.STOP_MAX_ITEMS
+        assert StoppingPolicy(min_items=5, max_items=10).stop_reason(_state(10)) == stopping.STOP_MAX_ITEMS
+
+    def test_se_threshold_after_min_items(self):
+        assert self.policy.stop_reason(_state(4, se=0.2)) is None
+        assert self.policy.stop_reason(_state(5, se=0.2)) == stopping.STOP_SE
+        assert self.policy.stop_reason(_state(5, se=0.4)) is None
+
+    def test_difficulty_convergence(self):
+        state = _state(8, difficulties=[0.9, 0.1, 0.5, 0.52, 0.5, 0.48, 0.5, 0.51])
+        assert self.policy.stop_reason(state) == stopping.STOP_CONVERGED
+
+    def test_disabled_early_stop(self, monkeypatch):
+        monkeypatch.setattr(stopping, "CAT_EARLY_STOP", False)
+        assert self.policy.stop_reason(_state(8, se=0.1)) is None
+        assert self.policy.stop_reason(_state(20, se=0.1)) == stopping.STOP_MAX_ITEMS
+
+    def test_convergence_uses_sample_std(self):
+        # 样本标准差 ≈ 0.0548，总体标准差 = 0.049：与 CATEngine.should_stop 一致，不应停止
+        state = _state(8, difficulties=[0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.62])
+        assert self.policy.stop_reason(state) is None
+
+    def test_every_policy_can_stop_early(self):
+        from basis_expert_council.assessment_engine import QUESTION_COUNT
+
+        for atype, policy in stopping.STOPPING_POLICIES.items():
+            assert policy.min_items < (policy.max_items or QUESTION_COUNT[atype]), atype
+
+    def test_unknown_type_is_fixed_length(self):
+        policy = policy_for("custom")
+        assert policy.stop_reason(_state(3, se=0.01, difficulties=[0.5] * 3, max_q=4)) is None
+        assert policy.stop_reason(_state(4, max_q=4)) == stopping.STOP_MAX_ITEMS
+
+
+# ===========================================================================
+# Engine integration
+# ===========================================================================
+
+
+class TestAdvanceStops:
+    def test_stops_when_difficulty_pinned(self, monkeypatch):
+        # 连续答错把难度压到 0.0，收敛后提前结束（关闭 SE 规则，单独验证收敛）
+        monkeypatch.setitem(stopping.STOPPING_POLICIES, "quick", StoppingPolicy(min_items=6))
+        state = CATState(subject="math", grade_level="G7", assessment_type="quick", max_questions=8)
+        for qid in range(1, 9):
+            state, is_last = _advance_cat_state(state, {"id": qid, "difficulty": state.current_difficulty}, False)
+            if is_last:
+                break
+        assert is_last
+        assert state.question_count < 8
+        assert state.stop_reason == stopping.STOP_CONVERGED
+        assert state.is_complete
+
+    def test_total_questions_reports_stopping_length(self):
+        state = CATState(subject="math", grade_level="G7", assessment_type="quick", max_questions=8)
+        assert state.total_questions == 8
+        for qid in range(1, 9):
+            state, is_last = _advance_cat_state(state, {"id": qid, "difficulty": state.current_difficulty}, False)
+            if is_last:
+                break
+        assert state.total_questions == state.question_count < 8
+
+
+# ===========================================================================
+# Uncalibrated bank (discrimination NULL → a=1.0)
+# ===========================================================================
+
+
+class TestUncalibratedBank:
+    @pytest.mark.parametrize("atype", ["quick", "subject_diagnostic", "pre_admission", "map_practice"])
+    def test_staircase_stops_early_on_se(self, atype):
+        from basis_expert_council.assessment_engine import QUESTION_COUNT
+
+        bank = [{**q, "discrimination": None} for q in synthetic_bank(300, seed=7)]
+        (result,) = simulate(bank, strategies=["staircase"], examinees=40, assessment_type=atype, seed=7)
+        s = result.summary()
+        assert s["items_mean"] < QUESTION_COUNT[atype]
+        assert s["stop_reasons"].get(stopping.STOP_SE, 0) > s["stop_reasons"].get(stopping.STOP_MAX_ITEMS, 0)
@@ -0,0 +1,68 @@
+"""
+题目使用统计写回缓冲 (assessment.usage_buffer) 单元测试
+"""
+
+import asyncio
+
+import pytest
+
+from basis_expert_council import db, metrics
+from basis_expert_council.assessment.usage_buffer import UsageBuffer
+
+
+@pytest.fixture()
+def flushed(monkeypatch):
+    calls: list[list[tuple]] = []
+
+    async def fake_flush(rows):
+        calls.append(rows)
+
+    monkeypatch.setattr(db, "flush_question_usage", fake_flush)
+    metrics.reset()
+    return calls
+
+
+# ===========================================================================
+# Aggregation & flush
+# ===========================================================================
+
+
+class TestUsageBuffer:
+    def test_aggregates_deltas(self, flushed):
+        buf = UsageBuffer(interval=3600)
+        buf.add(7, True)
+        buf.add(7, False)
+        buf.add(7, True)
+        buf.add(3, False)
+        assert asyncio.run(buf.flush()) == 2
+        assert flushed == [[(3, 1, 0), (7, 3, 2)]]
+        assert len(buf) == 0
+        assert metrics.snapshot()["timings"]["usage_buffer.flush_size"]["max"] == 2
+
+    def test_empty_flush_is_noop(self, flushed):
+        assert asyncio.run(UsageBuffer().flush()) == 0
+        assert flushed == []
+
+    def test_failed_flush_keeps_deltas(self, monkeypatch):
+        async def broken(rows):
+            raise ConnectionError("db down")
+
+        monkeypatch.setattr(db, "flush_question_usage", broken)
+        buf = UsageBuffer(interval=3600)
+        buf.add(1, True)
+        with pytest.raises(ConnectionError):
+            asyncio.run(buf.flush())
+        buf.add(1, False)
+        assert buf._deltas == {1: [2, 1]}
+
+    def test_periodic_flush_and_stop(self, flushed):
+        async def scenario():
+            buf = UsageBuffer(interval=0.01)
+            buf.add(5, True)  # 首次 add 启动后台 flusher
+            await asyncio.sleep(0.05)
+            buf.add(6, False)
+            await buf.stop()
+
+        asyncio.run(scenario())
+        assert [(5, 1, 1)] in flushed
+        assert flushed[-1] == [(6, 1, 0)]